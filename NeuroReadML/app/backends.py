@@ -0,0 +1,132 @@
+"""
+Inference backends for the dyslexia model.
+
+- eager: the PyTorch ResNet18 from create_dyslexia_model (default)
+- torchscript: a frozen TorchScript module exported by export_model.py
+- onnxruntime: an ONNX graph exported by export_model.py, run with ONNX Runtime
+- quantized: an INT8 TorchScript module produced by quantize_model.py
+
+Exported artifacts live next to the .pth checkpoint, e.g.
+models/dyslexia_model.torchscript.pt, models/dyslexia_model.onnx and
+models/dyslexia_model.int8.pt. The eager backend also reads a
+models/dyslexia_model.safetensors copy of the weights when it exists.
+The backend is chosen with the MODEL_BACKEND environment variable or the
+backend argument of app.model.load_model.
+"""
+
+import os
+import torch
+
+BACKENDS = ('eager', 'torchscript', 'onnxruntime', 'quantized')
+
+ARTIFACT_SUFFIXES = {
+    'eager': '.pth',
+    'torchscript': '.torchscript.pt',
+    'onnxruntime': '.onnx',
+    'quantized': '.int8.pt'
+}
+
+
+def get_backend(backend=None):
+    """Return the requested backend, falling back to MODEL_BACKEND and then eager."""
+    backend = backend or os.getenv("MODEL_BACKEND", "eager")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown model backend '{backend}'. Choose from {', '.join(BACKENDS)}")
+    return backend
+
+
+def artifact_path(model_path, backend):
+    """Return the path of the serving artifact for backend, derived from the .pth path."""
+    root, ext = os.path.splitext(model_path)
+    if ext != '.pth':
+        # Already points at a specific artifact
+        return model_path
+    return root + ARTIFACT_SUFFIXES[backend]
+
+
+def weights_path(model_path):
+    """
+    Return the file to read eager weights from.
+
+    A .safetensors file next to a .pth checkpoint is used unless the .pth
+    checkpoint is newer (e.g. after retraining).
+    """
+    root, ext = os.path.splitext(model_path)
+    safetensors_path = root + '.safetensors'
+    if ext != '.pth' or not os.path.exists(safetensors_path):
+        return model_path
+    if os.path.exists(model_path) and os.path.getmtime(model_path) > os.path.getmtime(safetensors_path):
+        return model_path
+    return safetensors_path
+
+
+class OnnxRuntimeModel:
+    """Wrap an ONNX Runtime session so it can be called like a torch module."""
+
+    def __init__(self, path, num_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, image_tensor):
+        inputs = image_tensor.detach().cpu().numpy()
+        outputs = self.session.run(None, {self.input_name: inputs})[0]
+        return torch.from_numpy(outputs)
+
+    def eval(self):
+        return self
+
+    def to(self, device):
+        # ONNX Runtime sessions here always run on the CPU
+        return self
+
+
+def load_torchscript_model(path):
+    """Load a frozen TorchScript module on the CPU."""
+    model = torch.jit.load(path, map_location='cpu')
+    model.eval()
+    return model
+
+
+def export_torchscript(model, path):
+    """Trace, freeze and save model as TorchScript."""
+    model.eval()
+    example = torch.zeros(1, 3, 224, 224)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+        frozen = torch.jit.freeze(traced)
+    frozen.save(path)
+    return path
+
+
+def export_onnx(model, path, opset_version=17):
+    """Export model to ONNX with a dynamic batch dimension."""
+    model.eval()
+    example = torch.zeros(1, 3, 224, 224)
+    torch.onnx.export(
+        model, example, path,
+        input_names=['input'],
+        output_names=['logits'],
+        dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}},
+        opset_version=opset_version,
+        dynamo=False
+    )
+    return path
+
+
+def check_parity(reference_model, candidate_model, inputs, atol=1e-4):
+    """
+    Compare the logits of two models on the same inputs.
+
+    Returns a tuple of (maximum absolute difference, whether it is within atol).
+    """
+    with torch.no_grad():
+        expected = reference_model(inputs)
+        actual = candidate_model(inputs)
+    max_diff = (expected - actual).abs().max().item()
+    return max_diff, max_diff <= atol
@@ -0,0 +1,183 @@
+"""
+Batch prediction over many worksheet images.
+
+Letter scoring runs in a pool of worker processes that each load the model
+once. As each image's letter scores come back, the LLM spelling analysis
+is awaited on the event loop (translation runs in a thread), with at most
+llm_concurrency calls in flight. A fixed number of images is in flight at
+once, so memory does not grow with the size of the input list. Every
+finished image is appended to a JSONL file right away. Re-running with
+the same output file skips images that already succeeded, so an
+interrupted run picks up where it stopped.
+"""
+
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .manifest import IMAGE_EXTENSIONS
+
+# Per-process engine, created by _init_worker
+_engine = None
+
+
+def list_images(input_dir=None, manifest=None):
+    """
+    Return the image paths to process, in a stable order.
+
+    Args:
+        input_dir: Directory whose image files are processed
+        manifest: A dataset manifest (.npz, see app.manifest) or a text
+            file with one image path per line
+    """
+    if input_dir:
+        with os.scandir(input_dir) as entries:
+            return sorted(entry.path for entry in entries
+                          if entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file())
+
+    if manifest.endswith('.npz'):
+        from .manifest import Manifest
+        return Manifest.load(manifest).paths()
+    with open(manifest) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def completed_images(output_path):
+    """Return the image paths that already have a successful result in output_path."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by a crash; that image is simply redone
+                continue
+            if record.get('status') == 'ok':
+                done.add(record['image_path'])
+    return done
+
+
+def _ends_mid_line(path):
+    """True if the file is non-empty and does not end with a newline."""
+    if not os.path.getsize(path):
+        return False
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b'\n'
+
+
+def _init_worker(model_path, backend, max_batch_size, strip_height, num_threads):
+    global _engine
+    import torch
+    from .engine import InferenceEngine
+
+    torch.set_num_threads(num_threads)
+    _engine = InferenceEngine(model_path, max_batch_size=max_batch_size, backend=backend,
+                              strip_height=strip_height, device=torch.device('cpu')).load()
+
+
+def _score_image(image_path):
+    final_results = _engine.score_letters(image_path)
+    if final_results is None:
+        raise RuntimeError("No letters found in the image")
+    return final_results
+
+
+async def _process(image_path, pool, llm_slots, language, write):
+    from .engine import explain_results_async
+
+    loop = asyncio.get_running_loop()
+    record = {'image_path': image_path}
+    try:
+        final_results = await loop.run_in_executor(pool, _score_image, image_path)
+        async with llm_slots:
+            result = await explain_results_async(image_path, final_results, language)
+        record.update(status='ok', result=result)
+    except Exception as e:
+        record.update(status='error', error=str(e))
+    write(record)
+
+
+async def _run(image_paths, pool, output_path, language, llm_concurrency, max_in_flight):
+    llm_slots = asyncio.Semaphore(llm_concurrency)
+    counts = {'ok': 0, 'error': 0}
+    since = time.time()
+
+    with open(output_path, 'a') as out:
+        if _ends_mid_line(output_path):
+            # Close off a line cut short by a crash before appending
+            out.write('\n')
+
+        def write(record):
+            out.write(json.dumps(record) + '\n')
+            out.flush()
+            counts[record['status']] += 1
+            done = counts['ok'] + counts['error']
+            if done % 10 == 0 or done == len(image_paths):
+                print(f"{done}/{len(image_paths)} images "
+                      f"({counts['error']} errors, {done / (time.time() - since):.2f} images/sec)")
+
+        # Each task takes the next path when its image is done, so at most
+        # max_in_flight images are being scored or explained at any time
+        pending = iter(image_paths)
+
+        async def consume():
+            for path in pending:
+                await _process(path, pool, llm_slots, language, write)
+
+        await asyncio.gather(*(consume() for _ in range(min(max_in_flight, len(image_paths)))))
+
+    from .llama_evaluate import close_async_client
+    from .llm_image import payload_stats
+    await close_async_client()
+    payload = payload_stats()
+    if payload['images']:
+        print(f"LLM images: {payload['bytes'] / 1e6:.1f} MB sent instead of "
+              f"{payload['original_bytes'] / 1e6:.1f} MB, about {payload['tokens_saved']} image tokens saved")
+    return counts
+
+
+def run_batch(image_paths, output_path, model_path='models/dyslexia_model.pth', backend=None,
+              workers=None, llm_concurrency=4, language='english', max_batch_size=32,
+              strip_height=None, max_in_flight=None):
+    """
+    Predict every image and append one JSON line per image to output_path.
+
+    Args:
+        image_paths: Images to process; those already in output_path are skipped
+        output_path: JSONL file with {"image_path", "status", "result" | "error"} lines
+        model_path, backend: Model to load in every worker
+        workers: Scoring processes (default: number of CPU cores)
+        llm_concurrency: Maximum concurrent LLM/translation calls
+        language: Language to translate the detailed text to
+        max_batch_size: Letters scored per forward pass
+        strip_height: Segment in strips (see InferenceEngine)
+        max_in_flight: Images being processed at once (default: workers +
+            llm_concurrency, enough to keep both the pool and the LLM busy)
+
+    Returns:
+        Dictionary with the number of 'ok', 'error' and 'skipped' images
+    """
+    done = completed_images(output_path)
+    todo = [path for path in image_paths if path not in done]
+    print(f"{len(todo)} images to process, {len(image_paths) - len(todo)} already done")
+    if not todo:
+        return {'ok': 0, 'error': 0, 'skipped': len(image_paths)}
+
+    workers = workers or os.cpu_count() or 1
+    num_threads = max(1, (os.cpu_count() or 1) // workers)
+    max_in_flight = max_in_flight or workers + llm_concurrency
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_path, backend, max_batch_size, strip_height,
+                                       num_threads)) as pool:
+        counts = asyncio.run(_run(todo, pool, output_path, language, llm_concurrency,
+                                  max_in_flight))
+
+    counts['skipped'] = len(image_paths) - len(todo)
+    return counts
@@ -0,0 +1,155 @@
+"""
+Content-addressed cache for end-to-end prediction results.
+
+Results are keyed by the SHA-256 of the image bytes, the version of the
+model that is being served and the target language. A small in-memory LRU
+sits in front of a SQLite store with size- and age-based eviction. The
+model version comes from the process that loaded the model (see
+InferenceEngine.model_version), which should also fold in anything else
+that changes a result, such as the LLM prompt and image settings. Entries
+made with any other version are dropped when it is set.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Two-tier (memory + SQLite) cache of prediction responses."""
+
+    def __init__(self, db_path, max_memory_entries=256,
+                 max_disk_entries=10000, max_age_seconds=7 * 24 * 3600):
+        self.db_path = db_path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.max_age_seconds = max_age_seconds
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._model_version = None
+
+        # Metrics
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, model_version TEXT NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL, value TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+        self._db.commit()
+
+    def set_model_version(self, version):
+        """
+        Record the version of the model that produces new results.
+
+        Call it whenever a model is loaded. Entries made with any other
+        version are purged.
+        """
+        with self._lock:
+            if version != self._model_version:
+                self._memory.clear()
+                self._db.execute("DELETE FROM results WHERE model_version != ?", (version,))
+                self._db.commit()
+                self._model_version = version
+
+    def model_version(self):
+        """Return the version set by set_model_version ('none' before that)."""
+        return self._model_version or "none"
+
+    def make_key(self, image_bytes, language):
+        """Build the cache key for an image and target language."""
+        image_digest = hashlib.sha256(image_bytes).hexdigest()
+        return f"{image_digest}:{self.model_version()}:{language}"
+
+    def get(self, key):
+        """Return the cached response for key, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[0] <= self.max_age_seconds:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry[1]
+
+            row = self._db.execute(
+                "SELECT created, value FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[0] > self.max_age_seconds:
+                self.misses += 1
+                return None
+
+            self._db.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            value = json.loads(row[1])
+            self._remember(key, row[0], value)
+            self.disk_hits += 1
+            return value
+
+    def set(self, key, value):
+        """Store a JSON-serialisable response under key."""
+        now = time.time()
+        model_version = key.split(":")[1]
+        with self._lock:
+            self._remember(key, now, value)
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, model_version, created, accessed, value) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, model_version, now, now, json.dumps(value))
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def _remember(self, key, created, value):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now):
+        self._db.execute("DELETE FROM results WHERE created < ?", (now - self.max_age_seconds,))
+        count = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        if count > self.max_disk_entries:
+            self._db.execute(
+                "DELETE FROM results WHERE key IN "
+                "(SELECT key FROM results ORDER BY accessed LIMIT ?)",
+                (count - self.max_disk_entries,)
+            )
+
+    def stats(self):
+        """Return hit/miss counters and tier sizes."""
+        with self._lock:
+            disk_entries = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+                "model_version": self._model_version
+            }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
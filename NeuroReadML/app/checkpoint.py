@@ -0,0 +1,154 @@
+"""
+Resumable training checkpoints written from a background thread.
+
+A full checkpoint holds everything needed to continue training where it
+stopped: model, optimizer and LR scheduler state, RNG states, the number
+of completed epochs and the training history. CheckpointWriter snapshots
+the tensors to CPU memory on the training thread (so later optimizer steps
+cannot change what is written) and serializes them in the background.
+Files are written to a temporary name and renamed, so a crash mid-write
+never leaves a truncated checkpoint behind.
+"""
+
+import os
+import random
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import torch
+
+
+def checkpoint_path_for(model_save_path):
+    """Return the default full-checkpoint path next to the model weights."""
+    root, _ = os.path.splitext(model_save_path)
+    return root + '.ckpt.pt'
+
+
+def snapshot(obj):
+    """Copy every tensor in a (nested) state dict to CPU memory."""
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, dict):
+        return {key: snapshot(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(snapshot(value) for value in obj)
+    return obj
+
+
+def rng_state():
+    """Return the Python, numpy and torch RNG states."""
+    state = {
+        'python': random.getstate(),
+        'numpy': np.random.get_state(),
+        'torch': torch.get_rng_state()
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    """Restore RNG states saved by rng_state()."""
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
+def atomic_save(obj, path):
+    """torch.save to a temporary file, then rename it over path."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    torch.save(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def atomic_copy(src, path):
+    """Copy src to a temporary file, then rename it over path."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, path)
+
+
+class CheckpointWriter:
+    """Write checkpoints in order on a single background thread."""
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='checkpoint')
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def save(self, state, path, message=None):
+        """Snapshot state now and write it to path in the background."""
+        self._raise_errors()
+        state = snapshot(state)
+        future = self._executor.submit(self._write, state, path, message)
+        with self._lock:
+            self._pending.append(future)
+
+    def _write(self, state, path, message):
+        atomic_save(state, path)
+        if message:
+            print(message)
+
+    def _raise_errors(self):
+        with self._lock:
+            done = [future for future in self._pending if future.done()]
+            self._pending = [future for future in self._pending if not future.done()]
+        for future in done:
+            # Re-raise a failed write on the training thread
+            future.result()
+
+    def wait(self):
+        """Block until every queued checkpoint is on disk."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+
+    def close(self):
+        """Flush queued checkpoints and stop the background thread."""
+        try:
+            self.wait()
+        finally:
+            self._executor.shutdown(wait=True)
+
+
+def training_state(model, optimizer, scheduler, epoch, history, best_acc, epoch_metrics=None,
+                   best_model_path=None):
+    """
+    Collect the full training state after `epoch` completed epochs.
+
+    best_model_path records where the weights that reached best_acc were
+    saved, so a resumed run can start from them.
+    """
+    return {
+        'model': model.state_dict(),
+        'optimizer': optimizer.state_dict(),
+        'scheduler': scheduler.state_dict(),
+        'epoch': epoch,
+        'history': history,
+        'best_acc': best_acc,
+        'epoch_metrics': epoch_metrics or [],
+        'best_model_path': best_model_path,
+        'rng': rng_state()
+    }
+
+
+def load_training_state(path, model, optimizer, scheduler):
+    """
+    Restore model, optimizer, scheduler and RNG states from a full checkpoint.
+
+    Returns the checkpoint dict, whose 'epoch', 'history', 'best_acc',
+    'epoch_metrics' and 'best_model_path' entries the caller continues from.
+    """
+    # RNG states must be CPU tensors; the optimizer moves its state to the parameters' device
+    checkpoint = torch.load(path, map_location='cpu', weights_only=False)
+    model.load_state_dict(checkpoint['model'])
+    optimizer.load_state_dict(checkpoint['optimizer'])
+    scheduler.load_state_dict(checkpoint['scheduler'])
+    set_rng_state(checkpoint['rng'])
+    return checkpoint
@@ -0,0 +1,173 @@
+"""
+Pre-decoded, memory-mapped training cache for HandwritingDataset.
+
+A one-time build step decodes every image, resizes it to 224x224 and
+writes the uint8 pixels into a single memory-mapped array next to a
+small JSON index. CachedHandwritingDataset reads samples straight from
+that file, so DataLoader workers share the page cache instead of each
+decoding PNG/JPEG files every epoch.
+
+The index stores a fingerprint of the source directories (file names,
+sizes and modification times); the cache is rebuilt when it changes or
+the index cannot be read. Every file is written to a temporary name and
+renamed into place, the index last.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+from PIL import Image
+
+from .preprocessing import HandwritingDataset, load_image
+
+IMAGE_SIZE = 224
+IMAGES_FILE = 'images.npy'
+LABELS_FILE = 'labels.npy'
+INDEX_FILE = 'index.json'
+
+# ImageNet statistics, as in get_transform()
+MEAN = torch.tensor([0.485, 0.456, 0.406]).view(3, 1, 1)
+STD = torch.tensor([0.229, 0.224, 0.225]).view(3, 1, 1)
+
+
+def source_fingerprint(image_paths):
+    """Hash the names, sizes and modification times of the source images."""
+    digest = hashlib.sha256()
+    for path in image_paths:
+        stat = os.stat(path)
+        digest.update(f"{path}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def _decode_resized(image_path):
+    """Decode an image to a 224x224 RGB uint8 array, white if it cannot be read."""
+    image = load_image(image_path)
+    if image is None:
+        image = Image.new('RGB', (IMAGE_SIZE, IMAGE_SIZE), color='white')
+    image = image.resize((IMAGE_SIZE, IMAGE_SIZE), Image.BILINEAR)
+    return np.asarray(image, dtype=np.uint8)
+
+
+def build_image_cache(image_paths, labels, cache_dir, fingerprint=None, num_workers=8):
+    """
+    Decode and resize every image into a memory-mapped array.
+
+    Args:
+        image_paths: Source image paths, in dataset order
+        labels: Integer label of each image
+        cache_dir: Directory to write images.npy, labels.npy and index.json
+        fingerprint: Source fingerprint to record (computed if not given)
+        num_workers: Threads used to decode images in parallel
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    if fingerprint is None:
+        fingerprint = source_fingerprint(image_paths)
+
+    shape = (len(image_paths), IMAGE_SIZE, IMAGE_SIZE, 3)
+    images_path = os.path.join(cache_dir, IMAGES_FILE)
+    tmp_images_path = f"{images_path}.{os.getpid()}.tmp"
+    images = np.lib.format.open_memmap(tmp_images_path, mode='w+', dtype=np.uint8,
+                                       shape=shape) if shape[0] else None
+
+    def fill(idx):
+        images[idx] = _decode_resized(image_paths[idx])
+
+    if images is not None:
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            list(executor.map(fill, range(len(image_paths))))
+        images.flush()
+        del images
+        os.replace(tmp_images_path, images_path)
+
+    labels_path = os.path.join(cache_dir, LABELS_FILE)
+    tmp_labels_path = f"{labels_path}.{os.getpid()}.tmp"
+    with open(tmp_labels_path, 'wb') as f:
+        np.save(f, np.asarray(labels, dtype=np.int64))
+    os.replace(tmp_labels_path, labels_path)
+
+    # The index is written last so a partial build is never mistaken for a valid cache
+    index = {
+        'fingerprint': fingerprint,
+        'count': len(image_paths),
+        'image_size': IMAGE_SIZE,
+        'paths': list(image_paths)
+    }
+    index_path = os.path.join(cache_dir, INDEX_FILE)
+    tmp_index_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_index_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_index_path, index_path)
+
+    print(f"Cached {len(image_paths)} images in {cache_dir}")
+    return index
+
+
+def read_index(cache_dir):
+    """Return the cache index, or None if it is missing or cannot be read."""
+    try:
+        with open(os.path.join(cache_dir, INDEX_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        print(f"Image cache index is unreadable ({e}), rebuilding image cache")
+        return None
+
+
+def ensure_image_cache(image_paths, labels, cache_dir, num_workers=8, fingerprint=None):
+    """Build the cache unless an up-to-date one already exists in cache_dir."""
+    if fingerprint is None:
+        fingerprint = source_fingerprint(image_paths)
+    index = read_index(cache_dir)
+    if index is not None:
+        if index.get('fingerprint') == fingerprint:
+            return index
+        print("Source images changed, rebuilding image cache")
+
+    return build_image_cache(image_paths, labels, cache_dir, fingerprint, num_workers)
+
+
+class CachedHandwritingDataset(Dataset):
+    """Handwriting dataset served from a memory-mapped image cache."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        with open(os.path.join(cache_dir, INDEX_FILE)) as f:
+            index = json.load(f)
+        self.image_paths = index['paths']
+        self.labels = np.load(os.path.join(cache_dir, LABELS_FILE))
+        # Opened lazily so each DataLoader worker maps the file itself
+        self._images = None
+
+    @classmethod
+    def from_dirs(cls, normal_dir, reversal_dir, correct_dir, cache_dir, num_workers=8):
+        """List the source directories like HandwritingDataset and build/refresh the cache."""
+        source = HandwritingDataset(normal_dir, reversal_dir, correct_dir)
+        ensure_image_cache(source.image_paths, source.labels, cache_dir, num_workers)
+        return cls(cache_dir)
+
+    @classmethod
+    def from_manifest(cls, manifest, cache_dir, deduplicate=True, num_workers=8):
+        """Build/refresh the cache from a Manifest, keyed on its content hashes."""
+        indices = manifest.unique_indices() if deduplicate else np.arange(len(manifest))
+        image_paths = [manifest.path(i) for i in indices]
+        ensure_image_cache(image_paths, manifest.labels[indices], cache_dir, num_workers,
+                           fingerprint=manifest.fingerprint(indices))
+        return cls(cache_dir)
+
+    def __len__(self):
+        return len(self.image_paths)
+
+    def __getitem__(self, idx):
+        if self._images is None:
+            self._images = np.load(os.path.join(self.cache_dir, IMAGES_FILE), mmap_mode='r')
+
+        # Equivalent to ToTensor() + Normalize() on the resized image
+        pixels = torch.from_numpy(np.asarray(self._images[idx], dtype=np.float32))
+        image = (pixels.permute(2, 0, 1) / 255.0 - MEAN) / STD
+
+        return image, int(self.labels[idx])
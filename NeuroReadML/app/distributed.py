@@ -0,0 +1,73 @@
+"""
+Multi-process data-parallel CPU training.
+
+train_distributed launches one worker process per data-parallel rank on
+this machine. Each worker joins a gloo process group and runs the regular
+train_model loop, which wraps the model in DistributedDataParallel, shards
+the data with DistributedSampler and saves checkpoints from rank 0 only.
+Several machines can join the same run over TCP by giving each one the
+same master address and port and its own node_rank. The dataset manifest
+and image cache are built by the launching process before the workers
+start, so the workers never write them concurrently.
+"""
+
+import os
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+
+def threads_per_process(nprocs):
+    """Split this machine's cores evenly between the worker processes."""
+    return max(1, (os.cpu_count() or 1) // nprocs)
+
+
+def train_distributed(normal_dir, reversal_dir, correct_dir, nprocs=2, nnodes=1, node_rank=0,
+                      master_addr='127.0.0.1', master_port=29500, num_threads=None,
+                      **train_kwargs):
+    """
+    Train with DistributedDataParallel over the gloo backend.
+
+    Args:
+        normal_dir, reversal_dir, correct_dir: Training image directories
+        nprocs: Worker processes on this machine
+        nnodes: Number of machines taking part
+        node_rank: Index of this machine (0 hosts the master)
+        master_addr, master_port: TCP address of the rank 0 process
+        num_threads: torch threads per worker (default: cores / nprocs)
+        **train_kwargs: Passed on to app.train.train_model (batch_size is per process)
+    """
+    num_threads = num_threads or threads_per_process(nprocs)
+    # Build the manifest and image cache here, once, so the workers only read them
+    if train_kwargs.get('cache_dir') or train_kwargs.get('manifest_path'):
+        from .preprocessing import load_dataset
+        load_dataset(normal_dir, reversal_dir, correct_dir,
+                     cache_dir=train_kwargs.get('cache_dir'),
+                     manifest_path=train_kwargs.get('manifest_path'))
+    
+    print(f"Starting {nprocs} training processes on node {node_rank} of {nnodes} "
+          f"({num_threads} threads each)")
+    mp.spawn(
+        _worker,
+        args=(nprocs, nnodes, node_rank, master_addr, master_port, num_threads,
+              (normal_dir, reversal_dir, correct_dir), train_kwargs),
+        nprocs=nprocs,
+        join=True
+    )
+
+
+def _worker(local_rank, nprocs, nnodes, node_rank, master_addr, master_port, num_threads,
+            data_dirs, train_kwargs):
+    from .train import train_model
+
+    torch.set_num_threads(num_threads)
+    dist.init_process_group(
+        'gloo',
+        init_method=f'tcp://{master_addr}:{master_port}',
+        rank=node_rank * nprocs + local_rank,
+        world_size=nnodes * nprocs
+    )
+    try:
+        train_model(*data_dirs, device=torch.device('cpu'), **train_kwargs)
+    finally:
+        dist.destroy_process_group()
@@ -0,0 +1,281 @@
+"""
+Frozen-backbone embedding cache for fast head-only retraining.
+
+The ResNet18 backbone is run once over the dataset and its features are
+stored on disk, keyed by the SHA-256 of each image file. Retraining then
+only fits the fc head (optionally together with the last residual block)
+on the cached features, so adding a few hundred labelled samples only
+costs a backbone pass over the new files.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import time
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.utils.data import Dataset, DataLoader, TensorDataset
+from PIL import Image
+
+from .model import create_dyslexia_model, load_model, save_model
+from .preprocessing import HandwritingDataset, get_transform, load_image, split_indices
+from .cache import file_sha256
+
+# Pooled 512-d features for the fc head, or layer3 maps for unfreezing layer4
+FEATURE_LAYERS = ('avgpool', 'layer3')
+
+
+def backbone_extractor(model, feature_layer='avgpool'):
+    """Return a frozen module that maps images to the features at feature_layer."""
+    if feature_layer == 'avgpool':
+        layers = [model.conv1, model.bn1, model.relu, model.maxpool,
+                  model.layer1, model.layer2, model.layer3, model.layer4,
+                  model.avgpool, nn.Flatten()]
+    elif feature_layer == 'layer3':
+        layers = [model.conv1, model.bn1, model.relu, model.maxpool,
+                  model.layer1, model.layer2, model.layer3]
+    else:
+        raise ValueError(f"feature_layer must be one of {FEATURE_LAYERS}")
+
+    extractor = copy.deepcopy(nn.Sequential(*layers)).eval()
+    for param in extractor.parameters():
+        param.requires_grad = False
+    return extractor
+
+
+def module_fingerprint(module):
+    """Hash the weights of a module, so cached features are tied to the exact backbone."""
+    digest = hashlib.sha256()
+    for name, tensor in module.state_dict().items():
+        digest.update(name.encode())
+        digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """On-disk store of backbone features keyed by image file hash."""
+
+    def __init__(self, cache_dir, feature_layer, backbone_id):
+        self.cache_dir = cache_dir
+        self.feature_layer = feature_layer
+        self.backbone_id = backbone_id
+        self.features_path = os.path.join(cache_dir, f"{feature_layer}_features.npy")
+        self.index_path = os.path.join(cache_dir, f"{feature_layer}_index.json")
+
+        self.keys = []
+        self.features = None
+        if os.path.exists(self.index_path) and os.path.exists(self.features_path):
+            with open(self.index_path) as f:
+                index = json.load(f)
+            # Features from a different backbone are not reusable
+            if index.get('backbone_id') == backbone_id:
+                self.keys = index['keys']
+                self.features = np.load(self.features_path)
+        self._rows = {key: row for row, key in enumerate(self.keys)}
+
+    def missing(self, keys):
+        """Return the keys that have no cached features yet."""
+        return [key for key in dict.fromkeys(keys) if key not in self._rows]
+
+    def add(self, keys, features):
+        """Append features for new keys."""
+        if not keys:
+            return
+        self.features = features if self.features is None else np.concatenate([self.features, features])
+        for key in keys:
+            self._rows[key] = len(self.keys)
+            self.keys.append(key)
+
+    def lookup(self, keys):
+        """Return the stacked features for keys, in order."""
+        return self.features[[self._rows[key] for key in keys]]
+
+    def save(self):
+        """Write features and index atomically."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        np.save(self.features_path + '.tmp.npy', self.features)
+        os.replace(self.features_path + '.tmp.npy', self.features_path)
+        with open(self.index_path + '.tmp', 'w') as f:
+            json.dump({'backbone_id': self.backbone_id, 'keys': self.keys}, f)
+        os.replace(self.index_path + '.tmp', self.index_path)
+
+
+class HandwritingFiles(Dataset):
+    """Transformed images from a list of paths, without labels."""
+
+    def __init__(self, image_paths, transform):
+        self.image_paths = image_paths
+        self.transform = transform
+
+    def __len__(self):
+        return len(self.image_paths)
+
+    def __getitem__(self, idx):
+        image = load_image(self.image_paths[idx])
+        if image is None:
+            # Same blank-image fallback as HandwritingDataset
+            image = Image.new('RGB', (224, 224), color='white')
+        return self.transform(image)
+
+
+def compute_features(extractor, image_paths, device, batch_size=64):
+    """Run the frozen backbone over image_paths and return a float16 array."""
+    transform = get_transform()
+    dataset = HandwritingFiles(image_paths, transform)
+    loader = DataLoader(dataset, batch_size=batch_size, num_workers=4)
+
+    extractor = extractor.to(device)
+    outputs = []
+    with torch.no_grad():
+        for inputs in loader:
+            outputs.append(extractor(inputs.to(device)).cpu().half().numpy())
+    return np.concatenate(outputs)
+
+
+def build_head(model, unfreeze_last_block=False):
+    """Return the trainable part of the model that sits on top of the cached features."""
+    if unfreeze_last_block:
+        return nn.Sequential(model.layer4, model.avgpool, nn.Flatten(), model.fc)
+    return model.fc
+
+
+def train_head(normal_dir, reversal_dir, correct_dir,
+               model_save_path='models/dyslexia_model.pth',
+               embedding_cache_dir='models/embeddings',
+               base_model_path=None,
+               unfreeze_last_block=False,
+               batch_size=32,
+               num_epochs=30,
+               learning_rate=0.001,
+               device=None,
+               val_split=0.2,
+               seed=42,
+               manifest_path=None,
+               progress=None):
+    """
+    Train only the classifier head on cached backbone features.
+
+    Args:
+        normal_dir, reversal_dir, correct_dir: Training image directories
+        model_save_path: Where to save the resulting standard checkpoint
+        embedding_cache_dir: Directory holding the cached features
+        base_model_path: Checkpoint whose backbone is used (ImageNet weights if None)
+        unfreeze_last_block: Also train layer4 (caches layer3 features instead)
+        batch_size, num_epochs, learning_rate: Head training settings
+        device: Device to use (cuda/cpu)
+        manifest_path: Optional dataset manifest (see app.manifest) used instead
+            of listing the directories; its content hashes key the cache
+        progress: Optional callable receiving the epoch's losses and
+            accuracies after every epoch
+
+    Returns:
+        Dictionary containing training history
+    """
+    os.makedirs(os.path.dirname(model_save_path), exist_ok=True)
+    if device is None:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    print(f"Using device: {device}")
+
+    since = time.time()
+    torch.manual_seed(seed)
+
+    if base_model_path:
+        model = load_model(base_model_path, backend='eager')
+    else:
+        model = create_dyslexia_model(num_classes=3, pretrained=True)
+    model.eval()
+
+    # The cache stays valid as long as the frozen layers are unchanged, even
+    # when the base checkpoint is the one this function overwrites
+    feature_layer = 'layer3' if unfreeze_last_block else 'avgpool'
+    extractor = backbone_extractor(model, feature_layer)
+    cache = EmbeddingCache(embedding_cache_dir, feature_layer, module_fingerprint(extractor))
+
+    # Hash every file; only new ones go through the backbone
+    if manifest_path:
+        from .manifest import load_or_build_manifest
+        manifest = load_or_build_manifest(manifest_path, normal_dir, reversal_dir, correct_dir)
+        image_paths, image_labels = manifest.paths(), manifest.labels.astype(np.int64)
+        # The manifest already holds the SHA-256 of every file
+        keys = [bytes(digest).hex() for digest in manifest.hashes]
+    else:
+        dataset = HandwritingDataset(normal_dir, reversal_dir, correct_dir)
+        image_paths, image_labels = dataset.image_paths, dataset.labels
+        keys = [file_sha256(path) for path in image_paths]
+
+    missing = cache.missing(keys)
+    if missing:
+        first_path = {}
+        for key, path in zip(keys, image_paths):
+            first_path.setdefault(key, path)
+        print(f"Computing backbone features for {len(missing)} new images")
+        features = compute_features(extractor, [first_path[key] for key in missing], device)
+        cache.add(missing, features)
+        cache.save()
+    print(f"Using {len(set(keys)) - len(missing)} cached and {len(missing)} new embeddings")
+
+    features = torch.from_numpy(cache.lookup(keys)).float()
+    labels = torch.tensor(image_labels, dtype=torch.long)
+    train_indices, val_indices = split_indices(len(keys), val_split, seed)
+
+    train_loader = DataLoader(TensorDataset(features[train_indices], labels[train_indices]),
+                              batch_size=batch_size, shuffle=True)
+    val_loader = DataLoader(TensorDataset(features[val_indices], labels[val_indices]),
+                            batch_size=batch_size)
+
+    head = build_head(model, unfreeze_last_block).to(device)
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(head.parameters(), lr=learning_rate)
+
+    history = {'train_loss': [], 'val_loss': [], 'train_acc': [], 'val_acc': []}
+    best_acc = 0.0
+    best_state = copy.deepcopy(head.state_dict())
+
+    for epoch in range(num_epochs):
+        for phase, loader in (('train', train_loader), ('val', val_loader)):
+            head.train(phase == 'train')
+            running_loss = 0.0
+            running_corrects = 0
+            with torch.set_grad_enabled(phase == 'train'):
+                for inputs, targets in loader:
+                    inputs, targets = inputs.to(device), targets.to(device)
+                    outputs = head(inputs)
+                    loss = criterion(outputs, targets)
+                    if phase == 'train':
+                        optimizer.zero_grad()
+                        loss.backward()
+                        optimizer.step()
+                    running_loss += loss.item() * inputs.size(0)
+                    running_corrects += (outputs.argmax(1) == targets).sum().item()
+
+            count = len(loader.dataset)
+            history[f'{phase}_loss'].append(running_loss / count if count else float('inf'))
+            history[f'{phase}_acc'].append(running_corrects / count if count else 0.0)
+
+        print(f"Epoch {epoch+1}/{num_epochs} - "
+              f"Train Loss: {history['train_loss'][-1]:.4f} Acc: {history['train_acc'][-1]:.4f} - "
+              f"Val Loss: {history['val_loss'][-1]:.4f} Acc: {history['val_acc'][-1]:.4f}")
+
+        if history['val_acc'][-1] > best_acc:
+            best_acc = history['val_acc'][-1]
+            best_state = copy.deepcopy(head.state_dict())
+
+        if progress is not None:
+            progress({'epoch': epoch + 1, 'num_epochs': num_epochs,
+                      'train_loss': history['train_loss'][-1], 'val_loss': history['val_loss'][-1],
+                      'train_acc': history['train_acc'][-1], 'val_acc': history['val_acc'][-1],
+                      'best_val_acc': best_acc})
+
+    # Put the best head back into the full model and save a standard checkpoint
+    head.load_state_dict(best_state)
+    model.to('cpu')
+    save_model(model, model_save_path)
+
+    time_elapsed = time.time() - since
+    print(f'Head training complete in {time_elapsed//60:.0f}m {time_elapsed%60:.0f}s')
+    print(f'Best val Acc: {best_acc:.4f}')
+
+    return history
@@ -0,0 +1,227 @@
+"""
+Long-lived inference engine for the dyslexia detection pipeline.
+
+The engine loads the model once, warms it up and then runs the same steps
+as predict.py (segmentation, letter scoring, LLM analysis and translation)
+for every image it is given.
+"""
+
+import asyncio
+import os
+from itertools import islice
+import torch
+
+from .backends import get_backend, artifact_path, weights_path
+from .cache import file_sha256
+from .model import load_model, analyze_handwriting, analyze_handwriting_batch
+from .preprocessing import preprocess_letter_crops
+from .utils import (get_device, interpret_result, decode_image, extract_letters, stream_letters,
+                    save_letter_crops,
+                    calculate_final_results, find_overall_risk, response_structure)
+
+
+class InferenceEngine:
+    """Keep the dyslexia model in memory and run the prediction pipeline."""
+
+    def __init__(self, model_path='models/dyslexia_model.pth', letters_folder='segmented_letters',
+                 device=None, max_batch_size=32, save_letters=False, backend=None,
+                 strip_height=None):
+        self.model_path = model_path
+        self.backend = get_backend(backend)
+        self.letters_folder = letters_folder
+        self.max_batch_size = max_batch_size
+        self.save_letters = save_letters
+        # Segment in strips of this many rows and score letters as they arrive
+        self.strip_height = strip_height
+        self.device = device if device is not None else get_device()
+        self.model = None
+        # Backend and SHA-256 of the file the served model was read from
+        self.model_version = None
+        self._ready = False
+
+    @property
+    def ready(self):
+        """True once the model is loaded and warmed up."""
+        return self._ready
+
+    def load(self, warmup=True):
+        """Load the model weights and optionally run a warm-up inference."""
+        serving_path = artifact_path(self.model_path, self.backend)
+        if not os.path.exists(serving_path):
+            raise FileNotFoundError(f"Model not found at {serving_path}")
+
+        # Identify exactly what is served: eager weights may come from a
+        # .safetensors copy, other backends from their exported artifact
+        served_file = weights_path(self.model_path) if self.backend == 'eager' else serving_path
+        model_version = f"{self.backend}-{file_sha256(served_file)}"
+        model = load_model(self.model_path, backend=self.backend)
+        model.to(self.device)
+        self.model = model
+        self.model_version = model_version
+
+        if warmup:
+            self.warmup()
+
+        self._ready = True
+        return self
+
+    def warmup(self):
+        """Run a dummy forward pass so the first real request is not slow."""
+        dummy = torch.zeros(1, 3, 224, 224, device=self.device)
+        analyze_handwriting(self.model, dummy, self.device)
+
+    def score_letters(self, image):
+        """
+        Segment an image into letters and score each one with the CNN.
+
+        The letter crops stay in memory. They are also written to
+        letters_folder when save_letters is set, which is useful for debugging.
+
+        Args:
+            image: Path to the image or a grayscale NumPy array
+
+        Returns the dictionary produced by calculate_final_results, or None
+        if no letters were found.
+        """
+        if self.strip_height:
+            return self.score_letter_stream(image)
+
+        letters = extract_letters(image)
+        if not letters:
+            return None
+
+        all_results = self._score_chunk(letters)
+        letters_folder = self.letters_folder if self.save_letters else None
+        return calculate_final_results(all_results, letters, letters_folder)
+
+    def score_letter_stream(self, image):
+        """
+        Like score_letters, but segments large (multi-page) scans strip by strip.
+
+        Letters are scored in batches of max_batch_size as the segmentation
+        generator produces them, so no more than one batch of crops is held
+        in memory.
+
+        Args:
+            image: Path, encoded image bytes or a grayscale NumPy array
+        """
+        letters = stream_letters(image, self.strip_height)
+        all_results = []
+        while True:
+            chunk = list(islice(letters, self.max_batch_size))
+            if not chunk:
+                break
+            all_results.extend(self._score_chunk(chunk))
+        if not all_results:
+            return None
+
+        letters_folder = self.letters_folder if self.save_letters else None
+        return calculate_final_results(all_results, all_results, letters_folder)
+
+    def _score_chunk(self, letters):
+        """Score a list of letter crops and interpret every prediction."""
+        letter_paths = [None] * len(letters)
+        if self.save_letters:
+            letter_paths = save_letter_crops(letters, self.letters_folder)
+
+        letters_tensor = preprocess_letter_crops([letter['image'] for letter in letters])
+        predictions = analyze_handwriting_batch(
+            self.model, letters_tensor, self.device, self.max_batch_size
+        )
+        return [interpret_result(letter_path, prediction)
+                for letter_path, prediction in zip(letter_paths, predictions)]
+
+    def predict(self, image, language='english'):
+        """
+        Run the full pipeline on an image and return the response dictionary.
+
+        Args:
+            image: Path to the image file or the raw encoded image bytes
+            language: Language to translate the detailed text to
+
+        Raises:
+            ValueError: If image bytes cannot be decoded
+            RuntimeError: If the engine is not loaded or a pipeline step fails
+        """
+        final_results = self._score_for_prediction(image)
+        return explain_results(image, final_results, language)
+
+    async def predict_async(self, image, language='english'):
+        """
+        Awaitable predict.
+
+        Letters are scored in a worker thread; the LLM analysis is awaited
+        on the event loop, so many requests can wait on the LLM at once
+        without holding a thread each.
+        """
+        final_results = await asyncio.to_thread(self._score_for_prediction, image)
+        return await explain_results_async(image, final_results, language)
+
+    def _score_for_prediction(self, image):
+        if self.model is None:
+            raise RuntimeError("Model not loaded. Call load() first.")
+
+        if isinstance(image, (bytes, bytearray)) and not self.strip_height:
+            final_results = self.score_letters(decode_image(image))
+        else:
+            final_results = self.score_letters(image)
+        if final_results is None:
+            raise RuntimeError("No letters found in the image")
+        return final_results
+
+
+def explain_results(image, final_results, language='english'):
+    """
+    Add the LLM spelling analysis and translation to letter scores.
+
+    Args:
+        image: Path to the image file or the raw encoded image bytes
+        final_results: Dictionary returned by InferenceEngine.score_letters
+        language: Language to translate the detailed text to
+
+    Returns the response dictionary built by response_structure.
+    """
+    # The API clients are slow to import; letter scoring alone never needs them
+    from .llama_evaluate import analyze_image_for_spelling
+    from .translation import translate
+
+    llama_result = analyze_image_for_spelling(image, final_results.get('adjusted_dyslexia_score'))
+    _check_spelling_result(llama_result)
+
+    translate_text = None
+    if language != "english":
+        translate_text = translate(llama_result['detailed_text'], language)
+
+    return _build_response(final_results, llama_result, translate_text)
+
+
+async def explain_results_async(image, final_results, language='english'):
+    """Awaitable explain_results."""
+    from .llama_evaluate import analyze_image_for_spelling_async
+    from .translation import translate
+
+    llama_result = await analyze_image_for_spelling_async(
+        image, final_results.get('adjusted_dyslexia_score')
+    )
+    _check_spelling_result(llama_result)
+
+    translate_text = None
+    if language != "english":
+        # The translation client is blocking
+        translate_text = await asyncio.to_thread(translate, llama_result['detailed_text'], language)
+
+    return _build_response(final_results, llama_result, translate_text)
+
+
+def _check_spelling_result(llama_result):
+    if not isinstance(llama_result, dict):
+        raise RuntimeError(f"Spelling analysis failed: {llama_result}")
+
+
+def _build_response(final_results, llama_result, translate_text):
+    overall_score = find_overall_risk(
+        final_results.get('adjusted_dyslexia_score'),
+        llama_result.get('Orthographic_irregularity'),
+        llama_result.get('Motor_variability')
+    )
+    return response_structure(overall_score, final_results, llama_result, translate_text)
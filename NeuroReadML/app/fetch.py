@@ -0,0 +1,68 @@
+"""
+Async, connection-pooled image downloads for the prediction API.
+"""
+
+import asyncio
+import httpx
+
+
+class ImageTooLargeError(Exception):
+    """Raised when a download exceeds the configured size limit."""
+
+
+class ImageFetcher:
+    """Download images over a shared pool of keep-alive connections."""
+
+    def __init__(self, max_bytes=20 * 1024 * 1024, timeout=15.0, max_connections=20):
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client = None
+
+    async def start(self):
+        """Open the shared HTTP client."""
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.timeout),
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections),
+            follow_redirects=True
+        )
+
+    async def close(self):
+        """Close the shared HTTP client and its connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def fetch(self, url):
+        """
+        Download url and return its body as bytes.
+
+        Raises:
+            ImageTooLargeError: If the body is larger than max_bytes
+            httpx.TimeoutException: If connecting or reading a chunk times out
+            httpx.HTTPError: If the request fails or returns an error status
+            asyncio.TimeoutError: If the whole download takes longer than timeout
+        """
+        if self._client is None:
+            raise RuntimeError("Fetcher is not started")
+
+        return await asyncio.wait_for(self._fetch(url), self.timeout)
+
+    async def _fetch(self, url):
+        async with self._client.stream("GET", url) as response:
+            response.raise_for_status()
+
+            content_length = response.headers.get("content-length")
+            if content_length is not None and int(content_length) > self.max_bytes:
+                raise ImageTooLargeError(
+                    f"Image is {content_length} bytes, limit is {self.max_bytes}"
+                )
+
+            body = bytearray()
+            async for chunk in response.aiter_bytes():
+                body.extend(chunk)
+                if len(body) > self.max_bytes:
+                    raise ImageTooLargeError(f"Image exceeds limit of {self.max_bytes} bytes")
+
+        return bytes(body)
@@ -0,0 +1,250 @@
+"""
+Training jobs that run outside the serving process.
+
+start_training_job runs train_model in a separate, spawned process. There
+it holds no lock that /predict needs (the GIL) and is limited to a CPU
+budget: a torch thread count, an optional set of cores and a lower
+scheduling priority. The job trains into its own candidate checkpoint and
+records its state and per-epoch progress in <JOBS_DIR>/<job_id>.json, so
+any API worker can report it.
+
+When the process exits, the serving process validates the candidate
+(validate_checkpoint), moves it over the served checkpoint with an atomic
+rename (promote_checkpoint) and swaps the in-memory model. With a
+non-eager MODEL_BACKEND the candidate is exported first (export_candidate),
+so the swapped model keeps the configured backend. Other API workers
+notice the new file (file_signature) and reload it themselves. Only one
+job runs at a time across all workers (acquire_training_lock).
+"""
+
+import functools
+import json
+import math
+import multiprocessing as mp
+import os
+import time
+import traceback
+import uuid
+
+import torch
+
+from .backends import (get_backend, artifact_path, export_torchscript, export_onnx, check_parity,
+                       load_torchscript_model, OnnxRuntimeModel)
+from .model import load_model
+
+JOBS_DIR = os.getenv("TRAIN_JOBS_DIR", "models/jobs")
+# Torch threads for a training job (default: half the cores)
+TRAIN_THREADS = int(os.getenv("TRAIN_THREADS", "0")) or max(1, (os.cpu_count() or 1) // 2)
+# Cores a training job may run on, e.g. "2-3" or "2,3" (default: all)
+TRAIN_CPUS = os.getenv("TRAIN_CPUS")
+# Added to the job's niceness so /predict wins when cores are contended
+TRAIN_NICE = int(os.getenv("TRAIN_NICE", "10"))
+
+
+def new_job_id():
+    """Return a short random job id."""
+    return uuid.uuid4().hex[:12]
+
+
+def job_path(job_id):
+    """State file of a job."""
+    return os.path.join(JOBS_DIR, f"{job_id}.json")
+
+
+def candidate_path(job_id):
+    """Checkpoint a job trains into before it is validated and promoted."""
+    return os.path.join(JOBS_DIR, f"{job_id}.pth")
+
+
+def read_job(job_id):
+    """Return the recorded state of a job, or None if there is no such job."""
+    try:
+        with open(job_path(job_id)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def update_job(job_id, **fields):
+    """Merge fields into a job's state file, replacing it atomically."""
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    job = read_job(job_id) or {'job_id': job_id}
+    job.update(fields, updated_at=time.time())
+    tmp_path = f"{job_path(job_id)}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(job, f, indent=2)
+    os.replace(tmp_path, job_path(job_id))
+    return job
+
+
+def acquire_training_lock():
+    """
+    Take the lock that lets one training job run at a time across API workers.
+
+    Returns the open lock file, to be closed when the job has finished, or
+    None if another worker's job holds the lock. The lock is released when
+    its process exits, so a crashed worker cannot leave it behind.
+    """
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    lock_file = open(os.path.join(JOBS_DIR, 'training.lock'), 'w')
+    try:
+        import fcntl
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except ImportError:
+        # No fcntl (Windows): only the worker's own job list guards against parallel jobs
+        pass
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def file_signature(path):
+    """Identify a version of a file (inode, size, mtime), or None if it is missing."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def parse_cpu_list(text):
+    """Parse a CPU list such as "0-3,6" into a set of core numbers."""
+    cpus = set()
+    for part in text.split(','):
+        if '-' in part:
+            start, end = part.split('-')
+            cpus.update(range(int(start), int(end) + 1))
+        elif part.strip():
+            cpus.add(int(part))
+    return cpus
+
+
+def _report_progress(job_id, metrics):
+    update_job(job_id, status='running', progress=metrics)
+
+
+def _run_job(job_id, train_kwargs, num_threads, cpus, niceness):
+    """Entry point of the training process."""
+    try:
+        if cpus and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, parse_cpu_list(cpus))
+        if niceness:
+            os.nice(niceness)
+        torch.set_num_threads(num_threads)
+        update_job(job_id, status='running', pid=os.getpid(), num_threads=num_threads)
+
+        from .train import train_model
+        history = train_model(progress=functools.partial(_report_progress, job_id), **train_kwargs)
+        if not os.path.exists(train_kwargs['model_save_path']):
+            raise RuntimeError("Training finished without saving a model")
+        update_job(job_id, status='trained',
+                   best_val_acc=max(history['val_acc']) if history and history.get('val_acc') else None)
+    except Exception as e:
+        traceback.print_exc()
+        update_job(job_id, status='failed', error=str(e))
+        raise SystemExit(1)
+
+
+def start_training_job(job_id, train_kwargs, num_threads=None, cpus=None, niceness=None):
+    """
+    Start train_model(**train_kwargs) in a new process and return the process.
+
+    The CPU budget defaults to TRAIN_THREADS, TRAIN_CPUS and TRAIN_NICE.
+    """
+    num_threads = num_threads or TRAIN_THREADS
+    cpus = cpus if cpus is not None else TRAIN_CPUS
+    niceness = niceness if niceness is not None else TRAIN_NICE
+    update_job(job_id, status='queued', created_at=time.time(), params={
+        key: value for key, value in train_kwargs.items()
+        if isinstance(value, (str, int, float, bool, type(None)))
+    })
+
+    # Spawn, not fork: forking a process whose OpenMP pool is running can hang the child
+    process = mp.get_context('spawn').Process(
+        target=_run_job, args=(job_id, train_kwargs, num_threads, cpus, niceness),
+        name=f"train-{job_id}", daemon=False
+    )
+    process.start()
+    return process
+
+
+def validate_checkpoint(path, device='cpu', num_classes=3):
+    """
+    Load a candidate checkpoint and check that it produces sane outputs.
+
+    Returns the loaded model, ready to serve.
+
+    Raises:
+        ValueError: If the outputs have the wrong shape or are not finite
+    """
+    model = load_model(path, num_classes=num_classes, backend='eager')
+    model.to(device)
+    with torch.no_grad():
+        outputs = model(torch.zeros(2, 3, 224, 224, device=device))
+    if tuple(outputs.shape) != (2, num_classes):
+        raise ValueError(f"Expected outputs of shape (2, {num_classes}), got {tuple(outputs.shape)}")
+    if not torch.isfinite(outputs).all():
+        raise ValueError("Model outputs are not finite")
+    return model
+
+
+def export_candidate(path, backend=None, atol=1e-4):
+    """
+    Export a validated candidate for the serving backend (default: MODEL_BACKEND).
+
+    Writes the TorchScript or ONNX artifact next to the candidate and checks
+    that it matches the eager model. Returns the artifact path, or None for
+    the eager backend.
+
+    Raises:
+        ValueError: For the quantized backend, which needs calibration data
+            (run quantize_model.py on the candidate), or if the export does
+            not match the eager model
+    """
+    backend = get_backend(backend)
+    if backend == 'eager':
+        return None
+    if backend == 'quantized':
+        raise ValueError(f"MODEL_BACKEND=quantized cannot be swapped automatically; "
+                         f"quantize {path} with quantize_model.py and restart")
+    model = load_model(path, backend='eager')
+    inputs = torch.randn(4, 3, 224, 224)
+    if backend == 'torchscript':
+        exported = export_torchscript(model, artifact_path(path, backend))
+        max_diff, ok = check_parity(model, load_torchscript_model(exported), inputs, atol)
+    else:
+        exported = export_onnx(model, artifact_path(path, backend))
+        max_diff, ok = check_parity(model, OnnxRuntimeModel(exported), inputs, atol)
+    if not ok:
+        raise ValueError(f"{backend} export differs from the eager model (max abs diff {max_diff:.2e})")
+    return exported
+
+
+def promote_checkpoint(path, model_path, backend=None):
+    """
+    Atomically replace the served checkpoint with a validated candidate.
+
+    The candidate's artifact for a non-eager backend (see export_candidate)
+    is moved into place first, so a process that reloads because the .pth
+    changed never finds a stale artifact.
+    """
+    os.makedirs(os.path.dirname(model_path) or '.', exist_ok=True)
+    backend = get_backend(backend)
+    if backend != 'eager':
+        os.replace(artifact_path(path, backend), artifact_path(model_path, backend))
+    os.replace(path, model_path)
+    # Newer than any exported .safetensors copy, so the new weights are read
+    now = time.time()
+    os.utime(model_path, (now, now))
+
+
+def json_safe(value):
+    """Replace NaN and infinity, which JSON cannot represent, with None."""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {key: json_safe(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [json_safe(item) for item in value]
+    return value
@@ -0,0 +1,107 @@
+"""
+Incremental parser for the first JSON object in a stream of text.
+
+LLM replies wrap their JSON in prose and often keep writing after it.
+IncrementalJSONParser is fed the reply piece by piece. It tracks brace
+depth and string state to find the first complete top-level {...} object,
+so nested objects and braces inside strings are handled, and reports each
+top-level field as soon as its value is complete. Once feed() returns
+True the rest of the reply is not needed.
+"""
+
+import json
+
+
+class IncrementalJSONParser:
+    """
+    Find the first complete top-level JSON object in text fed in pieces.
+
+    Args:
+        on_field: Optional callback called as on_field(name, value) for each
+            top-level field of the object as soon as its value is complete
+    """
+
+    def __init__(self, on_field=None):
+        self.on_field = on_field
+        self.result = None
+        self.fields = {}
+        self._text = ''
+        self._pos = 0
+        self._start = None
+        self._member_start = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def done(self):
+        return self.result is not None
+
+    def feed(self, text):
+        """Add text; returns True once the first complete object has been parsed."""
+        if self.result is not None:
+            return True
+        self._text += text
+        while self._pos < len(self._text):
+            i = self._pos
+            char = self._text[i]
+            self._pos += 1
+            if self._start is None:
+                if char == '{':
+                    self._start = i
+                    self._member_start = i + 1
+                    self._depth = 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._member_done(i)
+                    try:
+                        self.result = json.loads(self._text[self._start:i + 1])
+                        return True
+                    except json.JSONDecodeError:
+                        # Not JSON after all (e.g. braces in prose); look again after its '{'
+                        self._pos = self._start + 1
+                        self._start = None
+                        self.fields = {}
+            elif char == ',' and self._depth == 1:
+                self._member_done(i)
+
+        if self._start is None:
+            # No object in progress, so nothing read so far is needed again
+            self._text = ''
+            self._pos = 0
+        return False
+
+    def _member_done(self, end):
+        """Parse the top-level "name": value member that ends at end."""
+        member = self._text[self._member_start:end].strip()
+        self._member_start = end + 1
+        if not member:
+            return
+        try:
+            item = json.loads('{' + member + '}')
+        except json.JSONDecodeError:
+            return
+        for name, value in item.items():
+            self.fields[name] = value
+            if self.on_field is not None:
+                self.on_field(name, value)
+
+
+def first_json_object(text):
+    """Return the first complete JSON object in text, or None."""
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    return parser.result
@@ -1,65 +1,175 @@
-from openai import OpenAI
+"""
+Spelling analysis of handwriting images with an OpenAI-compatible vision LLM.
+
+The endpoint is configured with BASE_URL, API_KEY and MODEL. Clients are
+created once and reused, so calls share pooled keep-alive connections: one
+blocking client for analyze_image_for_spelling and one asyncio client per
+event loop for analyze_image_for_spelling_async. Every call has a timeout
+(LLM_TIMEOUT), at most LLM_MAX_CONCURRENCY requests are in flight per
+client, and rate limits (429), server errors (5xx), timeouts and dropped
+connections are retried up to LLM_MAX_RETRIES times with jittered
+exponential backoff.
+
+With LLM_STREAM on (the default) the reply is streamed and the request is
+closed as soon as the first complete JSON object has arrived, so tokens
+the model writes after it are never generated. Top-level fields can be
+received as they complete through the on_field callback.
+
+The prompt is laid out for provider-side prefix (KV) caching: with
+PROMPT_LAYOUT=split (the default) the static instructions in
+prompt_system.md are sent as an identical system message on every request
+and only the image and a short suffix with the mirror writing score
+change. PROMPT_LAYOUT=inline sends the original prompt.md with the score
+substituted into it.
+
+Images are downsized and re-encoded by app/llm_image.py before they are
+base64 encoded (see LLM_IMAGE_* there). settings_fingerprint() identifies
+the model, prompt and image settings, so cached replies can be versioned
+by them.
+"""
+
+import asyncio
 import base64
-import sys
-from dotenv import load_dotenv
+import hashlib
+import json
 import os
+import random
+import threading
+import time
+import weakref
+from dotenv import load_dotenv
+import openai
+from openai import OpenAI, AsyncOpenAI
+from .json_stream import IncrementalJSONParser, first_json_object
+from .llm_image import image_settings, prepare_image
 load_dotenv()  # Load from .env
-import re
 BASE_URL = os.getenv("BASE_URL")
 API_KEY = os.getenv("API_KEY")
 MODEL = os.getenv("MODEL")
 
+# Seconds before a single LLM request is abandoned (and possibly retried)
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+# Requests in flight at once, per client
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Retries after a 429, 5xx, timeout or connection error
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+# Backoff before retry n is uniform in [0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2**n)]
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))
+# Stream replies and stop reading after the JSON object (set to 0 for servers without streaming)
+LLM_STREAM = os.getenv("LLM_STREAM", "1").lower() not in ("0", "false", "no")
+
+# 'split': static system prompt + per-request score suffix; 'inline': score substituted into prompt.md
+PROMPT_LAYOUT = os.getenv("PROMPT_LAYOUT", "split")
+PROMPT_LAYOUTS = ('split', 'inline')
 
-def encode_image_to_base64(image_path):
-    """Encode an image file to base64."""
-    with open(image_path, "rb") as image_file:
+PROMPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompt.md")
+SYSTEM_PROMPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompt_system.md")
+
+_prompt_templates = {}
+
+_client = None
+_client_lock = threading.Lock()
+_client_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+
+# asyncio clients and semaphores belong to the event loop they were created on
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def encode_image_to_base64(image):
+    """Encode an image file, or raw image bytes, to base64."""
+    if isinstance(image, (bytes, bytearray)):
+        return base64.b64encode(image).decode('utf-8')
+    with open(image, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode('utf-8')
 
 
+def read_prompt_template(file_path=PROMPT_PATH):
+    """Return the prompt template, reading the file only on first use."""
+    if file_path not in _prompt_templates:
+        with open(file_path, "r", encoding="utf-8") as file:
+            _prompt_templates[file_path] = file.read()
+    return _prompt_templates[file_path]
+
+
 def load_prompt_from_file(file_path, mirror_writing_score):
     """Load the prompt template from a markdown file and replace {Mirror_writing_score}."""
-    try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            content = file.read()
-            # Replace the placeholder with the given parameter
-            content = content.replace("{Mirror_writing_score}", str(mirror_writing_score))
-            return content
-    except Exception as e:
-        print(f"Error loading prompt file: {str(e)}")
-        sys.exit(1)
+    # Replace the placeholder with the given parameter
+    return read_prompt_template(file_path).replace("{Mirror_writing_score}", str(mirror_writing_score))
 
 
-import json
+def settings_fingerprint():
+    """
+    Short hash of everything besides the image that shapes the LLM reply.
+
+    It covers MODEL, PROMPT_LAYOUT, both prompt files and the LLM_IMAGE_*
+    settings, so it changes whenever a reply to the same image could.
+    """
+    settings = {'model': MODEL, 'layout': PROMPT_LAYOUT, 'image': image_settings(),
+                'prompt': read_prompt_template(PROMPT_PATH),
+                'system_prompt': read_prompt_template(SYSTEM_PROMPT_PATH)}
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
 
 def extract_json_from_text(text):
-    # This regex matches the first {...} block in the text
-    match = re.search(r'\{.*?\}', text, re.DOTALL)
-    if match:
-        json_str = match.group(0)
-        try:
-            data = json.loads(json_str)
-            return data
-        except json.JSONDecodeError:
-            return None  # JSON was invalid
-    return None  # No JSON found
-
-def analyze_image_for_spelling(image_path,mirror_score):
-    """Analyze an image for spelling mistakes using Llama vision model."""
-    model_name = MODEL  
-    
-    client = OpenAI(
-        base_url=BASE_URL,
-        api_key=API_KEY
-    )
-    
-    try:
-        # Encode image to base64
-        base64_image = encode_image_to_base64(image_path)
-        
-        # print(f"Analyzing image: {image_path}")
-        prompt_template = load_prompt_from_file("app/prompt.md",mirror_score)
-        # Construct the message with image content
-        messages = [
+    """Return the first complete JSON object in text (nested objects included), or None."""
+    return first_json_object(text)
+
+def get_client():
+    """Return the shared blocking client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            # Retries are handled here, with jittered backoff, not by the SDK
+            _client = OpenAI(base_url=BASE_URL, api_key=API_KEY,
+                             timeout=LLM_TIMEOUT, max_retries=0)
+    return _client
+
+
+def get_async_client():
+    """Return the asyncio client and semaphore of the running event loop."""
+    loop = asyncio.get_running_loop()
+    if loop not in _async_clients:
+        client = AsyncOpenAI(base_url=BASE_URL, api_key=API_KEY,
+                             timeout=LLM_TIMEOUT, max_retries=0)
+        _async_clients[loop] = (client, asyncio.Semaphore(LLM_MAX_CONCURRENCY))
+    return _async_clients[loop]
+
+
+async def close_async_client():
+    """Close the running event loop's client and its connections."""
+    entry = _async_clients.pop(asyncio.get_running_loop(), None)
+    if entry is not None:
+        await entry[0].close()
+
+
+def score_suffix(mirror_score):
+    """The per-request text that follows the image in the split layout."""
+    return f"The mirror writing score is {mirror_score}. Use it as Mirror_writing in the JSON."
+
+
+def build_messages(image, mirror_score, image_options=None, layout=None):
+    """
+    Chat messages with the prompt and the prepared, base64 encoded image.
+
+    image_options are passed to prepare_image (max_side, mode, image_format,
+    quality); layout overrides PROMPT_LAYOUT.
+    """
+    layout = layout or PROMPT_LAYOUT
+    if layout not in PROMPT_LAYOUTS:
+        raise ValueError(f"Unknown prompt layout '{layout}'. Choose from {', '.join(PROMPT_LAYOUTS)}")
+    prepared = prepare_image(image, **(image_options or {}))
+    base64_image = encode_image_to_base64(prepared['data'])
+    image_part = {
+        "type": "image_url",
+        "image_url": {
+            "url": f"data:{prepared['mime_type']};base64,{base64_image}"
+        }
+    }
+
+    if layout == 'inline':
+        prompt_template = load_prompt_from_file(PROMPT_PATH, mirror_score)
+        return [
             {
                 "role": "user",
                 "content": [
@@ -67,39 +177,172 @@ def analyze_image_for_spelling(image_path,mirror_score):
                         "type": "text", 
                         "text": prompt_template
                     },
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}"
-                        }
-                    }
+                    image_part
                 ]
             }
         ]
-        
-        # Make API call with properly formatted messages
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=messages,
-            temperature=0.2,
-            max_tokens=10000,
-            stream=False  
-        )
-        
-        # Return the full response
-        response = response.choices[0].message.content
-        if isinstance(response,str):
-            response_json = extract_json_from_text(response)
-            return response_json
-        else:
-            return response
-        
+
+    # Everything up to the image is identical on every request, so the
+    # server can reuse its cached prefill for it
+    return [
+        {
+            "role": "system",
+            "content": read_prompt_template(SYSTEM_PROMPT_PATH)
+        },
+        {
+            "role": "user",
+            "content": [
+                image_part,
+                {
+                    "type": "text",
+                    "text": score_suffix(mirror_score)
+                }
+            ]
+        }
+    ]
+
+
+def _request_options(messages, timeout, stream):
+    return dict(
+        model=MODEL,
+        messages=messages,
+        temperature=0.2,
+        max_tokens=10000,
+        stream=stream,
+        timeout=timeout or LLM_TIMEOUT
+    )
+
+
+def is_retryable(error):
+    """True for rate limits, server errors, timeouts and connection failures."""
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, openai.APIConnectionError)
+
+
+def backoff_delay(attempt, error=None):
+    """Seconds to wait before retry number attempt (0-based), with full jitter."""
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    try:
+        # Never retry before the server says so
+        delay = max(delay, min(LLM_BACKOFF_MAX, float(retry_after)))
+    except (TypeError, ValueError):
+        pass
+    return delay
+
+
+def parse_spelling_response(response):
+    """Extract the JSON analysis from the model's reply."""
+    response = response.choices[0].message.content
+    if isinstance(response, str):
+        return extract_json_from_text(response)
+    return response
+
+
+def _chunk_text(chunk):
+    if chunk.choices and chunk.choices[0].delta.content:
+        return chunk.choices[0].delta.content
+    return ''
+
+
+def read_spelling_stream(stream, on_field=None):
+    """
+    Read a streamed reply until its first JSON object is complete, then close it.
+
+    Returns the parsed object, or None if the reply contains no JSON object.
+    """
+    parser = IncrementalJSONParser(on_field)
+    try:
+        for chunk in stream:
+            if parser.feed(_chunk_text(chunk)):
+                break
+    finally:
+        # Closing the response tells the server to stop generating
+        stream.close()
+    return parser.result
+
+
+async def read_spelling_stream_async(stream, on_field=None):
+    """Awaitable read_spelling_stream."""
+    parser = IncrementalJSONParser(on_field)
+    try:
+        async for chunk in stream:
+            if parser.feed(_chunk_text(chunk)):
+                break
+    finally:
+        await stream.close()
+    return parser.result
+
+
+def _report_error(e):
+    print(f"Error analyzing image: {str(e)}")
+    if hasattr(e, 'response') and e.response:
+        print(f"Status code: {e.response.status_code}")
+        print(f"Response text: {e.response.text if hasattr(e.response, 'text') else 'No response text'}")
+
+
+def analyze_image_for_spelling(image, mirror_score, timeout=None, image_options=None,
+                               stream=None, on_field=None):
+    """
+    Analyze an image for spelling mistakes using Llama vision model.
+    The image can be a file path or the raw encoded image bytes;
+    image_options override the LLM_IMAGE_* preparation settings.
+
+    stream overrides LLM_STREAM. When streaming, on_field(name, value) is
+    called for each top-level field of the analysis as soon as it is
+    complete, e.g. Orthographic_irregularity before detailed_text arrives.
+
+    Blocks until the analysis is done. Threads calling this share one
+    connection pool. Returns the parsed JSON analysis, or an "Error: ..."
+    string if the request failed.
+    """
+    try:
+        client = get_client()
+        stream = LLM_STREAM if stream is None else stream
+        options = _request_options(build_messages(image, mirror_score, image_options), timeout, stream)
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            try:
+                with _client_slots:
+                    response = client.chat.completions.create(**options)
+                    if stream:
+                        return read_spelling_stream(response, on_field)
+                return parse_spelling_response(response)
+            except Exception as e:
+                if attempt == LLM_MAX_RETRIES or not is_retryable(e):
+                    raise
+                time.sleep(backoff_delay(attempt, e))
     except Exception as e:
-        print(f"Error analyzing image: {str(e)}")
-        if hasattr(e, 'response') and e.response:
-            print(f"Status code: {e.response.status_code}")
-            print(f"Response text: {e.response.text if hasattr(e.response, 'text') else 'No response text'}")
+        _report_error(e)
         return f"Error: {str(e)}"
 
 
+async def analyze_image_for_spelling_async(image, mirror_score, timeout=None, image_options=None,
+                                           stream=None, on_field=None):
+    """
+    Awaitable analyze_image_for_spelling.
 
+    Many analyses can be awaited concurrently on one event loop; at most
+    LLM_MAX_CONCURRENCY of them are sent at once.
+    """
+    try:
+        client, slots = get_async_client()
+        # Decoding and resizing a large photo would otherwise stall the event loop
+        messages = await asyncio.to_thread(build_messages, image, mirror_score, image_options)
+        stream = LLM_STREAM if stream is None else stream
+        options = _request_options(messages, timeout, stream)
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            try:
+                async with slots:
+                    response = await client.chat.completions.create(**options)
+                    if stream:
+                        return await read_spelling_stream_async(response, on_field)
+                return parse_spelling_response(response)
+            except Exception as e:
+                if attempt == LLM_MAX_RETRIES or not is_retryable(e):
+                    raise
+                await asyncio.sleep(backoff_delay(attempt, e))
+    except Exception as e:
+        _report_error(e)
+        return f"Error: {str(e)}"
@@ -0,0 +1,169 @@
+"""
+Image preparation for the vision LLM.
+
+Phone photos of worksheets are often several megapixels and megabytes, but
+vision LLMs downscale large images anyway, so most of those bytes only add
+upload time and image tokens. prepare_image downsizes the image to a
+target long edge, optionally converts it to grayscale or to a
+high-contrast (CLAHE) grayscale version, and re-encodes it. The defaults
+come from these environment variables:
+
+- LLM_IMAGE_MAX_SIDE: longest side in pixels (default 1536, 0 keeps the size)
+- LLM_IMAGE_MODE: 'original' (send the file unchanged), 'color',
+  'grayscale' or 'contrast' (default 'color')
+- LLM_IMAGE_FORMAT: 'jpeg', 'webp' or 'png' (default 'jpeg')
+- LLM_IMAGE_QUALITY: JPEG/WebP quality (default 85)
+
+Token counts are estimates made with OpenAI's high-detail tiling rule
+(85 tokens plus 170 per 512 px tile after scaling to fit 2048 px with a
+shortest side of at most 768 px). Other providers count differently, but
+the estimates still show how the settings compare.
+"""
+
+import io
+import math
+import os
+import threading
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+LLM_IMAGE_MAX_SIDE = int(os.getenv("LLM_IMAGE_MAX_SIDE", "1536"))
+LLM_IMAGE_MODE = os.getenv("LLM_IMAGE_MODE", "color")
+LLM_IMAGE_FORMAT = os.getenv("LLM_IMAGE_FORMAT", "jpeg")
+LLM_IMAGE_QUALITY = int(os.getenv("LLM_IMAGE_QUALITY", "85"))
+
+IMAGE_MODES = ('original', 'color', 'grayscale', 'contrast')
+IMAGE_FORMATS = {'jpeg': ('JPEG', 'image/jpeg'), 'webp': ('WEBP', 'image/webp'),
+                 'png': ('PNG', 'image/png')}
+
+_PIL_MIME_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp',
+                   'GIF': 'image/gif', 'BMP': 'image/bmp', 'TIFF': 'image/tiff'}
+
+# Totals over all prepared images, see payload_stats()
+_totals = {'images': 0, 'original_bytes': 0, 'bytes': 0, 'original_tokens': 0, 'tokens': 0}
+_totals_lock = threading.Lock()
+
+
+def estimate_image_tokens(width, height):
+    """Estimate the image tokens of a width x height image (OpenAI high-detail rule)."""
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def _read_bytes(image):
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    with open(image, 'rb') as f:
+        return f.read()
+
+
+def _flatten(img):
+    """Apply the EXIF orientation and put transparent images on a white background."""
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, 'white')
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+    return img.convert('RGB')
+
+
+def prepare_image(image, max_side=None, mode=None, image_format=None, quality=None):
+    """
+    Prepare an image file or encoded image bytes for the vision LLM.
+
+    Arguments left as None use the LLM_IMAGE_* defaults. In 'color' mode
+    an image that needs no resizing is sent unchanged when re-encoding
+    would not make it smaller.
+
+    Returns:
+        Dictionary with the encoded 'data', its 'mime_type', 'width' and
+        'height', the byte size and estimated tokens before and after
+        ('original_bytes', 'bytes', 'original_tokens', 'tokens') and the
+        original 'original_width' and 'original_height'
+
+    Raises:
+        ValueError: If the mode or format is unknown or the image cannot be read
+    """
+    max_side = LLM_IMAGE_MAX_SIDE if max_side is None else max_side
+    mode = mode or LLM_IMAGE_MODE
+    image_format = image_format or LLM_IMAGE_FORMAT
+    quality = quality or LLM_IMAGE_QUALITY
+    if mode not in IMAGE_MODES:
+        raise ValueError(f"Unknown image mode '{mode}'. Choose from {', '.join(IMAGE_MODES)}")
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unknown image format '{image_format}'. Choose from {', '.join(IMAGE_FORMATS)}")
+
+    original = _read_bytes(image)
+    try:
+        img = Image.open(io.BytesIO(original))
+        img.load()
+    except Exception as e:
+        raise ValueError(f"Could not read image: {e}") from e
+    source_format = img.format
+    img = _flatten(img)
+    width, height = img.size
+
+    prepared = {
+        'data': original,
+        'mime_type': _PIL_MIME_TYPES.get(source_format, 'image/jpeg'),
+        'original_width': width,
+        'original_height': height,
+        'width': width,
+        'height': height,
+        'original_bytes': len(original)
+    }
+
+    if mode != 'original':
+        resized = bool(max_side) and max(width, height) > max_side
+        if resized:
+            scale = max_side / max(width, height)
+            img = img.resize((max(1, round(width * scale)), max(1, round(height * scale))),
+                             Image.LANCZOS)
+        if mode == 'grayscale':
+            img = img.convert('L')
+        elif mode == 'contrast':
+            # Local contrast equalization evens out shadows and faint pencil strokes
+            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+            img = Image.fromarray(clahe.apply(np.asarray(img.convert('L'))))
+
+        pil_format, mime_type = IMAGE_FORMATS[image_format]
+        buffer = io.BytesIO()
+        if pil_format == 'PNG':
+            img.save(buffer, pil_format, optimize=True)
+        else:
+            img.save(buffer, pil_format, quality=quality)
+        data = buffer.getvalue()
+
+        if resized or mode != 'color' or len(data) < len(original):
+            prepared.update(data=data, mime_type=mime_type, width=img.width, height=img.height)
+
+    prepared['bytes'] = len(prepared['data'])
+    prepared['original_tokens'] = estimate_image_tokens(width, height)
+    prepared['tokens'] = estimate_image_tokens(prepared['width'], prepared['height'])
+
+    with _totals_lock:
+        _totals['images'] += 1
+        for key in ('original_bytes', 'bytes', 'original_tokens', 'tokens'):
+            _totals[key] += prepared[key]
+    return prepared
+
+
+def image_settings():
+    """The LLM_IMAGE_* defaults prepare_image uses."""
+    return {'max_side': LLM_IMAGE_MAX_SIDE, 'mode': LLM_IMAGE_MODE,
+            'format': LLM_IMAGE_FORMAT, 'quality': LLM_IMAGE_QUALITY}
+
+
+def payload_stats():
+    """Bytes and estimated image tokens sent to the LLM so far, before and after preparation."""
+    with _totals_lock:
+        stats = dict(_totals)
+    stats['bytes_saved'] = stats['original_bytes'] - stats['bytes']
+    stats['tokens_saved'] = stats['original_tokens'] - stats['tokens']
+    stats['settings'] = image_settings()
+    return stats
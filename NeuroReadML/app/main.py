@@ -1,14 +1,23 @@
-from fastapi import FastAPI, File, UploadFile, Form, BackgroundTasks
+from fastapi import FastAPI, File, UploadFile, Form
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+import asyncio
+import hashlib
+import io
 import os
 import torch
 import uvicorn
 
 from .preprocessing import preprocess_single_image
-from .model import load_model, analyze_handwriting
-from .train import train_model 
-from .utils import get_device, save_uploaded_file, interpret_result
+from .model import load_model
+from .checkpoint import checkpoint_path_for
+from .jobs import (new_job_id, candidate_path, read_job, update_job, start_training_job,
+                   validate_checkpoint, export_candidate, promote_checkpoint, json_safe,
+                   acquire_training_lock, file_signature)
+from .scheduler import BatchScheduler
+from .singleflight import SingleFlight
+from .utils import get_device, interpret_result
 
 # Initialize FastAPI application
 app = FastAPI(title="Dyslexia Detection API",
@@ -25,14 +34,38 @@ app.add_middleware(
 )
 
 # Global variables
-MODEL_PATH = "models/dyslexia_model.pth"
+MODEL_PATH = os.getenv("MODEL_PATH", "models/dyslexia_model.pth")
 DEVICE = get_device()
 model = None
+# Incremented every time a model is loaded or swapped in
+model_version = 0
+# file_signature of MODEL_PATH when the served model was loaded
+model_signature = None
+# Seconds between checks for a checkpoint promoted by another worker (0 disables)
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "2"))
 
-# Load model on startup if it exists
-@app.on_event("startup")
-def startup_event():
-    global model, DEVICE
+# Micro-batching settings for /predict
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "16"))
+MAX_BATCH_WAIT_MS = float(os.getenv("MAX_BATCH_WAIT_MS", "5"))
+scheduler = None
+
+# Coalesces concurrent /predict uploads of the same image
+flights = SingleFlight()
+
+# Training processes started by /train, by job id (see app.jobs)
+training_jobs = {}
+
+def load_checkpoint():
+    """Load MODEL_PATH onto DEVICE; returns the model and the file signature it was read at."""
+    signature = file_signature(MODEL_PATH)
+    new_model = load_model(MODEL_PATH)
+    new_model.to(DEVICE)
+    return new_model, signature
+
+
+def load_serving_model():
+    """Select the device and load the model (if one was trained) into the module globals."""
+    global model, model_version, model_signature, DEVICE
     
     # Try to create models directory if it doesn't exist
     os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
@@ -53,25 +86,91 @@ def startup_event():
     
     # Load model if exists
     if os.path.exists(MODEL_PATH):
-        try:
-            print(f"Loading model from {MODEL_PATH}...")
-            model = load_model(MODEL_PATH)
-            model.to(DEVICE)
-            print(f"Model successfully loaded from {MODEL_PATH}")
-        except Exception as e:
-            print(f"Error loading model: {e}")
-            print("Initializing a new model with pretrained weights")
-            try:
-                model = create_dyslexia_model(num_classes=3, pretrained=True)
-                model.to(DEVICE)
-            except Exception as e2:
-                print(f"Error creating new model: {e2}")
-                model = None
+        # A checkpoint that exists but cannot be loaded fails startup rather
+        # than serving an untrained classifier
+        print(f"Loading model from {MODEL_PATH}...")
+        model, model_signature = load_checkpoint()
+        model_version += 1
+        print(f"Model successfully loaded from {MODEL_PATH}")
     else:
         print(f"Model not found at {MODEL_PATH}. Please train the model first.")
         model = None
 
 
+# Load model on startup if it exists
+@app.on_event("startup")
+def startup_event():
+    # Workers forked by serve.py (app.prefork) inherit a model loaded by the master
+    if model is None:
+        load_serving_model()
+
+
+@app.on_event("startup")
+async def start_scheduler():
+    global scheduler
+    scheduler = BatchScheduler(model, DEVICE, MAX_BATCH_SIZE, MAX_BATCH_WAIT_MS)
+    scheduler.start()
+
+
+@app.on_event("startup")
+async def start_model_watcher():
+    if MODEL_RELOAD_INTERVAL > 0:
+        asyncio.get_running_loop().create_task(watch_model_file())
+
+
+async def watch_model_file():
+    """
+    Reload MODEL_PATH when it changes on disk.
+
+    Under serve.py only the worker that ran a /train job swaps its model
+    directly; every other worker (and any other process serving the same
+    file) picks the new checkpoint up here. Eager weights are
+    memory-mapped, so the workers still share one copy in the page cache.
+    """
+    global model_signature
+    while True:
+        await asyncio.sleep(MODEL_RELOAD_INTERVAL)
+        signature = file_signature(MODEL_PATH)
+        if signature is None or signature == model_signature:
+            continue
+        try:
+            new_model, signature = await run_in_threadpool(load_checkpoint)
+        except Exception as e:
+            print(f"Error reloading model from {MODEL_PATH}: {e}")
+            # Keep serving the old model; retry when the file changes again
+            model_signature = signature
+            continue
+        model_signature = signature
+        version = swap_model(new_model)
+        print(f"Reloaded {MODEL_PATH} after it changed; serving model version {version}")
+
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    if scheduler is not None:
+        await scheduler.stop()
+
+
+@app.on_event("shutdown")
+def stop_training_jobs():
+    # A stopped job can be continued with resume=true
+    for job_id, process in training_jobs.items():
+        if process.is_alive():
+            process.terminate()
+            process.join()
+            update_job(job_id, status='failed', error="Server shut down during training")
+
+
+def swap_model(new_model):
+    """Serve new_model from now on; batches already running finish on the old model."""
+    global model, model_version
+    model = new_model
+    model_version += 1
+    if scheduler is not None:
+        scheduler.model = new_model
+    return model_version
+
+
 @app.post("/predict")
 async def predict(file: UploadFile = File(...)):
     """Predict dyslexia indicators from a handwriting image."""
@@ -84,55 +183,58 @@ async def predict(file: UploadFile = File(...)):
             content={"error": "Model not loaded. Please train the model first."}
         )
     
-    # Save uploaded file
-    temp_file_path = save_uploaded_file(file)
+    contents = await file.read()
     
     try:
-        # Preprocess image
-        preprocessed_image = preprocess_single_image(temp_file_path)
-        if preprocessed_image is None:
-            return JSONResponse(
-                status_code=400,
-                content={"error": "Failed to process the image."}
-            )
-        
-        # Move tensor to device
-        preprocessed_image = preprocessed_image.to(DEVICE)
-        
-        # Analyze handwriting
-        prediction = analyze_handwriting(model, preprocessed_image, DEVICE)
+        # Identical uploads share one preprocessing and forward pass
+        prediction = await flights.do(hashlib.sha256(contents).hexdigest(), score_image, contents)
         
         # Interpret results
-        result = interpret_result(prediction)
+        result = interpret_result(file.filename, prediction)
         
         return result
     
+    except ValueError as e:
+        return JSONResponse(
+            status_code=400,
+            content={"error": str(e)}
+        )
+    
     except Exception as e:
         return JSONResponse(
             status_code=500,
             content={"error": f"Prediction failed: {str(e)}"}
         )
+
+
+async def score_image(contents):
+    """Preprocess uploaded image bytes and score them with the batch scheduler."""
+    preprocessed_image = await run_in_threadpool(preprocess_single_image, io.BytesIO(contents))
+    if preprocessed_image is None:
+        raise ValueError("Failed to process the image.")
     
-    finally:
-        # Clean up temporary file
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+    # Analyze handwriting together with other concurrent requests
+    return await scheduler.submit(preprocessed_image)
 
 
 @app.post("/train")
 async def train(
-    background_tasks: BackgroundTasks,
     normal_dir: str = Form(...),
     reversal_dir: str = Form(...),
     correct_dir: str = Form(...),
     batch_size: int = Form(32),
-    epochs: int = Form(30)
+    epochs: int = Form(30),
+    head_only: bool = Form(False),
+    unfreeze_last_block: bool = Form(False),
+    nprocs: int = Form(1),
+    resume: bool = Form(False)
 ):
     """
-    Train a new model using the provided directories.
+    Train a new model in a separate process.
     
-    This endpoint will start training in the background and return immediately.
-    The training will continue in the background.
+    This endpoint returns a job id immediately. Poll GET /train/{job_id}
+    for progress. When training succeeds, the new checkpoint is validated
+    and swapped in for /predict.
     """
     # Validate directories
     for dir_path in [normal_dir, reversal_dir, correct_dir]:
@@ -142,31 +244,115 @@ async def train(
                 content={"error": f"Directory not found: {dir_path}"}
             )
     
-    # Start training in background
-    def train_in_background():
-        global model
-        try:
-            train_model(
-                normal_dir=normal_dir,
-                reversal_dir=reversal_dir,
-                correct_dir=correct_dir,
-                model_save_path=MODEL_PATH,
-                batch_size=batch_size,
-                num_epochs=epochs,
-                device=DEVICE
-            )
-            
-            # Load the newly trained model
-            model = load_model(MODEL_PATH)
-            model.to(DEVICE)
-            print("Training completed and model loaded")
-        except Exception as e:
-            print(f"Training failed: {e}")
+    # Head-only training neither resumes nor runs data-parallel (see train_model)
+    if head_only and (resume or nprocs > 1):
+        return JSONResponse(
+            status_code=400,
+            content={"error": "head_only training does not support resume or nprocs > 1"}
+        )
+    
+    # The lock file covers jobs started by every API worker, not just this one
+    training_lock = acquire_training_lock()
+    if training_lock is None or any(process.is_alive() for process in training_jobs.values()):
+        if training_lock is not None:
+            training_lock.close()
+        return JSONResponse(
+            status_code=409,
+            content={"error": "A training job is already running."}
+        )
     
-    background_tasks.add_task(train_in_background)
+    job_id = new_job_id()
+    train_kwargs = dict(
+        normal_dir=normal_dir,
+        reversal_dir=reversal_dir,
+        correct_dir=correct_dir,
+        # Trained into a candidate file; only a validated model replaces MODEL_PATH
+        model_save_path=candidate_path(job_id),
+        batch_size=batch_size,
+        num_epochs=epochs,
+        device=DEVICE,
+        head_only=head_only,
+        unfreeze_last_block=unfreeze_last_block,
+        # Retrain the head on top of the backbone currently being served
+        base_model_path=MODEL_PATH if os.path.exists(MODEL_PATH) else None,
+        # Data-parallel CPU processes for full training
+        nprocs=nprocs,
+        # Continue an interrupted run from its latest full checkpoint
+        resume=resume,
+        # Head-only training writes no full checkpoint
+        checkpoint_path=None if head_only else checkpoint_path_for(MODEL_PATH)
+    )
+    try:
+        training_jobs[job_id] = await run_in_threadpool(start_training_job, job_id, train_kwargs)
+    except Exception:
+        training_lock.close()
+        raise
+    asyncio.get_running_loop().create_task(
+        finish_training_job(job_id, training_jobs[job_id], training_lock)
+    )
+    
+    return {"message": "Training started in a separate process.",
+            "status": f"Poll /train/{job_id} for progress.",
+            "job_id": job_id}
+
+
+async def finish_training_job(job_id, process, training_lock):
+    """Wait for a training process, then validate its checkpoint and swap it in."""
+    try:
+        await asyncio.to_thread(process.join)
+        await promote_training_job(job_id, process)
+    finally:
+        training_lock.close()
+
+
+async def promote_training_job(job_id, process):
+    global model_signature
+    job = read_job(job_id) or {}
+    if process.exitcode != 0 or job.get('status') != 'trained':
+        if job.get('status') != 'failed':
+            update_job(job_id, status='failed',
+                       error=f"Training process exited with code {process.exitcode}")
+        print(f"Training job {job_id} failed")
+        return
+    
+    update_job(job_id, status='validating')
+    try:
+        await run_in_threadpool(validate_checkpoint, candidate_path(job_id), DEVICE)
+        # Keep serving the configured MODEL_BACKEND, from a fresh artifact
+        await run_in_threadpool(export_candidate, candidate_path(job_id))
+        await run_in_threadpool(promote_checkpoint, candidate_path(job_id), MODEL_PATH)
+        new_model, model_signature = await run_in_threadpool(load_checkpoint)
+    except Exception as e:
+        update_job(job_id, status='failed', error=f"Checkpoint validation failed: {e}")
+        print(f"Training job {job_id}: checkpoint validation failed: {e}")
+        return
+    
+    version = swap_model(new_model)
+    update_job(job_id, status='completed', model_version=version)
+    print(f"Training job {job_id} completed; serving model version {version}")
+
+
+@app.get("/train/{job_id}")
+async def training_status(job_id: str):
+    """Report the state and per-epoch progress of a training job."""
+    job = read_job(job_id) if job_id.isalnum() else None
+    if job is None:
+        return JSONResponse(
+            status_code=404,
+            content={"error": f"Unknown training job: {job_id}"}
+        )
+    return json_safe(job)
+
+
+@app.get("/metrics")
+async def scheduler_metrics():
+    """Report inference queue depth and achieved batch sizes."""
+    if scheduler is None:
+        return {"error": "Scheduler not running."}
     
-    return {"message": "Training started in the background.", 
-            "status": "Training will continue in the background."}
+    metrics = scheduler.metrics()
+    metrics["single_flight"] = flights.metrics()
+    return metrics
 
 
 @app.get("/status")
@@ -176,6 +362,7 @@ async def model_status():
     
     return {
         "model_loaded": model is not None,
+        "model_version": model_version,
         "model_path": MODEL_PATH,
         "device": str(DEVICE)
     }
@@ -0,0 +1,230 @@
+"""
+Columnar dataset manifest for large handwriting datasets.
+
+A manifest is a single .npz file with one column per field:
+
+- path_data / path_offsets: every image path, UTF-8 encoded into one byte buffer
+- labels: class of each image (0 normal, 1 reversal, 2 correct)
+- sizes / mtimes: file size and modification time, used for incremental updates
+- hashes: raw SHA-256 digest of each file, used for deduplication
+
+It is built with os.scandir and a thread pool for hashing, and loads in
+milliseconds regardless of dataset size. Because it holds plain numpy
+arrays instead of Python lists of strings, DataLoader workers share its
+pages instead of copying them.
+"""
+
+import hashlib
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from torch.utils.data import Dataset
+from PIL import Image
+
+from .cache import file_sha256
+from .preprocessing import get_transform, load_image
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+MANIFEST_VERSION = 1
+
+
+def scan_images(directory):
+    """Return (paths, sizes, mtimes) of the image files directly inside directory."""
+    paths, sizes, mtimes = [], [], []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file():
+                stat = entry.stat()
+                paths.append(entry.path)
+                sizes.append(stat.st_size)
+                mtimes.append(stat.st_mtime_ns)
+    return paths, sizes, mtimes
+
+
+class Manifest:
+    """Path, label, size, modification time and hash columns of a dataset."""
+
+    def __init__(self, path_data, path_offsets, labels, sizes, mtimes, hashes):
+        self.path_data = path_data
+        self.path_offsets = path_offsets
+        self.labels = labels
+        self.sizes = sizes
+        self.mtimes = mtimes
+        self.hashes = hashes
+
+    @classmethod
+    def from_records(cls, paths, labels, sizes, mtimes, hashes):
+        """Build a manifest from per-file lists; hashes are 32-byte digests."""
+        encoded = [path.encode('utf-8') for path in paths]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(path) for path in encoded], out=offsets[1:])
+        return cls(
+            np.frombuffer(b''.join(encoded), dtype=np.uint8),
+            offsets,
+            np.asarray(labels, dtype=np.int8),
+            np.asarray(sizes, dtype=np.int64),
+            np.asarray(mtimes, dtype=np.int64),
+            np.frombuffer(b''.join(hashes), dtype=np.uint8).reshape(-1, 32)
+        )
+
+    @classmethod
+    def load(cls, manifest_path):
+        """Load a manifest written by save()."""
+        with np.load(manifest_path) as data:
+            if int(data['version']) != MANIFEST_VERSION:
+                raise ValueError(f"Unsupported manifest version in {manifest_path}")
+            return cls(data['path_data'], data['path_offsets'], data['labels'],
+                       data['sizes'], data['mtimes'], data['hashes'])
+
+    def save(self, manifest_path):
+        """Write the manifest atomically."""
+        os.makedirs(os.path.dirname(manifest_path) or '.', exist_ok=True)
+        # A unique temporary name, so concurrent writers never share a file
+        tmp_path = f"{manifest_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, version=MANIFEST_VERSION, path_data=self.path_data,
+                         path_offsets=self.path_offsets, labels=self.labels,
+                         sizes=self.sizes, mtimes=self.mtimes, hashes=self.hashes)
+            os.replace(tmp_path, manifest_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def __len__(self):
+        return len(self.labels)
+
+    def path(self, idx):
+        """Return the path of row idx."""
+        start, end = self.path_offsets[idx], self.path_offsets[idx + 1]
+        return self.path_data[start:end].tobytes().decode('utf-8')
+
+    def paths(self):
+        """Return all paths as a list (only needed when building derived caches)."""
+        return [self.path(i) for i in range(len(self))]
+
+    def unique_indices(self):
+        """Return the sorted row indices of the first copy of every distinct image."""
+        if len(self) == 0:
+            return np.zeros(0, dtype=np.int64)
+        digests = np.ascontiguousarray(self.hashes).view(np.dtype((np.void, 32))).ravel()
+        _, first, inverse = np.unique(digests, return_index=True, return_inverse=True)
+        conflicts = np.unique(inverse[self.labels != self.labels[first][inverse]])
+        if len(conflicts):
+            print(f"Warning: {len(conflicts)} images appear under more than one label; "
+                  f"keeping the first label")
+        return np.sort(first)
+
+    def fingerprint(self, indices=None):
+        """Hash the content and labels of the given rows (all rows by default)."""
+        if indices is None:
+            indices = np.arange(len(self))
+        digest = hashlib.sha256()
+        digest.update(np.ascontiguousarray(self.hashes[indices]).tobytes())
+        digest.update(np.ascontiguousarray(self.labels[indices]).tobytes())
+        return digest.hexdigest()
+
+
+def build_manifest(normal_dir, reversal_dir, correct_dir, previous=None, num_workers=8):
+    """
+    Scan the class directories and hash every image.
+
+    Args:
+        normal_dir, reversal_dir, correct_dir: Class directories (labels 0, 1, 2)
+        previous: Existing Manifest; files whose path, size and mtime are
+            unchanged reuse its hashes, so only new or modified files are read
+        num_workers: Threads used for scanning and hashing
+
+    Returns:
+        The new Manifest
+    """
+    since = time.time()
+    directories = [normal_dir, reversal_dir, correct_dir]
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        scans = list(executor.map(scan_images, directories))
+
+    paths, labels, sizes, mtimes = [], [], [], []
+    for label, (dir_paths, dir_sizes, dir_mtimes) in enumerate(scans):
+        paths += dir_paths
+        labels += [label] * len(dir_paths)
+        sizes += dir_sizes
+        mtimes += dir_mtimes
+
+    known = {}
+    if previous is not None:
+        for row in range(len(previous)):
+            known[previous.path(row)] = row
+
+    hashes = [None] * len(paths)
+    to_hash = []
+    for i, path in enumerate(paths):
+        row = known.get(path)
+        if row is not None and previous.sizes[row] == sizes[i] and previous.mtimes[row] == mtimes[i]:
+            hashes[i] = previous.hashes[row].tobytes()
+        else:
+            to_hash.append(i)
+
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        digests = executor.map(lambda i: bytes.fromhex(file_sha256(paths[i])), to_hash)
+        for i, digest in zip(to_hash, digests):
+            hashes[i] = digest
+
+    removed = len(set(known) - set(paths)) if known else 0
+    print(f"Manifest: {len(paths)} images ({len(to_hash)} hashed, "
+          f"{len(paths) - len(to_hash)} unchanged, {removed} removed) "
+          f"in {time.time() - since:.1f}s")
+    return Manifest.from_records(paths, labels, sizes, mtimes, hashes)
+
+
+def update_manifest(manifest_path, normal_dir, reversal_dir, correct_dir, num_workers=8):
+    """Build or incrementally refresh the manifest at manifest_path and save it."""
+    previous = Manifest.load(manifest_path) if os.path.exists(manifest_path) else None
+    manifest = build_manifest(normal_dir, reversal_dir, correct_dir, previous, num_workers)
+    manifest.save(manifest_path)
+    return manifest
+
+
+def load_or_build_manifest(manifest_path, normal_dir, reversal_dir, correct_dir, num_workers=8):
+    """Load the manifest if it exists, otherwise build it from the class directories."""
+    if os.path.exists(manifest_path):
+        return Manifest.load(manifest_path)
+    return update_manifest(manifest_path, normal_dir, reversal_dir, correct_dir, num_workers)
+
+
+class ManifestDataset(Dataset):
+    """Handwriting dataset backed by a Manifest, optionally without duplicate images."""
+
+    def __init__(self, manifest, transform=None, deduplicate=True):
+        self.manifest = manifest
+        self.transform = transform if transform else get_transform()
+        if deduplicate:
+            self.indices = manifest.unique_indices()
+        else:
+            self.indices = np.arange(len(manifest))
+        self.labels = manifest.labels[self.indices].astype(np.int64)
+
+        counts = np.bincount(self.labels, minlength=3)
+        print(f"Loaded {counts[0]} normal, {counts[1]} reversal and {counts[2]} correct images "
+              f"from manifest ({len(manifest) - len(self.indices)} duplicates skipped)")
+
+    def __len__(self):
+        return len(self.indices)
+
+    def path(self, idx):
+        """Return the image path of sample idx."""
+        return self.manifest.path(self.indices[idx])
+
+    def __getitem__(self, idx):
+        image = load_image(self.path(idx))
+
+        if image is None:
+            # Same blank-image fallback as HandwritingDataset
+            image = Image.new('RGB', (224, 224), color='white')
+
+        if self.transform:
+            image = self.transform(image)
+
+        return image, int(self.labels[idx])
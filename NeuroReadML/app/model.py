@@ -1,11 +1,18 @@
+import os
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-import torchvision.models as models
+
+from .backends import (get_backend, artifact_path, weights_path, load_torchscript_model,
+                       OnnxRuntimeModel)
+from .checkpoint import atomic_save
 
 
 def create_dyslexia_model(num_classes=3, pretrained=True):
     """Create a CNN model for dyslexia detection based on ResNet18."""
+    # torchvision takes seconds to import, so only pay for it when building the model
+    import torchvision.models as models
+
     # Handle different versions of torchvision
     try:
         # For newer PyTorch versions (>=1.6)
@@ -17,7 +24,7 @@ def create_dyslexia_model(num_classes=3, pretrained=True):
                 # Fallback for older but still post-1.6 versions
                 model = models.resnet18(pretrained=True)
         else:
-            model = models.resnet18(pretrained=False)
+            model = models.resnet18(weights=None)
     except TypeError:
         # For older PyTorch versions
         model = models.resnet18(pretrained=pretrained)
@@ -30,33 +37,79 @@ def create_dyslexia_model(num_classes=3, pretrained=True):
 
 
 def save_model(model, path):
-    """Save model weights to the specified path."""
-    torch.save(model.state_dict(), path)
+    """
+    Save model weights to the specified path.
+
+    The file is replaced atomically: checkpoints are memory-mapped by
+    load_weights, and rewriting a mapped file in place would corrupt the
+    model of any process that has it loaded.
+    """
+    atomic_save(model.state_dict(), path)
     print(f"Model saved to {path}")
 
 
-def load_model(path, num_classes=3):
-    """Load model weights from the specified path."""
-    model = create_dyslexia_model(num_classes=num_classes, pretrained=False)
+def save_safetensors(model, path):
+    """Save model weights as a .safetensors file, which loads without unpickling."""
+    from safetensors.torch import save_file
+
+    # Written to a temporary file and renamed, like save_model, since it is memory-mapped too
+    tmp_path = f"{path}.tmp"
+    save_file({key: value.contiguous() for key, value in model.state_dict().items()}, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_weights(path):
+    """
+    Read a state dict onto the CPU without unpickling arbitrary objects.
+
+    An up-to-date .safetensors copy of a .pth checkpoint (see
+    export_model.py) is preferred. Both formats are memory-mapped, so only
+    the pages that are used get read.
+    """
+    path = weights_path(path)
+    if path.endswith('.safetensors'):
+        from safetensors.torch import load_file
+        return load_file(path, device='cpu')
+    return torch.load(path, map_location='cpu', weights_only=True, mmap=True)
+
+
+def load_model(path, num_classes=3, backend=None):
+    """
+    Load model weights from the specified path.
+    
+    The backend ('eager', 'torchscript', 'onnxruntime' or 'quantized')
+    defaults to the MODEL_BACKEND environment variable. Non-eager backends
+    load the artifact written by export_model.py or quantize_model.py next
+    to the .pth checkpoint.
+    
+    Raises:
+        RuntimeError: If the eager weights cannot be read
+    """
+    backend = get_backend(backend)
+    if backend != 'eager':
+        serving_path = artifact_path(path, backend)
+        if not os.path.exists(serving_path):
+            raise FileNotFoundError(
+                f"No {backend} artifact at {serving_path}. Export or quantize the model first."
+            )
+        if backend == 'torchscript':
+            return load_torchscript_model(serving_path)
+        if backend == 'quantized':
+            from .quantization import load_quantized_model
+            return load_quantized_model(serving_path)
+        return OnnxRuntimeModel(serving_path)
     
     try:
-        # Try to load with default method
-        model.load_state_dict(torch.load(path))
-    except RuntimeError:
-        try:
-            # Try to load with map_location (for CPU/CUDA mismatch)
-            device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-            model.load_state_dict(torch.load(path, map_location=device))
-        except Exception as e:
-            print(f"Error loading model weights: {e}")
-            print("Loading model with random weights instead.")
-            # Return model with random weights
-            return create_dyslexia_model(num_classes=num_classes, pretrained=True)
+        state_dict = load_weights(path)
     except Exception as e:
-        print(f"Unexpected error loading model: {e}")
-        print("Loading model with random weights instead.")
-        # Return model with random weights
-        return create_dyslexia_model(num_classes=num_classes, pretrained=True)
+        raise RuntimeError(f"Could not load model weights from {path}: {e}") from e
+
+    # Build on the meta device: the weights are assigned from the checkpoint,
+    # so random initialization would be wasted work
+    with torch.device('meta'):
+        model = create_dyslexia_model(num_classes=num_classes, pretrained=False)
+    model.load_state_dict(state_dict, assign=True)
     
     model.eval()  # Set to evaluation mode
     return model
@@ -77,13 +130,34 @@ def predict_single_image(model, image_tensor, device="cpu"):
     }
 
 
-def analyze_handwriting(model, image_tensor, device="cpu"):
+def predict_batch(model, images_tensor, device="cpu", max_batch_size=32):
     """
-    Analyze handwriting to detect dyslexia indicators.
-    Returns the probability of the image containing reversal characters.
+    Make predictions on a stack of preprocessed images.
+    
+    The stack is split into chunks of at most max_batch_size images and each
+    chunk is scored with a single forward pass. Returns one dictionary per
+    image, in the same format as predict_single_image.
     """
-    prediction = predict_single_image(model, image_tensor, device)
+    model.eval()
+    predictions = []
+    with torch.no_grad():
+        for start in range(0, images_tensor.size(0), max_batch_size):
+            chunk = images_tensor[start:start + max_batch_size].to(device)
+            outputs = model(chunk)
+            probs = F.softmax(outputs, dim=1)
+            _, predicted = torch.max(outputs, 1)
+            
+            for predicted_class, probabilities in zip(predicted.tolist(), probs.tolist()):
+                predictions.append({
+                    'predicted_class': predicted_class,
+                    'probabilities': probabilities
+                })
     
+    return predictions
+
+
+def summarize_prediction(prediction):
+    """Reduce a raw prediction to the dyslexia indicators used downstream."""
     # Get probability of reversal (class 1)
     reversal_probability = prediction['probabilities'][1]
     
@@ -91,4 +165,22 @@ def analyze_handwriting(model, image_tensor, device="cpu"):
         'reversal_probability': reversal_probability,
         'dyslexia_indicator_percentage': reversal_probability,
         'predicted_class': prediction['predicted_class']
-    }
\ No newline at end of file
+    }
+
+
+def analyze_handwriting(model, image_tensor, device="cpu"):
+    """
+    Analyze handwriting to detect dyslexia indicators.
+    Returns the probability of the image containing reversal characters.
+    """
+    prediction = predict_single_image(model, image_tensor, device)
+    return summarize_prediction(prediction)
+
+
+def analyze_handwriting_batch(model, images_tensor, device="cpu", max_batch_size=32):
+    """
+    Analyze a stack of letter images in batches.
+    Returns one result per image, in the same format as analyze_handwriting.
+    """
+    predictions = predict_batch(model, images_tensor, device, max_batch_size)
+    return [summarize_prediction(prediction) for prediction in predictions]
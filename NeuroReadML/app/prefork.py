@@ -0,0 +1,176 @@
+"""
+Pre-forking launcher for the upload API (app/main.py).
+
+`uvicorn --workers N` starts every worker from scratch, so each worker
+loads and keeps its own copy of the weights. serve() instead loads and
+warms up the model once in a master process, moves its tensors into
+shared memory and then forks the workers. All workers accept connections
+on one listening socket and read the same physical weight pages, so
+adding a worker costs its Python heap and activations, not another model.
+
+The master only warms up with a single torch thread: forking after an
+OpenMP thread pool has started can hang the children. Each worker then
+sets its own thread count, by default the CPU cores divided by the
+number of workers.
+"""
+
+import gc
+import os
+import signal
+import socket
+import time
+
+import torch
+
+# Fields of /proc/<pid>/smaps_rollup reported by memory_usage, in kB
+_SMAPS_FIELDS = {'Rss': 'rss_mb', 'Pss': 'pss_mb', 'Shared_Clean': 'shared_mb',
+                 'Shared_Dirty': 'shared_mb', 'Private_Clean': 'private_mb',
+                 'Private_Dirty': 'private_mb'}
+
+
+def memory_usage(pid='self'):
+    """
+    Return the RSS, PSS, shared and private memory of a process in MB.
+
+    PSS splits every shared page between the processes mapping it, so the
+    PSS of all workers adds up to their real memory use. Linux only.
+    """
+    usage = dict.fromkeys(_SMAPS_FIELDS.values(), 0.0)
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if name in _SMAPS_FIELDS:
+                usage[_SMAPS_FIELDS[name]] += int(value.split()[0]) / 1024
+    return usage
+
+
+def format_memory(usage):
+    """One-line summary of a memory_usage() result."""
+    return (f"RSS {usage['rss_mb']:.0f} MB, PSS {usage['pss_mb']:.0f} MB, "
+            f"shared {usage['shared_mb']:.0f} MB, private {usage['private_mb']:.0f} MB")
+
+
+def threads_per_worker(workers):
+    """Split the CPU cores evenly between the workers (at least one thread each)."""
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def share_model(model):
+    """Move the model's CPU tensors to shared memory so forked workers never copy them."""
+    if model is None:
+        return None
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        if tensor.device.type == 'cpu':
+            tensor.share_memory_()
+    return model
+
+
+def bind_socket(host, port, backlog=2048):
+    """Create the listening socket that every worker accepts connections on."""
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock, num_threads, log_level):
+    import uvicorn
+    from . import main as api
+
+    torch.set_num_threads(num_threads)
+    print(f"Worker {os.getpid()} started with {num_threads} threads: {format_memory(memory_usage())}")
+    config = uvicorn.Config(api.app, log_level=log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _spawn_worker(sock, num_threads, log_level):
+    pid = os.fork()
+    if pid == 0:
+        # Child: leave the master's signal handling behind and serve
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        code = 0
+        try:
+            _run_worker(sock, num_threads, log_level)
+        except Exception as e:
+            print(f"Worker {os.getpid()} failed: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def serve(host='0.0.0.0', port=8000, workers=2, num_threads=None, log_level='info'):
+    """
+    Load the model once, then fork `workers` API processes that share it.
+
+    Workers that exit unexpectedly are replaced. SIGINT or SIGTERM stops
+    all workers and returns.
+
+    Args:
+        host, port: Address to listen on
+        workers: Number of forked uvicorn workers
+        num_threads: Torch threads per worker (default: CPU cores / workers)
+        log_level: uvicorn log level
+    """
+    from . import main as api
+
+    num_threads = num_threads or threads_per_worker(workers)
+
+    # Load and warm up single-threaded, before any worker exists
+    torch.set_num_threads(1)
+    api.load_serving_model()
+    if api.DEVICE.type != 'cpu':
+        raise RuntimeError("Forked workers cannot use CUDA initialized in the master; "
+                           "use uvicorn --workers for GPU serving")
+    share_model(api.model)
+    if api.model is not None:
+        with torch.no_grad():
+            api.model.eval()(torch.zeros(1, 3, 224, 224, device=api.DEVICE))
+    print(f"Master {os.getpid()} after loading the model: {format_memory(memory_usage())}")
+
+    sock = bind_socket(host, port)
+    # Objects created so far are never collected, so the garbage collector
+    # does not touch (and copy) their pages in the workers
+    gc.collect()
+    gc.freeze()
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    pids = {_spawn_worker(sock, num_threads, log_level) for _ in range(workers)}
+    print(f"Serving on http://{host}:{port} with {workers} workers")
+
+    while not stopping:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.5)
+            continue
+        pids.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} exited with status {status}, starting a new one")
+            pids.add(_spawn_worker(sock, num_threads, log_level))
+
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for pid in pids:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    sock.close()
@@ -1,7 +1,7 @@
 import os
 import torch
-from torch.utils.data import Dataset, DataLoader
-from torchvision import transforms
+from torch.utils.data import Dataset, DataLoader, Subset
+from torch.utils.data.distributed import DistributedSampler
 from PIL import Image
 import numpy as np
 from pathlib import Path
@@ -17,14 +17,22 @@ def load_image(image_path):
         return None
 
 
+# ImageNet statistics the model was trained with
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+
 def get_transform():
     """Define image transformations for model input."""
+    # torchvision takes seconds to import; inference on letter crops does not need it
+    from torchvision import transforms
+
     return transforms.Compose([
         transforms.Resize((224, 224)),  # Resize to standard dimensions
         transforms.ToTensor(),           # Convert to tensor
         transforms.Normalize(            # Normalize with ImageNet stats
-            mean=[0.485, 0.456, 0.406],
-            std=[0.229, 0.224, 0.225]
+            mean=IMAGENET_MEAN,
+            std=IMAGENET_STD
         )
     ])
 
@@ -75,53 +83,176 @@ class HandwritingDataset(Dataset):
         return image, label
 
 
+def split_indices(dataset_size, val_split=0.2, seed=42):
+    """Shuffle dataset indices with seed and split them into (train, validation)."""
+    indices = list(range(dataset_size))
+    np.random.RandomState(seed).shuffle(indices)
+    split = int(np.floor(val_split * dataset_size))
+    return indices[split:], indices[:split]
+
+
+def load_dataset(normal_dir, reversal_dir, correct_dir, cache_dir=None, manifest_path=None):
+    """
+    Create the training dataset, building the manifest and image cache if needed.
+
+    See prepare_dataloaders for cache_dir and manifest_path. Building
+    writes files, so run it in a single process before starting others
+    that read them (see app.distributed).
+    """
+    manifest = None
+    if manifest_path:
+        from .manifest import load_or_build_manifest, ManifestDataset
+        manifest = load_or_build_manifest(manifest_path, normal_dir, reversal_dir, correct_dir)
+    
+    if cache_dir:
+        from .dataset_cache import CachedHandwritingDataset
+        if manifest is not None:
+            return CachedHandwritingDataset.from_manifest(manifest, cache_dir)
+        return CachedHandwritingDataset.from_dirs(normal_dir, reversal_dir, correct_dir, cache_dir)
+    if manifest is not None:
+        return ManifestDataset(manifest, get_transform())
+    return HandwritingDataset(normal_dir, reversal_dir, correct_dir, get_transform())
+
+
 def prepare_dataloaders(normal_dir, reversal_dir, correct_dir, batch_size=32, 
-                        val_split=0.2, seed=42):
-    """Prepare training and validation dataloaders."""
+                        val_split=0.2, seed=42, cache_dir=None, distributed=False,
+                        num_workers=4, manifest_path=None):
+    """
+    Prepare training and validation dataloaders.
+    
+    If cache_dir is given, images are decoded once into a memory-mapped
+    cache there (see app.dataset_cache) instead of on every epoch.
+    
+    If manifest_path is given, the dataset is read from that manifest
+    (see app.manifest), which is built from the directories on first use.
+    Duplicate images are skipped.
+    
+    With distributed=True (inside an initialized process group) both splits
+    are sharded across processes with DistributedSampler; call
+    train_loader.sampler.set_epoch(epoch) every epoch.
+    """
     # Set random seed for reproducibility
     torch.manual_seed(seed)
     np.random.seed(seed)
     
     # Create dataset
-    transform = get_transform()
-    dataset = HandwritingDataset(normal_dir, reversal_dir, correct_dir, transform)
+    dataset = load_dataset(normal_dir, reversal_dir, correct_dir, cache_dir=cache_dir,
+                           manifest_path=manifest_path)
     
     # Split dataset
-    dataset_size = len(dataset)
-    indices = list(range(dataset_size))
-    np.random.shuffle(indices)
-    split = int(np.floor(val_split * dataset_size))
-    train_indices, val_indices = indices[split:], indices[:split]
+    train_indices, val_indices = split_indices(len(dataset), val_split, seed)
     
     # Create samplers
-    train_sampler = torch.utils.data.SubsetRandomSampler(train_indices)
-    val_sampler = torch.utils.data.SubsetRandomSampler(val_indices)
+    if distributed:
+        train_dataset = Subset(dataset, train_indices)
+        val_dataset = Subset(dataset, val_indices)
+        train_sampler = DistributedSampler(train_dataset, shuffle=True, seed=seed)
+        val_sampler = DistributedSampler(val_dataset, shuffle=False)
+    else:
+        train_dataset = val_dataset = dataset
+        train_sampler = torch.utils.data.SubsetRandomSampler(train_indices)
+        val_sampler = torch.utils.data.SubsetRandomSampler(val_indices)
     
     # Create dataloaders
     train_loader = DataLoader(
-        dataset, 
+        train_dataset, 
         batch_size=batch_size,
         sampler=train_sampler,
-        num_workers=4
+        num_workers=num_workers
     )
     
     val_loader = DataLoader(
-        dataset,
+        val_dataset,
         batch_size=batch_size,
         sampler=val_sampler,
-        num_workers=4
+        num_workers=num_workers
     )
     
     return train_loader, val_loader
 
 
+# Shared inference transform, built once on first use
+_default_transform = None
+
+
+def get_default_transform():
+    """Return the inference transform, building it only once."""
+    global _default_transform
+    if _default_transform is None:
+        _default_transform = get_transform()
+    return _default_transform
+
+
 def preprocess_single_image(image_path, transform=None):
     """Preprocess a single image for inference."""
     if transform is None:
-        transform = get_transform()
+        transform = get_default_transform()
     
     image = load_image(image_path)
     if image is None:
         return None
     
-    return transform(image).unsqueeze(0)  # Add batch dimension
\ No newline at end of file
+    return transform(image).unsqueeze(0)  # Add batch dimension
+
+
+def preprocess_image_batch(image_paths, transform=None):
+    """
+    Preprocess several images into one stacked tensor for batched inference.
+    
+    Returns a tuple of (tensor of shape [N, 3, 224, 224], list of the paths
+    that were loaded successfully). The tensor is None if nothing loaded.
+    """
+    if transform is None:
+        transform = get_default_transform()
+    
+    tensors = []
+    loaded_paths = []
+    for image_path in image_paths:
+        image = load_image(image_path)
+        if image is None:
+            continue
+        tensors.append(transform(image))
+        loaded_paths.append(image_path)
+    
+    if not tensors:
+        return None, loaded_paths
+    
+    return torch.stack(tensors), loaded_paths
+
+
+def preprocess_letter_crops(crops, transform=None):
+    """
+    Preprocess in-memory letter crops into one stacked tensor.
+    
+    Args:
+        crops: Grayscale NumPy arrays, e.g. the 'image' entries returned by
+            app.utils.extract_letters
+        transform: Optional transform (defaults to the inference transform)
+        
+    Returns:
+        Tensor of shape [N, 3, 224, 224], or None if crops is empty
+    """
+    if transform is None:
+        return _letter_crops_to_tensor(crops)
+    
+    tensors = [transform(Image.fromarray(np.ascontiguousarray(crop)).convert('RGB'))
+               for crop in crops]
+    if not tensors:
+        return None
+    
+    return torch.stack(tensors)
+
+
+def _letter_crops_to_tensor(crops):
+    """The inference transform applied to a whole batch, without torchvision."""
+    images = [np.asarray(Image.fromarray(np.ascontiguousarray(crop)).convert('RGB')
+                         .resize((224, 224), Image.BILINEAR))
+              for crop in crops]
+    if not images:
+        return None
+    
+    # Same operations as ToTensor and Normalize, so the values are identical
+    batch = torch.from_numpy(np.stack(images)).permute(0, 3, 1, 2).float().div(255)
+    mean = torch.tensor(IMAGENET_MEAN).view(1, 3, 1, 1)
+    std = torch.tensor(IMAGENET_STD).view(1, 3, 1, 1)
+    return batch.sub_(mean).div_(std)
@@ -0,0 +1,80 @@
+"""
+Post-training static INT8 quantization of the dyslexia model.
+
+The fp32 ResNet18 is quantized with FX graph mode quantization, calibrated
+on batches from HandwritingDataset and saved as a TorchScript artifact
+(models/dyslexia_model.int8.pt next to the .pth checkpoint) that
+load_model serves with backend='quantized'.
+"""
+
+import copy
+import torch
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+# x86 servers use fbgemm, ARM servers use qnnpack
+QUANTIZED_ENGINES = ('fbgemm', 'qnnpack')
+
+
+def quantize_model(model, calibration_loader, num_batches=10, engine='fbgemm'):
+    """
+    Quantize a trained fp32 model to INT8.
+
+    Args:
+        model: Trained fp32 model from create_dyslexia_model / load_model
+        calibration_loader: DataLoader yielding (inputs, labels) batches
+        num_batches: Number of batches used to calibrate activation ranges
+        engine: Quantized engine, 'fbgemm' or 'qnnpack'
+
+    Returns:
+        The quantized model (the input model is left untouched)
+    """
+    torch.backends.quantized.engine = engine
+    model = copy.deepcopy(model).to('cpu').eval()
+
+    example_inputs = (torch.zeros(1, 3, 224, 224),)
+    prepared = prepare_fx(model, get_default_qconfig_mapping(engine), example_inputs)
+
+    with torch.no_grad():
+        for i, (inputs, _) in enumerate(calibration_loader):
+            if i >= num_batches:
+                break
+            prepared(inputs)
+
+    return convert_fx(prepared)
+
+
+def save_quantized_model(model, path, engine='fbgemm'):
+    """Save a quantized model as TorchScript, recording its quantized engine."""
+    example = torch.zeros(1, 3, 224, 224)
+    with torch.no_grad():
+        scripted = torch.jit.freeze(torch.jit.trace(model, example))
+    torch.jit.save(scripted, path, _extra_files={'quantized_engine': engine})
+    print(f"Quantized model saved to {path}")
+    return path
+
+
+def load_quantized_model(path):
+    """Load a quantized TorchScript model and select the engine it was built for."""
+    extra_files = {'quantized_engine': ''}
+    model = torch.jit.load(path, map_location='cpu', _extra_files=extra_files)
+    engine = extra_files['quantized_engine']
+    if isinstance(engine, bytes):
+        engine = engine.decode()
+    if engine:
+        torch.backends.quantized.engine = engine
+    model.eval()
+    return model
+
+
+def evaluate_accuracy(model, data_loader):
+    """Return the classification accuracy of model on data_loader."""
+    correct = 0
+    total = 0
+    with torch.no_grad():
+        for inputs, labels in data_loader:
+            outputs = model(inputs)
+            _, preds = torch.max(outputs, 1)
+            correct += (preds == labels).sum().item()
+            total += labels.size(0)
+    return correct / total if total else 0.0
@@ -0,0 +1,126 @@
+"""
+Dynamic micro-batching for model inference.
+
+Concurrent requests submit preprocessed tensors to a BatchScheduler, which
+groups them into one batch (bounded by a maximum size and a maximum wait)
+and runs the forward pass on a dedicated worker thread, off the event loop.
+"""
+
+import asyncio
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import torch
+
+from .model import analyze_handwriting_batch
+
+
+class BatchScheduler:
+    """Collect single-image requests from concurrent callers into batches."""
+
+    def __init__(self, model, device="cpu", max_batch_size=16, max_wait_ms=5.0):
+        self.model = model
+        self.device = device
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue = None
+        self._task = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+
+        # Metrics
+        self.batches_run = 0
+        self.items_processed = 0
+        self.last_batch_size = 0
+        self.batch_size_counts = Counter()
+
+    def start(self):
+        """Start the batching loop on the running event loop."""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the batching loop and release the worker thread."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, image_tensor):
+        """
+        Queue a preprocessed image tensor of shape [1, 3, H, W] for inference.
+
+        Returns the analyze_handwriting result for the image once its batch
+        has run.
+        """
+        if self._queue is None:
+            raise RuntimeError("Scheduler is not running")
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image_tensor, future))
+        return await future
+
+    async def _collect_batch(self):
+        """Wait for one request, then gather more until the batch is full or the wait expires."""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait_ms / 1000
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        # Callers that gave up while waiting do not need a forward pass
+        return [(tensor, future) for tensor, future in batch if not future.cancelled()]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            if not batch:
+                continue
+
+            # Hold on to the current model so a reload mid-batch is harmless
+            model = self.model
+            try:
+                images = torch.cat([tensor for tensor, _ in batch])
+                predictions = await loop.run_in_executor(
+                    self._executor, analyze_handwriting_batch,
+                    model, images, self.device, self.max_batch_size
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), prediction in zip(batch, predictions):
+                if not future.done():
+                    future.set_result(prediction)
+
+            self.batches_run += 1
+            self.items_processed += len(batch)
+            self.last_batch_size = len(batch)
+            self.batch_size_counts[len(batch)] += 1
+
+    def metrics(self):
+        """Return queue depth and achieved batch size statistics."""
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches_run": self.batches_run,
+            "items_processed": self.items_processed,
+            "average_batch_size": (self.items_processed / self.batches_run
+                                   if self.batches_run else 0.0),
+            "last_batch_size": self.last_batch_size,
+            "batch_size_histogram": {str(size): count
+                                     for size, count in sorted(self.batch_size_counts.items())},
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms
+        }
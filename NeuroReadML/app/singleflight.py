@@ -0,0 +1,60 @@
+"""
+Single-flight coalescing of identical in-flight requests.
+
+Concurrent callers asking for the same key share one computation and all
+receive its result (or its exception). A caller that times out or is
+cancelled stops waiting, but the shared computation keeps running for the
+others.
+"""
+
+import asyncio
+
+
+class SingleFlight:
+    """Run at most one coroutine per key at a time and share its outcome."""
+
+    def __init__(self):
+        self._inflight = {}
+
+        # Metrics
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn, *args, timeout=None):
+        """
+        Await fn(*args), or join the call already in flight for key.
+
+        Args:
+            key: Hashable identity of the work, e.g. a content hash
+            fn: Coroutine function that performs the work
+            timeout: Optional seconds this caller is willing to wait. Expiry
+                raises asyncio.TimeoutError for this caller only.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done, key=key: self._finish(key, done))
+            self.started += 1
+        else:
+            self.coalesced += 1
+
+        # shield() keeps one waiter's cancellation from cancelling the shared task
+        if timeout is None:
+            return await asyncio.shield(task)
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+
+    def _finish(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved in case every waiter gave up
+        if not task.cancelled():
+            task.exception()
+
+    def metrics(self):
+        """Return the number of in-flight keys and coalescing counters."""
+        return {
+            "in_flight": len(self._inflight),
+            "started": self.started,
+            "coalesced": self.coalesced
+        }
@@ -1,22 +1,51 @@
 import os
+import sys
+import json
 import time
 import torch
 import torch.nn as nn
 import torch.optim as optim
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel
 import numpy as np
 from pathlib import Path
-import matplotlib.pyplot as plt
 
-from .model import create_dyslexia_model, save_model
+from .model import create_dyslexia_model
+from .checkpoint import (CheckpointWriter, checkpoint_path_for, training_state,
+                         load_training_state, atomic_save, atomic_copy)
+from .embeddings import train_head
 from .preprocessing import prepare_dataloaders
 
+# Full-training options head_only ignores, with the values that leave them off
+HEAD_ONLY_UNSUPPORTED = {'cache_dir': None, 'nprocs': 1, 'nnodes': 1, 'bf16': False,
+                         'channels_last': False, 'compile_model': False, 'resume': False,
+                         'checkpoint_path': None}
+
 
 def train_model(normal_dir, reversal_dir, correct_dir, 
                 model_save_path='models/dyslexia_model.pth',
                 batch_size=32, 
                 num_epochs=30,
                 learning_rate=0.001,
-                device=None):
+                device=None,
+                cache_dir=None,
+                head_only=False,
+                unfreeze_last_block=False,
+                embedding_cache_dir='models/embeddings',
+                base_model_path=None,
+                nprocs=1,
+                nnodes=1,
+                node_rank=0,
+                master_addr='127.0.0.1',
+                master_port=29500,
+                bf16=False,
+                channels_last=False,
+                compile_model=False,
+                metrics_path='models/training_metrics.json',
+                manifest_path=None,
+                resume=False,
+                checkpoint_path=None,
+                progress=None):
     """
     Train the dyslexia detection model and save it.
     
@@ -29,26 +58,127 @@ def train_model(normal_dir, reversal_dir, correct_dir,
         num_epochs: Number of training epochs
         learning_rate: Learning rate for optimizer
         device: Device to use (cuda/cpu)
+        cache_dir: Optional directory for the memory-mapped image cache
+        head_only: Train only the fc head on cached backbone embeddings
+            (see app.embeddings.train_head). manifest_path, metrics_path and
+            progress apply; cache_dir, nprocs, nnodes, bf16, channels_last,
+            compile_model, resume and checkpoint_path raise a ValueError
+        unfreeze_last_block: With head_only, also train the last residual block
+        embedding_cache_dir: With head_only, directory of the embedding cache
+        base_model_path: With head_only, checkpoint whose backbone is reused
+        nprocs: Number of data-parallel worker processes on this machine.
+            With nprocs > 1 or nnodes > 1 training runs under
+            DistributedDataParallel (see app.distributed); batch_size is
+            then per process.
+        nnodes, node_rank, master_addr, master_port: Multi-node settings
+        bf16: Run forward passes under bfloat16 autocast
+        channels_last: Use the channels_last memory format for model and inputs
+        compile_model: Compile the model with torch.compile
+        metrics_path: JSON file receiving per-epoch throughput, timing and memory metrics
+        manifest_path: Optional dataset manifest (see app.manifest) used instead
+            of listing the directories
+        resume: Continue from the full checkpoint at checkpoint_path if it exists
+        checkpoint_path: Full checkpoint (model, optimizer, scheduler, RNG,
+            epoch, history) written after every epoch; defaults to
+            <model_save_path without .pth>.ckpt.pt
+        progress: Optional callable receiving a dictionary of metrics after
+            every epoch (called on rank 0 only)
     
     Returns:
         Dictionary containing training history
     """
+    if head_only:
+        unsupported = unsupported_head_only_options(
+            cache_dir=cache_dir, nprocs=nprocs, nnodes=nnodes, bf16=bf16,
+            channels_last=channels_last, compile_model=compile_model, resume=resume,
+            checkpoint_path=checkpoint_path
+        )
+        if unsupported:
+            raise ValueError(f"head_only training does not support {', '.join(unsupported)}")
+        
+        # Per-epoch metrics are written as they are reported
+        epoch_metrics = []
+        since = time.time()
+        
+        def report(metrics):
+            epoch_metrics.append(dict(metrics, train_time_sec=time.time() - since))
+            write_training_metrics(metrics_path, epoch_metrics, {
+                'head_only': True,
+                'unfreeze_last_block': unfreeze_last_block,
+                'batch_size': batch_size,
+                'num_threads': torch.get_num_threads()
+            })
+            if progress is not None:
+                progress(metrics)
+        
+        return train_head(
+            normal_dir, reversal_dir, correct_dir,
+            model_save_path=model_save_path,
+            embedding_cache_dir=embedding_cache_dir,
+            base_model_path=base_model_path,
+            unfreeze_last_block=unfreeze_last_block,
+            batch_size=batch_size,
+            num_epochs=num_epochs,
+            learning_rate=learning_rate,
+            device=device,
+            manifest_path=manifest_path,
+            progress=report
+        )
+    
+    if (nprocs > 1 or nnodes > 1) and not (dist.is_available() and dist.is_initialized()):
+        from .distributed import train_distributed
+        return train_distributed(
+            normal_dir, reversal_dir, correct_dir,
+            nprocs=nprocs, nnodes=nnodes, node_rank=node_rank,
+            master_addr=master_addr, master_port=master_port,
+            model_save_path=model_save_path,
+            batch_size=batch_size,
+            num_epochs=num_epochs,
+            learning_rate=learning_rate,
+            cache_dir=cache_dir,
+            bf16=bf16,
+            channels_last=channels_last,
+            compile_model=compile_model,
+            metrics_path=metrics_path,
+            manifest_path=manifest_path,
+            resume=resume,
+            checkpoint_path=checkpoint_path,
+            progress=progress
+        )
+    
+    # Inside a distributed worker only rank 0 logs and saves
+    is_distributed = dist.is_available() and dist.is_initialized()
+    is_main = not is_distributed or dist.get_rank() == 0
+    log = print if is_main else _silent
+    
     # Ensure model directory exists
     os.makedirs(os.path.dirname(model_save_path), exist_ok=True)
 
     # Set device
     if device is None:
         device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    print(f"Using device: {device}")
+    log(f"Using device: {device}")
     
     # Prepare dataloaders
     train_loader, val_loader = prepare_dataloaders(
-        normal_dir, reversal_dir, correct_dir, batch_size
+        normal_dir, reversal_dir, correct_dir, batch_size, cache_dir=cache_dir,
+        distributed=is_distributed, manifest_path=manifest_path
     )
     
     # Create model
     model = create_dyslexia_model(num_classes=3)
     model = model.to(device)
+    memory_format = torch.channels_last if channels_last else torch.contiguous_format
+    if channels_last:
+        model = model.to(memory_format=memory_format)
+    # Checkpoints are saved from the plain module, not the DDP/compiled wrapper
+    net = model
+    if is_distributed:
+        model = DistributedDataParallel(model)
+    if compile_model:
+        model = torch.compile(model)
+    autocast_dtype = torch.bfloat16 if bf16 else None
+    log(f"Performance modes: bf16={bf16}, channels_last={channels_last}, compile={compile_model}")
     
     # Define loss function and optimizer
     criterion = nn.CrossEntropyLoss()
@@ -58,7 +188,7 @@ def train_model(normal_dir, reversal_dir, correct_dir,
     scheduler = optim.lr_scheduler.ReduceLROnPlateau(
         optimizer, mode='min', factor=0.1, patience=5
     )
-    print("Learning rate scheduler initialized")
+    log("Learning rate scheduler initialized")
     
     # Training history
     history = {
@@ -67,18 +197,48 @@ def train_model(normal_dir, reversal_dir, correct_dir,
         'train_acc': [],
         'val_acc': []
     }
+    epoch_metrics = []
+    best_acc = 0.0
+    best_model_path = None
+    start_epoch = 0
+    
+    checkpoint_path = checkpoint_path or checkpoint_path_for(model_save_path)
+    if resume:
+        if os.path.exists(checkpoint_path):
+            checkpoint = load_training_state(checkpoint_path, net, optimizer, scheduler)
+            start_epoch = checkpoint['epoch']
+            history = checkpoint['history']
+            best_acc = checkpoint['best_acc']
+            epoch_metrics = checkpoint['epoch_metrics']
+            best_model_path = checkpoint.get('best_model_path')
+            log(f"Resuming from {checkpoint_path} after epoch {start_epoch}")
+            # The resumed run only saves when it beats best_acc, so start from
+            # the weights that reached it (e.g. when saving to a new path)
+            if (is_main and best_model_path and os.path.exists(best_model_path)
+                    and os.path.abspath(best_model_path) != os.path.abspath(model_save_path)):
+                atomic_copy(best_model_path, model_save_path)
+                best_model_path = os.path.abspath(model_save_path)
+                log(f"Best model so far copied to {model_save_path}")
+        else:
+            log(f"No checkpoint at {checkpoint_path}, starting from scratch")
+    
+    # Checkpoints are written in the background so the loop does not block on disk
+    writer = CheckpointWriter() if is_main else None
     
     # Training loop
     since = time.time()
-    best_acc = 0.0
     
     # Track if training is failing
     consecutive_failures = 0
     max_consecutive_failures = 3
     
-    for epoch in range(num_epochs):
-        print(f'Epoch {epoch+1}/{num_epochs}')
-        print('-' * 10)
+    for epoch in range(start_epoch, num_epochs):
+        log(f'Epoch {epoch+1}/{num_epochs}')
+        log('-' * 10)
+        
+        if is_distributed:
+            # Reshuffle the shards differently every epoch
+            train_loader.sampler.set_epoch(epoch)
         
         try:
             # Training phase
@@ -86,48 +246,60 @@ def train_model(normal_dir, reversal_dir, correct_dir,
             running_loss = 0.0
             running_corrects = 0
             batch_count = 0
+            data_time = 0.0
+            compute_time = 0.0
+            phase_start = tick = time.perf_counter()
             
             for i, (inputs, labels) in enumerate(train_loader):
+                # Time spent waiting on the DataLoader for this batch
+                data_time += time.perf_counter() - tick
+                tick = time.perf_counter()
                 try:
-                    inputs = inputs.to(device)
+                    inputs = inputs.to(device, memory_format=memory_format)
                     labels = labels.to(device)
                     
                     # Zero the parameter gradients
                     optimizer.zero_grad()
                     
                     # Forward pass
-                    outputs = model(inputs)
+                    with torch.autocast(device.type, dtype=autocast_dtype, enabled=bf16):
+                        outputs = model(inputs)
+                        loss = criterion(outputs, labels)
                     _, preds = torch.max(outputs, 1)
-                    loss = criterion(outputs, labels)
                     
                     # Backward + optimize
                     loss.backward()
                     optimizer.step()
                     
-                    # Statistics
-                    running_loss += loss.item() * inputs.size(0)
+                    # Statistics stay on the device; no sync per batch
+                    running_loss += loss.detach() * inputs.size(0)
                     running_corrects += torch.sum(preds == labels.data)
                     batch_count += 1
                     
                     # Print progress every 10 batches
                     if (i+1) % 10 == 0:
-                        print(f'  Batch {i+1}/{len(train_loader)} - Loss: {loss.item():.4f}')
-                    
-                    # Free up memory
-                    del inputs, labels, outputs, preds, loss
-                    if torch.cuda.is_available():
-                        torch.cuda.empty_cache()
+                        log(f'  Batch {i+1}/{len(train_loader)} - Loss: {loss.item():.4f}')
                         
                 except Exception as e:
                     print(f"Error in training batch {i}: {e}")
-                    continue
+                
+                compute_time += time.perf_counter() - tick
+                tick = time.perf_counter()
+            
+            if device.type == 'cuda':
+                torch.cuda.synchronize()
+            train_time = time.perf_counter() - phase_start
             
             # Only compute statistics if we processed at least some batches
+            running_loss, running_corrects, num_samples, batch_count = reduce_epoch_stats(
+                running_loss, running_corrects, len(train_loader.sampler), batch_count
+            )
+            train_samples = num_samples
             if batch_count > 0:
-                train_loss = running_loss / len(train_loader.sampler)
-                train_acc = running_corrects.double() / len(train_loader.sampler)
+                train_loss = running_loss / num_samples
+                train_acc = running_corrects / num_samples
             else:
-                print("Warning: No batches were successfully processed in this epoch")
+                log("Warning: No batches were successfully processed in this epoch")
                 train_loss = float('inf')
                 train_acc = 0.0
             
@@ -136,40 +308,41 @@ def train_model(normal_dir, reversal_dir, correct_dir,
             running_loss = 0.0
             running_corrects = 0
             batch_count = 0
+            val_start = time.perf_counter()
             
             with torch.no_grad():
                 for i, (inputs, labels) in enumerate(val_loader):
                     try:
-                        inputs = inputs.to(device)
+                        inputs = inputs.to(device, memory_format=memory_format)
                         labels = labels.to(device)
                         
                         # Forward pass
-                        outputs = model(inputs)
+                        with torch.autocast(device.type, dtype=autocast_dtype, enabled=bf16):
+                            outputs = model(inputs)
+                            loss = criterion(outputs, labels)
                         _, preds = torch.max(outputs, 1)
-                        loss = criterion(outputs, labels)
                         
                         # Statistics
-                        running_loss += loss.item() * inputs.size(0)
+                        running_loss += loss.detach() * inputs.size(0)
                         running_corrects += torch.sum(preds == labels.data)
                         batch_count += 1
-                        
-                        # Free up memory
-                        del inputs, labels, outputs, preds, loss
-                        if torch.cuda.is_available():
-                            torch.cuda.empty_cache()
                             
                     except Exception as e:
                         print(f"Error in validation batch {i}: {e}")
                         continue
             
             # Only compute statistics if we processed at least some batches
+            running_loss, running_corrects, num_samples, batch_count = reduce_epoch_stats(
+                running_loss, running_corrects, len(val_loader.sampler), batch_count
+            )
             if batch_count > 0:
-                val_loss = running_loss / len(val_loader.sampler)
-                val_acc = running_corrects.double() / len(val_loader.sampler)
+                val_loss = running_loss / num_samples
+                val_acc = running_corrects / num_samples
             else:
-                print("Warning: No validation batches were successfully processed")
+                log("Warning: No validation batches were successfully processed")
                 val_loss = float('inf')
                 val_acc = 0.0
+            val_time = time.perf_counter() - val_start
                 
             # Reset consecutive failures counter
             consecutive_failures = 0
@@ -179,7 +352,7 @@ def train_model(normal_dir, reversal_dir, correct_dir,
             consecutive_failures += 1
             
             if consecutive_failures >= max_consecutive_failures:
-                print(f"Training stopped after {max_consecutive_failures} consecutive failures")
+                log(f"Training stopped after {max_consecutive_failures} consecutive failures")
                 break
                 
             # Try to continue with next epoch
@@ -191,37 +364,129 @@ def train_model(normal_dir, reversal_dir, correct_dir,
         current_lr = optimizer.param_groups[0]['lr']
         
         if current_lr != prev_lr:
-            print(f'Learning rate changed from {prev_lr} to {current_lr}')
+            log(f'Learning rate changed from {prev_lr} to {current_lr}')
         
         # Save history
         history['train_loss'].append(train_loss)
         history['val_loss'].append(val_loss)
-        history['train_acc'].append(train_acc.item())
-        history['val_acc'].append(val_acc.item())
+        history['train_acc'].append(float(train_acc))
+        history['val_acc'].append(float(val_acc))
+        
+        log(f'Train Loss: {train_loss:.4f} Acc: {train_acc:.4f}')
+        log(f'Val Loss: {val_loss:.4f} Acc: {val_acc:.4f}')
         
-        print(f'Train Loss: {train_loss:.4f} Acc: {train_acc:.4f}')
-        print(f'Val Loss: {val_loss:.4f} Acc: {val_acc:.4f}')
+        # Throughput over all processes; timings are from this process
+        metrics = {
+            'epoch': epoch + 1,
+            'train_samples': int(train_samples),
+            'samples_per_sec': train_samples / train_time if train_time > 0 else 0.0,
+            'train_time_sec': train_time,
+            'data_wait_sec': data_time,
+            'compute_sec': compute_time,
+            'data_wait_fraction': data_time / train_time if train_time > 0 else 0.0,
+            'val_time_sec': val_time,
+            'peak_rss_mb': peak_rss_mb(),
+            'learning_rate': current_lr,
+            'train_loss': train_loss,
+            'val_loss': val_loss,
+            'train_acc': float(train_acc),
+            'val_acc': float(val_acc)
+        }
+        epoch_metrics.append(metrics)
+        log(f"{metrics['samples_per_sec']:.1f} samples/sec, data wait {data_time:.1f}s, "
+            f"compute {compute_time:.1f}s, peak RSS {metrics['peak_rss_mb']:.0f} MB")
+        if is_main:
+            write_training_metrics(metrics_path, epoch_metrics, {
+                'device': str(device),
+                'batch_size': batch_size,
+                'world_size': dist.get_world_size() if is_distributed else 1,
+                'num_threads': torch.get_num_threads(),
+                'bf16': bf16,
+                'channels_last': channels_last,
+                'compile': compile_model
+            })
         
         # Save best model
         if val_acc > best_acc:
             best_acc = val_acc
-            save_model(model, model_save_path)
-            print(f'New best model saved with accuracy: {val_acc:.4f}')
+            if is_main:
+                writer.save(net.state_dict(), model_save_path, f"Model saved to {model_save_path}")
+            best_model_path = os.path.abspath(model_save_path)
+            log(f'New best model with accuracy: {val_acc:.4f}')
+        
+        # Full checkpoint to resume from
+        if is_main:
+            writer.save(
+                training_state(net, optimizer, scheduler, epoch + 1, history, best_acc, epoch_metrics,
+                               best_model_path),
+                checkpoint_path
+            )
+        
+        if is_main and progress is not None:
+            progress(dict(metrics, num_epochs=num_epochs, best_val_acc=float(best_acc)))
         
-        print()
+        log()
+    
+    if is_main:
+        writer.close()
+        if not os.path.exists(model_save_path):
+            # No epoch of this run improved on best_acc and its weights were not found
+            atomic_save(net.state_dict(), model_save_path)
+            log(f"No new best model; final weights saved to {model_save_path}")
     
     time_elapsed = time.time() - since
-    print(f'Training complete in {time_elapsed//60:.0f}m {time_elapsed%60:.0f}s')
-    print(f'Best val Acc: {best_acc:.4f}')
+    log(f'Training complete in {time_elapsed//60:.0f}m {time_elapsed%60:.0f}s')
+    log(f'Best val Acc: {best_acc:.4f}')
     
     # Plot training history
-    plot_training_history(history)
+    if is_main:
+        plot_training_history(history)
     
     return history
 
 
+def reduce_epoch_stats(running_loss, running_corrects, num_samples, batch_count):
+    """Sum epoch statistics over all processes when training is distributed."""
+    stats = torch.tensor([float(running_loss), float(running_corrects), num_samples, batch_count],
+                         dtype=torch.float64)
+    if dist.is_available() and dist.is_initialized():
+        dist.all_reduce(stats)
+    running_loss, running_corrects, num_samples, batch_count = stats.tolist()
+    return running_loss, running_corrects, num_samples, int(batch_count)
+
+
+def _silent(*args, **kwargs):
+    pass
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (current RSS where getrusage is missing)."""
+    try:
+        import resource
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def unsupported_head_only_options(**options):
+    """Names of the given full-training options that head_only training cannot honour."""
+    return [name for name, value in options.items() if value != HEAD_ONLY_UNSUPPORTED[name]]
+
+
+def write_training_metrics(path, epochs, config):
+    """Write the per-epoch metrics collected so far as JSON."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'config': config, 'epochs': epochs}, f, indent=2)
+
+
 def plot_training_history(history):
     """Plot training and validation loss/accuracy."""
+    import matplotlib.pyplot as plt
+
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 5))
     
     # Plot loss
@@ -260,6 +525,23 @@ def main():
     parser.add_argument('--batch_size', type=int, default=32, help='Batch size')
     parser.add_argument('--epochs', type=int, default=30, help='Number of epochs')
     parser.add_argument('--lr', type=float, default=0.001, help='Learning rate')
+    parser.add_argument('--cache_dir', default=None, help='Directory for the memory-mapped image cache')
+    parser.add_argument('--head_only', action='store_true', help='Train only the fc head on cached embeddings')
+    parser.add_argument('--unfreeze_last_block', action='store_true', help='With --head_only, also train layer4')
+    parser.add_argument('--embedding_cache_dir', default='models/embeddings', help='Embedding cache directory')
+    parser.add_argument('--base_model', default=None, help='Checkpoint whose backbone is reused by --head_only')
+    parser.add_argument('--nprocs', type=int, default=1, help='Data-parallel training processes on this machine')
+    parser.add_argument('--nnodes', type=int, default=1, help='Number of machines taking part in training')
+    parser.add_argument('--node_rank', type=int, default=0, help='Index of this machine (0 hosts the master)')
+    parser.add_argument('--master_addr', default='127.0.0.1', help='Address of the node_rank 0 machine')
+    parser.add_argument('--master_port', type=int, default=29500, help='Port of the rank 0 process')
+    parser.add_argument('--bf16', action='store_true', help='Use bfloat16 autocast')
+    parser.add_argument('--channels_last', action='store_true', help='Use the channels_last memory format')
+    parser.add_argument('--compile', action='store_true', help='Compile the model with torch.compile')
+    parser.add_argument('--metrics_path', default='models/training_metrics.json', help='Per-epoch metrics JSON file')
+    parser.add_argument('--manifest', default=None, help='Dataset manifest file (built on first use)')
+    parser.add_argument('--resume', action='store_true', help='Continue from the latest full checkpoint')
+    parser.add_argument('--checkpoint_path', default=None, help='Full checkpoint file (default: next to the model)')
     
     args = parser.parse_args()
     
@@ -270,7 +552,24 @@ def main():
         args.model_save_path,
         args.batch_size,
         args.epochs,
-        args.lr
+        args.lr,
+        cache_dir=args.cache_dir,
+        head_only=args.head_only,
+        unfreeze_last_block=args.unfreeze_last_block,
+        embedding_cache_dir=args.embedding_cache_dir,
+        base_model_path=args.base_model,
+        nprocs=args.nprocs,
+        nnodes=args.nnodes,
+        node_rank=args.node_rank,
+        master_addr=args.master_addr,
+        master_port=args.master_port,
+        bf16=args.bf16,
+        channels_last=args.channels_last,
+        compile_model=args.compile,
+        metrics_path=args.metrics_path,
+        manifest_path=args.manifest,
+        resume=args.resume,
+        checkpoint_path=args.checkpoint_path
     )
 
 
@@ -72,54 +72,143 @@ import argparse
 import torch
 import json
 import os
+import io
+import uuid
 import cv2
 import numpy as np
 from datetime import datetime
-from app.model import load_model, analyze_handwriting
-from app.preprocessing import preprocess_single_image
+from PIL import Image, ImageSequence
 from app.utils import get_device, interpret_result
-from app.llama_evaluate import analyze_image_for_spelling
-from app.translation import translate
-def segment_letters(image_path, output_folder, min_width=5, min_height=15, min_area=30):
-    # Read and preprocess image
-    img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+from app.segmentation import find_letter_boxes, iter_letter_boxes
+def decode_image(data, flags=cv2.IMREAD_GRAYSCALE):
+    """
+    Decode encoded image bytes (PNG, JPEG, ...) in memory.
+    
+    Raises:
+        ValueError: If the bytes are not a readable image
+    """
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+    if img is None:
+        raise ValueError("Could not decode image data")
+    return img
+
+
+def extract_letters(image, min_width=5, min_height=15, min_area=30, max_side=None):
+    """
+    Segment a handwriting image into letter crops held in memory.
+    
+    Args:
+        image: Path to the image or a grayscale NumPy array
+        min_width, min_height, min_area: Filters for small artifacts and noise
+        max_side: Optionally downscale pages larger than this before thresholding
+            (see app.segmentation.find_letter_boxes)
+        
+    Returns:
+        List of dictionaries, sorted left to right, each with the grayscale
+        'image' crop (a view into the page) and its padded 'bbox' as
+        (x, y, w, h). Returns None if the image could not be read.
+    """
+    if isinstance(image, str):
+        img = cv2.imread(image, cv2.IMREAD_GRAYSCALE)
+    else:
+        img = image
     if img is None:
         return None
     
-    # Create output folder if it doesn't exist
-    os.makedirs(output_folder, exist_ok=True)
+    boxes, indices = find_letter_boxes(img, min_width, min_height, min_area, max_side)
     
-    # Thresholding
-    _, binary = cv2.threshold(img, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    letters = []
+    for (left, top, w, h), i in zip(boxes.tolist(), indices.tolist()):
+        letters.append({
+            'image': img[top:top + h, left:left + w],
+            'bbox': (left, top, w, h),
+            'index': i
+        })
     
-    # Morphological operations to connect broken parts
-    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3,3))
-    morph = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
+    return letters
+
+
+def iter_pages(image):
+    """
+    Yield each page of an image as a grayscale array, one page at a time.
     
-    # Find contours
-    contours, _ = cv2.findContours(morph, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    Args:
+        image: Path, encoded image bytes or a grayscale NumPy array. .npy
+            files are memory-mapped; multi-page TIFFs yield every page.
+    """
+    if isinstance(image, np.ndarray):
+        yield image
+        return
+    if isinstance(image, str) and image.lower().endswith('.npy'):
+        yield np.load(image, mmap_mode='r')
+        return
     
-    # Filter and sort contours
-    letter_images = []
-    for i, contour in enumerate(sorted(contours, key=lambda c: cv2.boundingRect(c)[0])):
-        x, y, w, h = cv2.boundingRect(contour)
-        
-        # Filter small artifacts and noise
-        if w < min_width or h < min_height or (w*h) < min_area:
-            continue
-            
-        # Extract letter with padding
-        padding = max(5, int(0.1 * max(w, h)))  # Dynamic padding
-        letter = img[max(0,y-padding):min(img.shape[0],y+h+padding), 
-                    max(0,x-padding):min(img.shape[1],x+w+padding)]
-        
-        # Save letter image to output folder
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        letter_path = os.path.join(output_folder, f"letter_{timestamp}_{i}.png")
-        cv2.imwrite(letter_path, letter)
-        letter_images.append(letter_path)
+    source = io.BytesIO(image) if isinstance(image, (bytes, bytearray)) else image
+    try:
+        document = Image.open(source)
+    except Exception as e:
+        raise ValueError(f"Could not read image: {e}")
+    with document:
+        if getattr(document, 'n_frames', 1) > 1:
+            for page in ImageSequence.Iterator(document):
+                yield np.asarray(page.convert('L'))
+            return
+    
+    # Single pages are decoded with OpenCV, exactly like extract_letters
+    if isinstance(image, (bytes, bytearray)):
+        yield decode_image(image)
+    else:
+        page = cv2.imread(image, cv2.IMREAD_GRAYSCALE)
+        if page is None:
+            raise ValueError(f"Could not read image: {image}")
+        yield page
+
+
+def stream_letters(image, strip_height=512, min_width=5, min_height=15, min_area=30):
+    """
+    Segment a (multi-page) scan strip by strip and yield letter crops.
+    
+    Only one decoded page and one strip of intermediate images are held at a
+    time, and each crop is copied out of the page, so consumers can score
+    letters as they arrive without memory growing with the scan size.
+    
+    Yields:
+        Dictionaries like extract_letters, with an extra 'page' number
+    """
+    for page_number, page in enumerate(iter_pages(image)):
+        for (left, top, w, h), i in iter_letter_boxes(page, strip_height, min_width,
+                                                      min_height, min_area):
+            yield {
+                'image': np.array(page[top:top + h, left:left + w]),
+                'bbox': (left, top, w, h),
+                'index': i,
+                'page': page_number
+            }
+
+
+def save_letter_crops(letters, output_folder):
+    """Write letter crops to disk as PNG files and return their paths."""
+    # Create output folder if it doesn't exist
+    os.makedirs(output_folder, exist_ok=True)
+    
+    # A per-call prefix keeps concurrent runs from overwriting each other
+    prefix = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    letter_paths = []
+    for letter in letters:
+        letter_path = os.path.join(output_folder, f"letter_{prefix}_{letter['index']}.png")
+        cv2.imwrite(letter_path, letter['image'])
+        letter_paths.append(letter_path)
+    
+    return letter_paths
+
+
+def segment_letters(image_path, output_folder, min_width=5, min_height=15, min_area=30):
+    """Segment an image into letters and save each crop to output_folder."""
+    letters = extract_letters(image_path, min_width, min_height, min_area)
+    if letters is None:
+        return None
     
-    return letter_images
+    return save_letter_crops(letters, output_folder)
 
 def calculate_final_results(all_results, letter_images, letters_folder):
     """Calculate and format all final results based on individual letter results with multiple thresholds"""
@@ -0,0 +1,5 @@
+"""
+Performance benchmarks for the dyslexia detection pipeline.
+
+Run them from the NeuroReadML directory, e.g. python -m benchmarks.batch_scoring
+"""
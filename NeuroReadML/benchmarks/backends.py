@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Compare inference backends on the bundled test_images.py/ samples.
+
+Segments every sample into letters, then for each backend reports the
+latency of scoring one letter and the throughput of scoring all letters
+in batches. Missing TorchScript/ONNX artifacts are exported first.
+
+Usage:
+    python -m benchmarks.backends --model_path models/dyslexia_model.pth
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import time
+import torch
+
+from app.backends import BACKENDS, artifact_path, export_torchscript, export_onnx
+from app.model import load_model, analyze_handwriting, analyze_handwriting_batch
+from app.preprocessing import preprocess_letter_crops
+from app.utils import extract_letters
+
+
+def load_letters(images_dir):
+    """Segment every sample image and stack all letter crops into one tensor."""
+    crops = []
+    for image_path in sorted(glob.glob(os.path.join(images_dir, '*.png'))):
+        letters = extract_letters(image_path) or []
+        crops.extend(letter['image'] for letter in letters)
+    return preprocess_letter_crops(crops)
+
+
+def ensure_artifacts(model_path):
+    """Export the TorchScript and ONNX artifacts if they do not exist yet."""
+    eager_model = None
+    exporters = {'torchscript': export_torchscript, 'onnxruntime': export_onnx}
+    for backend, exporter in exporters.items():
+        path = artifact_path(model_path, backend)
+        if not os.path.exists(path):
+            if eager_model is None:
+                eager_model = load_model(model_path, backend='eager')
+            exporter(eager_model, path)
+            print(f"Exported {backend} artifact to {path}")
+
+
+def benchmark(model, letters, batch_size, repeats):
+    """Return (median single-letter latency in ms, batched letters/sec)."""
+    single = letters[:1]
+    analyze_handwriting(model, single)
+    latencies = []
+    for _ in range(repeats * 10):
+        start = time.perf_counter()
+        analyze_handwriting(model, single)
+        latencies.append((time.perf_counter() - start) * 1000)
+    
+    analyze_handwriting_batch(model, letters, "cpu", batch_size)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        analyze_handwriting_batch(model, letters, "cpu", batch_size)
+    throughput = letters.size(0) * repeats / (time.perf_counter() - start)
+    
+    return statistics.median(latencies), throughput
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare eager, TorchScript and ONNX Runtime backends')
+    parser.add_argument('--model_path', default='models/dyslexia_model.pth',
+                        help='Path to the trained .pth checkpoint')
+    parser.add_argument('--images_dir', default='test_images.py',
+                        help='Directory of sample handwriting images')
+    parser.add_argument('--batch_size', type=int, default=32,
+                        help='Batch size for the throughput measurement')
+    parser.add_argument('--repeats', type=int, default=5,
+                        help='Number of timed repeats')
+    args = parser.parse_args()
+    
+    ensure_artifacts(args.model_path)
+    letters = load_letters(args.images_dir)
+    if letters is None:
+        print(f"No letters found in {args.images_dir}")
+        return
+    
+    print(f"{letters.size(0)} letters from {args.images_dir}, {torch.get_num_threads()} torch threads")
+    print(f"{'backend':>12} | {'latency (ms)':>12} | {'letters/sec':>11}")
+    print('-' * 42)
+    for backend in BACKENDS:
+        if not os.path.exists(artifact_path(args.model_path, backend)):
+            # The INT8 artifact needs calibration data, see quantize_model.py
+            print(f"{backend:>12} | {'skipped, no artifact':>26}")
+            continue
+        model = load_model(args.model_path, backend=backend)
+        latency, throughput = benchmark(model, letters, args.batch_size, args.repeats)
+        print(f"{backend:>12} | {latency:>12.2f} | {throughput:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
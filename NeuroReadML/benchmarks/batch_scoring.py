@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Benchmark batched letter scoring throughput on CPU.
+
+Scores the same set of letter tensors with analyze_handwriting_batch at
+batch sizes 1 through 128 and reports letters per second.
+
+Usage:
+    python -m benchmarks.batch_scoring --num_letters 256
+"""
+
+import argparse
+import time
+import torch
+
+from app.model import create_dyslexia_model, analyze_handwriting_batch
+
+
+def benchmark(model, letters, batch_size, repeats):
+    """Return letters/sec for scoring all letters at the given batch size."""
+    # One untimed pass so allocator and kernel setup are not measured
+    analyze_handwriting_batch(model, letters[:batch_size], "cpu", batch_size)
+    
+    start = time.perf_counter()
+    for _ in range(repeats):
+        analyze_handwriting_batch(model, letters, "cpu", batch_size)
+    elapsed = time.perf_counter() - start
+    
+    return letters.size(0) * repeats / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark batched letter scoring on CPU')
+    parser.add_argument('--num_letters', type=int, default=256,
+                        help='Number of letter crops to score per repeat')
+    parser.add_argument('--repeats', type=int, default=3,
+                        help='Number of timed repeats per batch size')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='torch intra-op threads (default: torch default)')
+    args = parser.parse_args()
+    
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    
+    model = create_dyslexia_model(num_classes=3, pretrained=False)
+    model.eval()
+    letters = torch.randn(args.num_letters, 3, 224, 224)
+    
+    print(f"Scoring {args.num_letters} letters on CPU with {torch.get_num_threads()} threads")
+    print(f"{'batch size':>10} | {'letters/sec':>12} | {'speedup':>8}")
+    print('-' * 36)
+    
+    baseline = None
+    for batch_size in [1, 2, 4, 8, 16, 32, 64, 128]:
+        letters_per_sec = benchmark(model, letters, batch_size, args.repeats)
+        if baseline is None:
+            baseline = letters_per_sec
+        print(f"{batch_size:>10} | {letters_per_sec:>12.1f} | {letters_per_sec / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Benchmark data-parallel CPU training throughput for 1, 2, 4 and 8 processes.
+
+Each run starts a gloo process group like app.distributed, wraps the model
+in DistributedDataParallel and times training steps on synthetic batches.
+The batch size is per process, as with train_model.py --nprocs, so ideal
+scaling doubles samples/sec when the process count doubles.
+
+Usage:
+    python -m benchmarks.distributed_scaling --batch_size 16 --steps 10
+"""
+
+import argparse
+import os
+import time
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import torch.nn as nn
+import torch.optim as optim
+from torch.nn.parallel import DistributedDataParallel
+
+from app.model import create_dyslexia_model
+from app.distributed import threads_per_process
+
+
+def _worker(rank, world_size, port, batch_size, steps, num_threads, results):
+    torch.set_num_threads(num_threads)
+    dist.init_process_group('gloo', init_method=f'tcp://127.0.0.1:{port}',
+                            rank=rank, world_size=world_size)
+    try:
+        torch.manual_seed(rank)
+        model = DistributedDataParallel(create_dyslexia_model(num_classes=3, pretrained=False))
+        optimizer = optim.Adam(model.parameters(), lr=0.001)
+        criterion = nn.CrossEntropyLoss()
+        inputs = torch.randn(batch_size, 3, 224, 224)
+        labels = torch.randint(0, 3, (batch_size,))
+
+        def step():
+            optimizer.zero_grad()
+            criterion(model(inputs), labels).backward()
+            optimizer.step()
+
+        # One untimed step for allocator and gradient bucket setup
+        step()
+        dist.barrier()
+        start = time.perf_counter()
+        for _ in range(steps):
+            step()
+        dist.barrier()
+        elapsed = time.perf_counter() - start
+
+        if rank == 0:
+            results.put(elapsed)
+    finally:
+        dist.destroy_process_group()
+
+
+def benchmark(nprocs, batch_size, steps, port):
+    """Return global training samples/sec with nprocs processes."""
+    context = mp.get_context('spawn')
+    results = context.SimpleQueue()
+    mp.spawn(_worker,
+             args=(nprocs, port, batch_size, steps, threads_per_process(nprocs), results),
+             nprocs=nprocs, join=True)
+    elapsed = results.get()
+    return nprocs * batch_size * steps / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark data-parallel CPU training scaling')
+    parser.add_argument('--batch_size', type=int, default=16,
+                        help='Batch size per process')
+    parser.add_argument('--steps', type=int, default=10,
+                        help='Timed training steps per run')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='Process counts to benchmark')
+    parser.add_argument('--master_port', type=int, default=29511,
+                        help='First TCP port to use for the process groups')
+    args = parser.parse_args()
+
+    print(f"Training on {os.cpu_count()} CPU cores, batch size {args.batch_size} per process")
+    print(f"{'processes':>9} | {'threads':>7} | {'samples/sec':>11} | {'speedup':>7} | {'efficiency':>10}")
+    print('-' * 57)
+
+    baseline = None
+    for i, nprocs in enumerate(args.processes):
+        # A fresh port per run so a lingering socket cannot block the next group
+        samples_per_sec = benchmark(nprocs, args.batch_size, args.steps, args.master_port + i)
+        if baseline is None:
+            baseline = samples_per_sec / args.processes[0]
+        speedup = samples_per_sec / baseline
+        print(f"{nprocs:>9} | {threads_per_process(nprocs):>7} | {samples_per_sec:>11.1f} | "
+              f"{speedup:>6.2f}x | {speedup / nprocs:>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
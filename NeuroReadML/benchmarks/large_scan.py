@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Compare whole-page and strip-by-strip segmentation on large scans.
+
+Builds synthetic scans by tiling test_images.py/full.png to roughly
+300 and 600 DPI A4 sizes, then runs extract_letters (whole page) and
+stream_letters (strips) in fresh processes and reports time, letters
+found and peak RSS. The scans are stored as .npy files, which
+stream_letters memory-maps, so only one strip is ever resident.
+
+Usage:
+    python -m benchmarks.large_scan --strip_height 512
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import resource
+import tempfile
+import time
+import cv2
+import numpy as np
+
+# Approximate A4 page sizes in pixels (height, width)
+PAGE_SIZES = {'300dpi': (3508, 2480), '600dpi': (7016, 4960)}
+
+
+def make_scan(path, shape, tile_path):
+    """Tile a sample image into a page of the given shape and save it as .npy."""
+    tile = cv2.imread(tile_path, cv2.IMREAD_GRAYSCALE)
+    reps = (shape[0] // tile.shape[0] + 1, shape[1] // tile.shape[1] + 1)
+    page = np.tile(tile, reps)[:shape[0], :shape[1]]
+    np.save(path, page)
+
+
+def _run(mode, path, strip_height, results):
+    from app.utils import extract_letters, stream_letters
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if mode == 'whole page':
+        count = len(extract_letters(np.load(path)))
+    else:
+        count = sum(1 for _ in stream_letters(path, strip_height))
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux
+    results.put((count, elapsed, peak / 1024, (peak - baseline) / 1024))
+
+
+def measure(mode, path, strip_height):
+    """Run one segmentation in a fresh process and return its measurements."""
+    context = mp.get_context('spawn')
+    results = context.SimpleQueue()
+    process = context.Process(target=_run, args=(mode, path, strip_height, results))
+    process.start()
+    process.join()
+    return results.get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark bounded-memory segmentation')
+    parser.add_argument('--strip_height', type=int, default=512,
+                        help='Rows per strip for stream_letters')
+    parser.add_argument('--tile', default=os.path.join('test_images.py', 'full.png'),
+                        help='Sample image tiled into the synthetic scans')
+    args = parser.parse_args()
+
+    print(f"{'page':>7} | {'size':>9} | {'mode':>10} | {'letters':>7} | {'seconds':>7} | "
+          f"{'peak RSS MB':>11} | {'growth MB':>9}")
+    print('-' * 80)
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, shape in PAGE_SIZES.items():
+            path = os.path.join(tmp, f'{name}.npy')
+            make_scan(path, shape, args.tile)
+            for mode in ('whole page', 'strips'):
+                count, elapsed, peak, growth = measure(mode, path, args.strip_height)
+                size = f"{shape[1]}x{shape[0]}"
+                print(f"{name:>7} | {size:>9} | {mode:>10} | {count:>7} | {elapsed:>7.2f} | "
+                      f"{peak:>11.0f} | {growth:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
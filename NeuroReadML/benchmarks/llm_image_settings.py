@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""
+Compare LLM spelling scores at different image-preparation settings.
+
+Every image in --images_dir is sent to the configured LLM endpoint
+(BASE_URL, API_KEY, MODEL) once per setting. The 'full' setting sends the
+original file unchanged and is the reference. For each setting the script
+reports the payload size, the estimated image tokens and how far
+Motor_variability and Orthographic_irregularity move from the full
+resolution scores. The LLM does not answer deterministically; with
+--repeats 2 or more the 'full' row compares full resolution runs with each
+other and shows the noise floor. Use --dry_run to only report sizes and
+tokens without calling the LLM.
+
+A setting is written as max_side/mode/format/quality, e.g.
+1024/grayscale/jpeg/80.
+
+Usage:
+    python -m benchmarks.llm_image_settings --images_dir test_images.py --repeats 2
+"""
+
+import argparse
+import json
+import os
+import statistics
+
+from app.llama_evaluate import analyze_image_for_spelling
+from app.llm_image import prepare_image
+
+SCORES = ('Motor_variability', 'Orthographic_irregularity')
+DEFAULT_SETTINGS = ['full', '2048/color/jpeg/90', '1536/color/jpeg/85', '1024/color/jpeg/80',
+                    '1024/grayscale/jpeg/80', '1024/contrast/jpeg/80', '768/grayscale/jpeg/75',
+                    '512/grayscale/jpeg/70']
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.bmp')
+
+
+def parse_setting(text):
+    """Turn 'full' or 'max_side/mode/format/quality' into prepare_image arguments."""
+    if text == 'full':
+        return {'mode': 'original'}
+    max_side, mode, image_format, quality = text.split('/')
+    return {'max_side': int(max_side), 'mode': mode, 'image_format': image_format,
+            'quality': int(quality)}
+
+
+def scores_of(result):
+    """The numeric scores of an analysis, or None if the call failed."""
+    if not isinstance(result, dict):
+        return None
+    try:
+        return {name: float(result[name]) for name in SCORES}
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='LLM scores vs. image-preparation settings')
+    parser.add_argument('--images_dir', default='test_images.py',
+                        help='Directory of handwriting images')
+    parser.add_argument('--settings', nargs='+', default=DEFAULT_SETTINGS,
+                        help="Settings to compare ('full' or max_side/mode/format/quality)")
+    parser.add_argument('--mirror_score', type=float, default=10.0,
+                        help='Mirror writing score put into the prompt (same for every setting)')
+    parser.add_argument('--repeats', type=int, default=1,
+                        help='LLM calls per image and setting; scores are averaged')
+    parser.add_argument('--dry_run', action='store_true',
+                        help='Only report payload sizes and tokens')
+    parser.add_argument('--output', default=None,
+                        help='Optional JSON file for the per-image results')
+    args = parser.parse_args()
+
+    images = sorted(os.path.join(args.images_dir, name) for name in os.listdir(args.images_dir)
+                    if name.lower().endswith(IMAGE_EXTENSIONS))
+    if not images:
+        raise SystemExit(f"No images found in {args.images_dir}")
+    settings = ['full'] + [setting for setting in args.settings if setting != 'full']
+
+    results = {}
+    for setting in settings:
+        options = parse_setting(setting)
+        results[setting] = []
+        for image_path in images:
+            prepared = prepare_image(image_path, **options)
+            row = {'image': image_path, 'bytes': prepared['bytes'], 'tokens': prepared['tokens'],
+                   'size': [prepared['width'], prepared['height']], 'runs': []}
+            if not args.dry_run:
+                for _ in range(args.repeats):
+                    result = analyze_image_for_spelling(image_path, args.mirror_score,
+                                                        image_options=options)
+                    row['runs'].append(scores_of(result))
+            results[setting].append(row)
+            print(f"{setting}: {os.path.basename(image_path)} {row['size'][0]}x{row['size'][1]}, "
+                  f"{row['bytes'] / 1024:.0f} KB, {row['tokens']} tokens, scores {row['runs']}")
+
+    # The full resolution scores every setting is compared with
+    reference = {}
+    for row in results['full']:
+        runs = [run for run in row['runs'] if run]
+        if runs:
+            reference[row['image']] = {name: statistics.mean(run[name] for run in runs)
+                                       for name in SCORES}
+
+    full_bytes = sum(row['bytes'] for row in results['full'])
+    full_tokens = sum(row['tokens'] for row in results['full'])
+    header = f"{'setting':>24} | {'KB':>7} | {'bytes %':>7} | {'tokens':>6} | {'tokens %':>8}"
+    if not args.dry_run:
+        header += ''.join(f" | {name[:14] + ' diff':>19}" for name in SCORES) + f" | {'failed':>6}"
+    print(f"\n{header}\n{'-' * len(header)}")
+    for setting in settings:
+        rows = results[setting]
+        total_bytes = sum(row['bytes'] for row in rows)
+        total_tokens = sum(row['tokens'] for row in rows)
+        line = (f"{setting:>24} | {total_bytes / 1024:>7.0f} | {100 * total_bytes / full_bytes:>6.0f}% | "
+                f"{total_tokens:>6} | {100 * total_tokens / full_tokens:>7.0f}%")
+        if not args.dry_run:
+            # Mean absolute difference from the full resolution mean; for 'full'
+            # itself this is the run-to-run spread
+            for name in SCORES:
+                diffs = []
+                for row in rows:
+                    for run in row['runs']:
+                        if run and row['image'] in reference:
+                            diffs.append(abs(run[name] - reference[row['image']][name]))
+                line += f" | {statistics.mean(diffs):>19.2f}" if diffs else f" | {'n/a':>19}"
+            failed = sum(1 for row in rows for run in row['runs'] if run is None)
+            line += f" | {failed:>6}"
+        print(line)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""
+Compare the memory of `uvicorn --workers N` with the pre-forking serve.py.
+
+Starts app/main.py both ways with the same checkpoint, sends a few
+/predict uploads so every worker has run inference, then reads RSS and
+PSS for each process from /proc/<pid>/smaps_rollup. RSS counts shared
+pages in full for every process; PSS splits them between the processes
+that share them, so the PSS column adds up to the real memory used.
+
+Usage:
+    python -m benchmarks.prefork_memory --model_path models/dyslexia_model.pth --workers 4
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from app.prefork import memory_usage
+
+
+def child_pids(pid):
+    """Direct children of pid, leaving out multiprocessing's resource tracker."""
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        children = [int(child) for child in f.read().split()]
+    workers = []
+    for child in children:
+        with open(f'/proc/{child}/cmdline', 'rb') as f:
+            if b'resource_tracker' not in f.read():
+                workers.append(child)
+    return workers
+
+
+def wait_until_ready(url, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f'{url}/status', timeout=2).json().get('model_loaded'):
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server at {url} did not become ready within {timeout} s")
+
+
+def measure(name, command, env, url, image_path, requests, settle, timeout):
+    """Start a server, exercise it and return [(role, pid, memory usage)]."""
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(url, timeout)
+        # Give the remaining workers time to finish their own start-up
+        time.sleep(settle)
+        with open(image_path, 'rb') as f:
+            image = f.read()
+
+        def upload(i):
+            files = {'file': (f'{i}.png', image, 'image/png')}
+            return httpx.post(f'{url}/predict', files=files, timeout=120).status_code
+
+        with ThreadPoolExecutor(max_workers=requests) as pool:
+            statuses = list(pool.map(upload, range(requests)))
+        if any(status != 200 for status in statuses):
+            print(f"{name}: some requests failed: {statuses}")
+        time.sleep(1)
+
+        rows = [('master', process.pid, memory_usage(process.pid))]
+        rows += [('worker', pid, memory_usage(pid)) for pid in child_pids(process.pid)]
+        return rows
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory of uvicorn workers vs. pre-forked workers')
+    parser.add_argument('--model_path', default='models/dyslexia_model.pth',
+                        help='Checkpoint served by both launchers (MODEL_PATH)')
+    parser.add_argument('--workers', type=int, default=2,
+                        help='Number of API workers')
+    parser.add_argument('--port', type=int, default=8790,
+                        help='Port used for the runs')
+    parser.add_argument('--image', default=os.path.join('test_images.py', 'full.png'),
+                        help='Image uploaded to /predict')
+    parser.add_argument('--requests', type=int, default=8,
+                        help='Concurrent /predict uploads before measuring')
+    parser.add_argument('--settle', type=float, default=10.0,
+                        help='Seconds to wait after the first worker is ready')
+    parser.add_argument('--timeout', type=float, default=300.0,
+                        help='Seconds to wait for a server to start')
+    args = parser.parse_args()
+
+    env = dict(os.environ, MODEL_PATH=args.model_path)
+    url = f'http://127.0.0.1:{args.port}'
+    commands = {
+        'uvicorn --workers': [sys.executable, '-m', 'uvicorn', 'app.main:app', '--host', '127.0.0.1',
+                              '--port', str(args.port), '--workers', str(args.workers)],
+        'serve.py': [sys.executable, 'serve.py', '--host', '127.0.0.1', '--port', str(args.port),
+                     '--workers', str(args.workers)]
+    }
+
+    print(f"{'launcher':>17} | {'process':>7} | {'pid':>7} | {'RSS MB':>7} | {'PSS MB':>7} | "
+          f"{'shared MB':>9} | {'private MB':>10}")
+    print('-' * 84)
+    for name, command in commands.items():
+        rows = measure(name, command, env, url, args.image, args.requests, args.settle, args.timeout)
+        for role, pid, usage in rows:
+            print(f"{name:>17} | {role:>7} | {pid:>7} | {usage['rss_mb']:>7.0f} | "
+                  f"{usage['pss_mb']:>7.0f} | {usage['shared_mb']:>9.0f} | {usage['private_mb']:>10.0f}")
+        total = {key: sum(usage[key] for _, _, usage in rows) for key in rows[0][2]}
+        print(f"{name:>17} | {'total':>7} | {'':>7} | {total['rss_mb']:>7.0f} | "
+              f"{total['pss_mb']:>7.0f} | {total['shared_mb']:>9.0f} | {total['private_mb']:>10.0f}")
+        print('-' * 84)
+
+
+if __name__ == "__main__":
+    main()
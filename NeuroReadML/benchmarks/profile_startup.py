@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""
+Profile the cold start of predict.py.
+
+Runs `python -X importtime -c "import predict"` in a fresh interpreter and
+reports import time per top-level package, then measures the
+time-to-first-prediction (interpreter start, imports, model load and
+letter scoring of one image) for each backend that has an artifact next
+to --model_path. The LLM and translation calls are left out: they are
+network bound and their clients are only imported when first used.
+
+Usage:
+    python -m benchmarks.profile_startup --model_path models/dyslexia_model.pth
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from app.backends import BACKENDS, artifact_path, weights_path
+
+# Run in a fresh interpreter; prints the phase timings as JSON
+FIRST_PREDICTION = """
+import json, sys, time
+start = time.perf_counter()
+import predict
+from app.engine import InferenceEngine
+imported = time.perf_counter()
+engine = InferenceEngine(sys.argv[1], backend=sys.argv[2]).load(warmup=False)
+loaded = time.perf_counter()
+engine.score_letters(sys.argv[3])
+scored = time.perf_counter()
+print(json.dumps({'import': imported - start, 'load': loaded - imported,
+                  'first prediction': scored - loaded,
+                  'torchvision imported': 'torchvision' in sys.modules,
+                  'openai imported': 'openai' in sys.modules}))
+"""
+
+
+def import_times(module):
+    """Return {top-level package: self import time in seconds} for importing module."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, check=True)
+    totals = defaultdict(float)
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        totals[name.strip().split('.')[0]] += int(self_us) / 1e6
+    return dict(totals)
+
+
+def first_prediction(model_path, backend, image_path):
+    """Time one fresh process from interpreter start to its first letter scores."""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-W', 'ignore', '-c', FIRST_PREDICTION,
+                             model_path, backend, image_path],
+                            capture_output=True, text=True, check=True)
+    total = time.perf_counter() - start
+    phases = json.loads(result.stdout.strip().splitlines()[-1])
+    phases['total'] = total
+    return phases
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Profile predict.py start-up')
+    parser.add_argument('--model_path', default='models/dyslexia_model.pth',
+                        help='Trained .pth checkpoint (exported artifacts are found next to it)')
+    parser.add_argument('--image', default=os.path.join('test_images.py', 'full.png'),
+                        help='Image scored for the first prediction')
+    parser.add_argument('--module', default='predict',
+                        help='Module whose imports are profiled')
+    parser.add_argument('--top', type=int, default=15,
+                        help='Number of packages listed in the import profile')
+    args = parser.parse_args()
+
+    totals = import_times(args.module)
+    print(f"Import profile of '{args.module}' ({sum(totals.values()):.2f} s in total):")
+    for name, seconds in sorted(totals.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:<24} {seconds:7.3f} s")
+
+    print(f"\nWeights read by the eager backend: {weights_path(args.model_path)}")
+    print(f"\n{'backend':>12} | {'import s':>8} | {'load s':>6} | {'first s':>7} | {'total s':>7} | "
+          f"torchvision | openai")
+    print('-' * 76)
+    for backend in BACKENDS:
+        if not os.path.exists(artifact_path(args.model_path, backend)):
+            continue
+        phases = first_prediction(args.model_path, backend, args.image)
+        print(f"{backend:>12} | {phases['import']:>8.2f} | {phases['load']:>6.2f} | "
+              f"{phases['first prediction']:>7.2f} | {phases['total']:>7.2f} | "
+              f"{str(phases['torchvision imported']):>11} | {phases['openai imported']}")
+
+
+if __name__ == "__main__":
+    main()
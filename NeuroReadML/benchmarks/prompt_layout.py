@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+"""
+Measure time-to-first-token (TTFT) of the two prompt layouts.
+
+Sends --requests streamed analyses per layout (PROMPT_LAYOUT 'inline' and
+'split') to an OpenAI-compatible server, with a different mirror writing
+score and a unique image on each request, as in production. Only the
+first token is waited for, then the stream is closed. The script also
+reports how many leading characters each request shares with the one
+before it, which is what a prefix cache can reuse.
+
+Point --base_url at a local server with prefix caching enabled, e.g.
+`vllm serve <model> --enable-prefix-caching` or llama.cpp's `llama-server`
+(which caches prompts by default). Without such a server, --stand_in starts
+a stand-in in this process: it keeps vLLM-style 16-token block hashes of
+the prompts it has seen and delays the first token by --prefill_ms for
+every prompt token that is not covered by a cached prefix. Its numbers
+follow from that model, so they show the effect of the layout, not the
+speed of any real server.
+
+Usage:
+    python -m benchmarks.prompt_layout --stand_in --requests 20
+    python -m benchmarks.prompt_layout --base_url http://127.0.0.1:8000/v1 --model <model>
+"""
+
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from collections import OrderedDict
+
+from openai import OpenAI
+from PIL import Image
+
+from app.llama_evaluate import API_KEY, BASE_URL, MODEL, PROMPT_LAYOUTS, build_messages
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+BLOCK_SIZE = 16
+
+
+class PrefixCacheModel:
+    """Block-hash prefix cache in the style of vLLM's automatic prefix caching."""
+
+    def __init__(self, prefill_ms, image_tokens, max_blocks=100000):
+        self.prefill_ms = prefill_ms
+        self.image_tokens = image_tokens
+        self.max_blocks = max_blocks
+        self.blocks = OrderedDict()
+        self.lock = threading.Lock()
+
+    def tokens(self, messages):
+        """Approximate tokens: one per 4 characters of text, image_tokens per image."""
+        tokens = []
+        for message in messages:
+            tokens.append(f"<{message['role']}>")
+            content = message['content']
+            parts = [{'type': 'text', 'text': content}] if isinstance(content, str) else content
+            for part in parts:
+                if part['type'] == 'text':
+                    text = part['text']
+                    tokens.extend(text[i:i + 4] for i in range(0, len(text), 4))
+                else:
+                    digest = hashlib.sha1(part['image_url']['url'].encode()).hexdigest()
+                    tokens.extend(f"{digest}:{i}" for i in range(self.image_tokens))
+        return tokens
+
+    def uncached_tokens(self, messages):
+        """Number of prompt tokens to prefill; caches every full block of the prompt."""
+        tokens = self.tokens(messages)
+        cached = 0
+        prefix = hashlib.sha1()
+        with self.lock:
+            hit = True
+            for start in range(0, len(tokens) - BLOCK_SIZE + 1, BLOCK_SIZE):
+                prefix.update('\x00'.join(tokens[start:start + BLOCK_SIZE]).encode())
+                key = prefix.hexdigest()
+                if hit and key in self.blocks:
+                    cached += BLOCK_SIZE
+                    self.blocks.move_to_end(key)
+                else:
+                    hit = False
+                    self.blocks[key] = True
+                    if len(self.blocks) > self.max_blocks:
+                        self.blocks.popitem(last=False)
+        return len(tokens) - cached
+
+
+def start_stand_in(port, prefill_ms, image_tokens):
+    """Run the stand-in OpenAI-compatible server in a background thread."""
+    import uvicorn
+    from fastapi import FastAPI, Request
+    from fastapi.responses import StreamingResponse
+
+    cache = PrefixCacheModel(prefill_ms, image_tokens)
+    reply = json.dumps({'Motor_variability': 30, 'Orthographic_irregularity': 20,
+                        'Mirror_writing': 10, 'detailed_text': 'Stand-in reply.'})
+    app = FastAPI()
+
+    @app.post('/v1/chat/completions')
+    async def chat(request: Request):
+        body = await request.json()
+        await asyncio.sleep(0.01 + cache.uncached_tokens(body['messages']) * prefill_ms / 1000)
+
+        async def chunks():
+            for i in range(0, len(reply), 8):
+                if await request.is_disconnected():
+                    return
+                chunk = {'id': 'stand-in', 'object': 'chat.completion.chunk', 'created': 0,
+                         'model': body.get('model'),
+                         'choices': [{'index': 0, 'delta': {'content': reply[i:i + 8]},
+                                      'finish_reason': None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(chunks(), media_type='text/event-stream')
+
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning'))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f'http://127.0.0.1:{port}/v1'
+
+
+def unique_image(image_path, index):
+    """PNG bytes of the image with one pixel changed, so no two requests share an image."""
+    img = Image.open(image_path).convert('RGB')
+    img.putpixel((0, 0), (index % 256, index // 256 % 256, 0))
+    buffer = io.BytesIO()
+    img.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def time_to_first_token(client, model, messages):
+    """Seconds until the first content chunk of a streamed completion."""
+    start = time.perf_counter()
+    stream = client.chat.completions.create(model=model, messages=messages, temperature=0.2,
+                                            max_tokens=10000, stream=True)
+    try:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                return time.perf_counter() - start
+    finally:
+        stream.close()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time-to-first-token of the prompt layouts')
+    parser.add_argument('--base_url', default=BASE_URL,
+                        help='OpenAI-compatible endpoint (default: BASE_URL)')
+    parser.add_argument('--model', default=MODEL or 'stand-in',
+                        help='Model name (default: MODEL)')
+    parser.add_argument('--images_dir', default='test_images.py',
+                        help='Images sent in turn')
+    parser.add_argument('--requests', type=int, default=10,
+                        help='Requests per layout')
+    parser.add_argument('--layouts', nargs='+', default=list(PROMPT_LAYOUTS), choices=PROMPT_LAYOUTS,
+                        help='Layouts to compare')
+    parser.add_argument('--stand_in', action='store_true',
+                        help='Start the prefix-caching stand-in server instead of using --base_url')
+    parser.add_argument('--port', type=int, default=8791,
+                        help='Port of the stand-in server')
+    parser.add_argument('--prefill_ms', type=float, default=0.5,
+                        help='Stand-in prefill time per uncached prompt token, in ms')
+    parser.add_argument('--image_tokens', type=int, default=765,
+                        help='Stand-in prompt tokens per image')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed for the mirror writing scores')
+    args = parser.parse_args()
+
+    base_url = start_stand_in(args.port, args.prefill_ms, args.image_tokens) if args.stand_in else args.base_url
+    if not base_url:
+        raise SystemExit("Set BASE_URL, pass --base_url or use --stand_in")
+    client = OpenAI(base_url=base_url, api_key=API_KEY or 'none', max_retries=0)
+
+    images = sorted(os.path.join(args.images_dir, name) for name in os.listdir(args.images_dir)
+                    if name.lower().endswith(IMAGE_EXTENSIONS))
+    if not images:
+        raise SystemExit(f"No images found in {args.images_dir}")
+
+    print(f"Endpoint: {base_url}, model: {args.model}, {args.requests} requests per layout")
+    print(f"\n{'layout':>8} | {'first s':>7} | {'median s':>8} | {'p90 s':>6} | {'shared prefix chars':>19}")
+    print('-' * 62)
+    for layout in args.layouts:
+        # The same scores and images for every layout
+        scores = random.Random(args.seed)
+        ttfts, shared, previous = [], [], None
+        for i in range(args.requests):
+            image = unique_image(images[i % len(images)], i)
+            messages = build_messages(image, round(scores.uniform(0, 100), 2), layout=layout)
+            payload = json.dumps(messages)
+            if previous is not None:
+                shared.append(len(os.path.commonprefix([previous, payload])))
+            previous = payload
+            ttfts.append(time_to_first_token(client, args.model, messages))
+
+        # The first request of a layout fills the cache; the rest show steady state
+        warm = sorted(ttfts[1:]) or ttfts
+        p90 = warm[min(len(warm) - 1, int(0.9 * len(warm)))]
+        print(f"{layout:>8} | {ttfts[0]:>7.3f} | {statistics.median(warm):>8.3f} | {p90:>6.3f} | "
+              f"{statistics.mean(shared) if shared else 0:>19.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Benchmark letter segmentation on the bundled test_images.py/ samples.
+
+Compares the original findContours implementation with the connected
+components engine in app.segmentation on every sample (including the
+22 KB full.png), checks that both return the same boxes in the same order,
+and times a large synthetic scan made by tiling full.png, with and
+without --max_side downscaling.
+
+Usage:
+    python -m benchmarks.segmentation --repeats 200
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import time
+import cv2
+import numpy as np
+
+from app.segmentation import find_letter_boxes, find_letter_boxes_contours
+
+
+def time_ms(fn, img, repeats, **kwargs):
+    """Return the median latency of fn(img) in milliseconds."""
+    fn(img, **kwargs)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(img, **kwargs)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark letter segmentation')
+    parser.add_argument('--images_dir', default='test_images.py',
+                        help='Directory with sample handwriting images')
+    parser.add_argument('--repeats', type=int, default=200,
+                        help='Timed runs per image')
+    parser.add_argument('--scan_tiles', type=int, default=24,
+                        help='Tile full.png this many times per side for the large scan')
+    parser.add_argument('--max_side', type=int, default=2000,
+                        help='Downscale limit used for the large scan')
+    args = parser.parse_args()
+
+    samples = {}
+    for image_path in sorted(glob.glob(os.path.join(args.images_dir, '*.png'))):
+        samples[os.path.basename(image_path)] = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+
+    print(f"{'image':>22} | {'size':>9} | {'letters':>7} | {'contours ms':>11} | "
+          f"{'components ms':>13} | {'speedup':>7} | same")
+    print('-' * 92)
+    for name, img in samples.items():
+        expected = find_letter_boxes_contours(img)
+        actual = find_letter_boxes(img)
+        same = np.array_equal(expected[0], actual[0]) and np.array_equal(expected[1], actual[1])
+        before = time_ms(find_letter_boxes_contours, img, args.repeats)
+        after = time_ms(find_letter_boxes, img, args.repeats)
+        size = f"{img.shape[1]}x{img.shape[0]}"
+        print(f"{name:>22} | {size:>9} | {len(actual[0]):>7} | {before:>11.3f} | "
+              f"{after:>13.3f} | {before / after:>6.2f}x | {same}")
+
+    if 'full.png' in samples:
+        scan = np.tile(samples['full.png'], (args.scan_tiles, args.scan_tiles))
+        repeats = max(1, args.repeats // 20)
+        before = time_ms(find_letter_boxes_contours, scan, repeats)
+        after = time_ms(find_letter_boxes, scan, repeats)
+        scaled = time_ms(find_letter_boxes, scan, repeats, max_side=args.max_side)
+        letters = len(find_letter_boxes(scan)[0])
+        scaled_letters = len(find_letter_boxes(scan, max_side=args.max_side)[0])
+        print(f"\nLarge scan {scan.shape[1]}x{scan.shape[0]} ({letters} letters):")
+        print(f"  contours:                {before:8.2f} ms")
+        print(f"  components:              {after:8.2f} ms ({before / after:.2f}x)")
+        print(f"  components, max_side={args.max_side}: {scaled:8.2f} ms ({before / scaled:.2f}x, "
+              f"{scaled_letters} letters)")
+
+
+if __name__ == "__main__":
+    main()
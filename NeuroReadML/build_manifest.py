@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+"""
+Script to build or update the dataset manifest used by train_model.py --manifest.
+
+Only files that are new or changed since the last run are hashed, so the
+script can be re-run cheaply whenever new images land in the directories.
+"""
+
+import argparse
+from app.manifest import update_manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or update the dataset manifest')
+    
+    parser.add_argument('--normal_dir', required=True,
+                        help='Directory containing normal handwriting images')
+    parser.add_argument('--reversal_dir', required=True,
+                        help='Directory containing reversal handwriting images (dyslexia indicators)')
+    parser.add_argument('--correct_dir', required=True,
+                        help='Directory containing correct handwriting images')
+    parser.add_argument('--manifest', default='models/dataset_manifest.npz',
+                        help='Manifest file to create or update')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='Threads used for scanning and hashing')
+    
+    args = parser.parse_args()
+    
+    manifest = update_manifest(args.manifest, args.normal_dir, args.reversal_dir,
+                               args.correct_dir, args.workers)
+    unique = len(manifest.unique_indices())
+    print(f"Wrote {args.manifest}: {len(manifest)} images, {unique} unique")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+Script to export a trained dyslexia model for faster CPU serving.
+
+Writes a frozen TorchScript module, an ONNX graph and/or a .safetensors
+copy of the weights next to the .pth checkpoint and checks that their
+outputs match the eager model. The .safetensors weights load without
+unpickling and are picked up by the eager backend automatically.
+"""
+
+import argparse
+import os
+import sys
+import torch
+from app.backends import artifact_path, export_torchscript, export_onnx, check_parity
+from app.backends import load_torchscript_model, OnnxRuntimeModel
+from app.model import load_model, save_safetensors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the dyslexia detection model')
+    
+    parser.add_argument('--model_path', default='models/dyslexia_model.pth',
+                        help='Path to the trained .pth checkpoint')
+    parser.add_argument('--format', choices=['torchscript', 'onnx', 'safetensors', 'all'], default='all',
+                        help='Export format (default: all)')
+    parser.add_argument('--atol', type=float, default=1e-4,
+                        help='Maximum allowed absolute difference in logits')
+    parser.add_argument('--parity_batch', type=int, default=8,
+                        help='Number of random images used for the parity check')
+    
+    args = parser.parse_args()
+    
+    model = load_model(args.model_path, backend='eager')
+    model.to('cpu')
+    inputs = torch.randn(args.parity_batch, 3, 224, 224)
+    
+    failed = False
+    
+    if args.format in ('torchscript', 'all'):
+        path = export_torchscript(model, artifact_path(args.model_path, 'torchscript'))
+        max_diff, ok = check_parity(model, load_torchscript_model(path), inputs, args.atol)
+        print(f"TorchScript saved to {path} (max abs diff {max_diff:.2e}, {'OK' if ok else 'FAILED'})")
+        failed = failed or not ok
+    
+    if args.format in ('onnx', 'all'):
+        path = export_onnx(model, artifact_path(args.model_path, 'onnxruntime'))
+        max_diff, ok = check_parity(model, OnnxRuntimeModel(path), inputs, args.atol)
+        print(f"ONNX saved to {path} (max abs diff {max_diff:.2e}, {'OK' if ok else 'FAILED'})")
+        failed = failed or not ok
+    
+    if args.format in ('safetensors', 'all'):
+        path = save_safetensors(model, os.path.splitext(args.model_path)[0] + '.safetensors')
+        max_diff, ok = check_parity(model, load_model(path, backend='eager'), inputs, args.atol)
+        print(f"Safetensors weights saved to {path} (max abs diff {max_diff:.2e}, {'OK' if ok else 'FAILED'})")
+        failed = failed or not ok
+    
+    if failed:
+        print("Error: exported model does not match the eager model")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,61 +1,144 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-import requests
+import asyncio
+import httpx
 import uuid
 import os
-import subprocess
 import json
 
+from app.cache import ResultCache
+from app.engine import InferenceEngine
+from app.fetch import ImageFetcher, ImageTooLargeError
+from app.llama_evaluate import settings_fingerprint
+from app.llm_image import payload_stats
+from app.singleflight import SingleFlight
+
 app = FastAPI()
 
+MODEL_PATH = "models/dyslexia_model.pth"
+
+# Download limits for the Supabase image URLs
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", str(20 * 1024 * 1024)))
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "15"))
+# Keep a copy of every downloaded image in downloads/ (off by default)
+SAVE_DOWNLOADS = os.getenv("SAVE_DOWNLOADS", "false").lower() in ("1", "true", "yes")
+
+# Result cache, keyed by image content, served model version and language
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "cache/results.sqlite")
+RESULT_CACHE_MEMORY_ENTRIES = int(os.getenv("RESULT_CACHE_MEMORY_ENTRIES", "256"))
+RESULT_CACHE_DISK_ENTRIES = int(os.getenv("RESULT_CACHE_DISK_ENTRIES", "10000"))
+RESULT_CACHE_MAX_AGE = float(os.getenv("RESULT_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+
+# Seconds a single /predict caller waits before giving up (unset: no limit).
+# The shared computation keeps running for other callers and the cache.
+PREDICT_TIMEOUT = float(os.getenv("PREDICT_TIMEOUT")) if os.getenv("PREDICT_TIMEOUT") else None
+
+# Segment uploads in strips of this many rows to bound memory on large scans (unset: whole page)
+SEGMENT_STRIP_HEIGHT = int(os.getenv("SEGMENT_STRIP_HEIGHT", "0")) or None
+
+# Loaded once at startup and shared by every request
+engine = InferenceEngine(MODEL_PATH, strip_height=SEGMENT_STRIP_HEIGHT)
+fetcher = ImageFetcher(max_bytes=MAX_IMAGE_BYTES, timeout=FETCH_TIMEOUT)
+cache = ResultCache(RESULT_CACHE_PATH,
+                    max_memory_entries=RESULT_CACHE_MEMORY_ENTRIES,
+                    max_disk_entries=RESULT_CACHE_DISK_ENTRIES,
+                    max_age_seconds=RESULT_CACHE_MAX_AGE)
+# Coalesces concurrent requests for the same image URL and language
+flights = SingleFlight()
+
 # Updated Request model to receive the image URL and language
 class PredictRequest(BaseModel):
     image_url: str
     language: str  # Add this line
 
+@app.on_event("startup")
+async def startup_event():
+    await fetcher.start()
+    try:
+        await run_in_threadpool(engine.load)
+        # Results are cached under the model that was actually loaded and the
+        # LLM prompt and image settings that explain its scores
+        result_version = f"{engine.model_version}-llm-{settings_fingerprint()}"
+        await run_in_threadpool(cache.set_model_version, result_version)
+        print(f"Model loaded from {MODEL_PATH} ({engine.model_version})")
+    except Exception as e:
+        print(f"Error loading model: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    from app.llama_evaluate import close_async_client
+
+    await fetcher.close()
+    await close_async_client()
+    cache.close()
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: succeeds once the model is loaded and warmed up."""
+    if not engine.ready:
+        raise HTTPException(status_code=503, detail="Model is not loaded yet.")
+    return {"ready": True, "model_path": MODEL_PATH, "device": str(engine.device)}
+
+@app.get("/cache/stats")
+async def cache_stats():
+    stats = await run_in_threadpool(cache.stats)
+    stats["single_flight"] = flights.metrics()
+    stats["llm_payload"] = payload_stats()
+    return stats
+
+def save_download(image_bytes):
+    """Persist a downloaded image to the downloads/ folder."""
+    os.makedirs("downloads", exist_ok=True)
+    image_path = os.path.join("downloads", f"{uuid.uuid4().hex}.png")
+    with open(image_path, "wb") as f:
+        f.write(image_bytes)
+    return image_path
+
 @app.post("/predict")
 async def predict(request: PredictRequest):
+    if not engine.ready:
+        raise HTTPException(status_code=503, detail="Model is not loaded yet.")
+
+    # Duplicate submissions attach to the computation already in flight
+    try:
+        final_json = await flights.do((request.image_url, request.language), run_prediction,
+                                      request.image_url, request.language, timeout=PREDICT_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Prediction timed out.")
+
+    return json.dumps(final_json)
+
+async def run_prediction(image_url, language):
+    """Download an image and run the pipeline on it, using the result cache."""
+    # Step 1: Download the image from Supabase without blocking the event loop
     try:
-        # Step 1: Create directories if not present
-        os.makedirs("downloads", exist_ok=True)
-        os.makedirs("results", exist_ok=True)
-
-        # Step 2: Generate unique names
-        image_filename = f"{uuid.uuid4().hex}.png"
-        image_path = os.path.join("downloads", image_filename)
-
-        output_filename = f"{uuid.uuid4().hex}_result.json"
-        output_path = os.path.join("results", output_filename)
-
-        # Step 3: Download the image from Supabase
-        response = requests.get(request.image_url)
-        response.raise_for_status()
-
-        with open(image_path, "wb") as f:
-            f.write(response.content)
-
-        # Step 4: Run the model using subprocess
-        command = [
-            "python",
-            "predict.py",
-            "--image_path", image_path,
-            "--model_path", "models/dyslexia_model.pth",
-            "--output_file", output_path,
-            "--language", request.language  # Pass the language parameter
-        ]
-
-        try:
-            result = subprocess.run(command, check=True, capture_output=True, text=True)
-        except subprocess.CalledProcessError as e:
-            print("STDOUT:", e.stdout)
-            print("STDERR:", e.stderr)
-            raise HTTPException(status_code=500, detail=f"Model prediction failed. Details: {e.stderr}")
-        
-        return result.stdout[:-1]
-
-    except requests.exceptions.RequestException:
+        image_bytes = await fetcher.fetch(image_url)
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except (asyncio.TimeoutError, httpx.TimeoutException):
+        # httpx raises its own timeouts, a subclass of HTTPError, for connect and read
+        raise HTTPException(status_code=504, detail="Timed out downloading image from the provided URL.")
+    except httpx.HTTPError:
         raise HTTPException(status_code=400, detail="Failed to download image from the provided URL.")
-    except subprocess.CalledProcessError:
-        raise HTTPException(status_code=500, detail="Model prediction failed.")
+
+    if SAVE_DOWNLOADS:
+        await run_in_threadpool(save_download, image_bytes)
+
+    # Step 2: Return the stored result if this image was already analysed
+    cache_key = await run_in_threadpool(cache.make_key, image_bytes, language)
+    final_json = await run_in_threadpool(cache.get, cache_key)
+    if final_json is not None:
+        return final_json
+
+    # Step 3: Run the pipeline on the in-memory image. Letter scoring runs in a
+    # thread; the LLM call is awaited, so it does not tie up a thread
+    try:
+        final_json = await engine.predict_async(image_bytes, language)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Model prediction failed. Details: {e}")
+
+    await run_in_threadpool(cache.set, cache_key, final_json)
+    return final_json
@@ -4,32 +4,46 @@ Script to make predictions using the trained dyslexia detection model.
 """
 
 import argparse
-import torch
 import json
 import os
-import cv2
-import numpy as np
-from datetime import datetime
-from app.model import load_model, analyze_handwriting
-from app.preprocessing import preprocess_single_image
-from app.utils import get_device, interpret_result, preprocess_single_image,print_results,save_uploaded_file,segment_letters,calculate_final_results,response_structure,find_overall_risk
-from app.llama_evaluate import analyze_image_for_spelling
-from app.translation import translate
+from app.backends import BACKENDS, get_backend, artifact_path
+from app.engine import InferenceEngine
+from app.batch import list_images, run_batch
 
 def main():
     parser = argparse.ArgumentParser(description='Predict dyslexia indicators from handwriting images')
-    
-    # Required arguments
-    parser.add_argument('--image_path', required=True, 
+
+    # Input: a single image, or many images in batch mode
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--image_path',
                         help='Path to the handwriting image')
-    
+    source.add_argument('--input_dir',
+                        help='Batch mode: predict every image in this directory')
+    source.add_argument('--manifest',
+                        help='Batch mode: dataset manifest (.npz) or text file with one image path per line')
+
     # Optional arguments
     parser.add_argument('--model_path', default='models/dyslexia_model.pth',
                         help='Path to the trained model')
-    parser.add_argument('--output_file', 
+    parser.add_argument('--output_file',
                         help='Path to save the results as JSON (optional)')
     parser.add_argument('--letters_folder', default='segmented_letters',
                         help='Folder to store segmented letter images (default: segmented_letters)')
+    parser.add_argument('--save_letters', action='store_true',
+                        help='Write segmented letter images to --letters_folder for debugging')
+    parser.add_argument('--max_batch_size', type=int, default=32,
+                        help='Maximum number of letters scored in one forward pass (default: 32)')
+    parser.add_argument('--strip_height', type=int, default=None,
+                        help='Segment large or multi-page scans in strips of this many rows, '
+                             'scoring letters as they are found (bounded memory)')
+    parser.add_argument('--backend', choices=BACKENDS, default=None,
+                        help='Inference backend (default: MODEL_BACKEND env var or eager)')
+    parser.add_argument('--output_jsonl', default='results.jsonl',
+                        help='Batch mode: JSONL file results are appended to; finished images are skipped on rerun')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Batch mode: scoring processes, each loading the model once (default: CPU cores)')
+    parser.add_argument('--llm_concurrency', type=int, default=4,
+                        help='Batch mode: maximum concurrent LLM/translation calls (default: 4)')
     parser.add_argument(
     '--language',
     nargs='?',
@@ -38,108 +52,43 @@ def main():
     help='language to translate to (default: english)'
 )
     args = parser.parse_args()
-    
+
     # Check if model exists
-    if not os.path.exists(args.model_path):
-        print(f"Error: Model not found at {args.model_path}")
+    serving_path = artifact_path(args.model_path, get_backend(args.backend))
+    if not os.path.exists(serving_path):
+        print(f"Error: Model not found at {serving_path}")
         print("Please train the model first using train_model.py")
         return
-    
+
+    if args.input_dir or args.manifest:
+        image_paths = list_images(args.input_dir, args.manifest)
+        counts = run_batch(image_paths, args.output_jsonl, args.model_path, args.backend,
+                           workers=args.workers, llm_concurrency=args.llm_concurrency,
+                           language=args.language, max_batch_size=args.max_batch_size,
+                           strip_height=args.strip_height)
+        print(f"Done: {counts['ok']} ok, {counts['error']} errors, {counts['skipped']} skipped. "
+              f"Results in {args.output_jsonl}")
+        return
+
     # Check if image exists
     if not os.path.exists(args.image_path):
         print(f"Error: Image not found at {args.image_path}")
         return
-    
-    # Get device
-    device = get_device()
-    # print(f"Using device: {device}")
-    
+
     try:
-        # Load model
-        # print(f"Loading model from {args.model_path}...")
-        model = load_model(args.model_path)
-        model.to(device)
-        
-        # Segment image into individual letters
-        # print(f"Segmenting image {args.image_path} into letters...")
-        letter_images = segment_letters(args.image_path, args.letters_folder)
-        
-        if not letter_images:
-            print("Error: No letters found in the image")
-            return
-        
-        # print(f"Segmented letters saved to: {args.letters_folder}")
-        
-        all_results = []
-        
-        # Process each letter
-        for i, letter_path in enumerate(letter_images):
-            # print(f"\nProcessing letter {i+1} of {len(letter_images)}...")
-            
-            # Preprocess image
-            preprocessed_image = preprocess_single_image(letter_path)
-            
-            if preprocessed_image is None:
-                print(f"Error: Failed to process letter image {letter_path}")
-                continue
-            
-            # Move tensor to device
-            preprocessed_image = preprocessed_image.to(device)
-            
-            # Analyze handwriting
-             
-            prediction = analyze_handwriting(model, preprocessed_image, device)
-            
-            # Interpret results
-            results = interpret_result(letter_path,prediction)
-            all_results.append(results)
-            
-            # Print letter results
-            # print(f"Letter {i+1} Results:")
-            # print(results)
-            # print(f"Dyslexia Indicator Score: {results['dyslexia_score']:.2f}%")
-            # print(f"Risk Level: {results['risk_level']}")
-            # print(f"Predicted Class: {results['predicted_class']}")
-        
-        # Calculate and format all final results
-        
-        final_results = calculate_final_results(all_results, letter_images, args.letters_folder)
-        if 'letter_images' in locals():
-            for path in letter_images:
-                if os.path.exists(path):
-                    os.remove(path)
-        # Print final results
-        # print_results(final_results)
-        
-        # Save results if output file is specified
-        # if args.output_file:
-        #     with open(args.output_file, 'w') as f:
-        #         json.dump(final_results, f, indent=4)
-        #     print(f"\nResults saved to {args.output_file}")
-        mirror_score = final_results.get("adjusted_dyslexia_score")
-        llama_result = analyze_image_for_spelling(args.image_path,mirror_score)
-        # print(llama_result)
-        translate_text =None
-        if args.language != "english":
-            details_in_english = llama_result['detailed_text']
-            # print("--------------------------------\n",details_in_english,"\n___--")
-            translate_text = translate(details_in_english,args.language)
-      
-        # print(translate_text)
-        # print("calling resposne")
-        mirror_writing=final_results.get('adjusted_dyslexia_score')
-        orthographic_irregularity=llama_result.get('Orthographic_irregularity')
-        motor_variability=llama_result.get('Motor_variability')
-     
-        overall_score = find_overall_risk(mirror_writing,orthographic_irregularity,motor_variability)
-        final_json = response_structure(overall_score,final_results,llama_result,translate_text)
-        # print("final json",final_json)
+        # A one-shot run gains nothing from warming the model up
+        engine = InferenceEngine(args.model_path, args.letters_folder,
+                                 max_batch_size=args.max_batch_size,
+                                 save_letters=args.save_letters,
+                                 backend=args.backend,
+                                 strip_height=args.strip_height).load(warmup=False)
+        final_json = engine.predict(args.image_path, args.language)
         final_json_json=json.dumps(final_json)
         print(final_json_json)
         return final_json_json
-        
+
     except Exception as e:
         print(f"Error: {str(e)}")
-    
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Script to build an INT8 quantized serving artifact for the dyslexia model.
+
+Calibrates post-training static quantization on a sample of the training
+data, saves the result next to the .pth checkpoint and reports accuracy,
+latency and size against the fp32 model on the validation split.
+"""
+
+import argparse
+import os
+import time
+import torch
+from app.backends import artifact_path
+from app.model import load_model
+from app.preprocessing import prepare_dataloaders
+from app.quantization import (QUANTIZED_ENGINES, quantize_model, save_quantized_model,
+                              load_quantized_model, evaluate_accuracy)
+
+
+def measure_latency(model, repeats=20):
+    """Median latency in milliseconds of scoring a single image."""
+    example = torch.zeros(1, 3, 224, 224)
+    timings = []
+    with torch.no_grad():
+        model(example)
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model(example)
+            timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Quantize the dyslexia detection model to INT8')
+    
+    # Required arguments
+    parser.add_argument('--normal_dir', required=True,
+                        help='Directory containing normal handwriting images')
+    parser.add_argument('--reversal_dir', required=True,
+                        help='Directory containing reversal handwriting images (dyslexia indicators)')
+    parser.add_argument('--correct_dir', required=True,
+                        help='Directory containing correct handwriting images')
+    
+    # Optional arguments
+    parser.add_argument('--model_path', default='models/dyslexia_model.pth',
+                        help='Path to the trained fp32 checkpoint')
+    parser.add_argument('--engine', choices=QUANTIZED_ENGINES, default='fbgemm',
+                        help='Quantized engine: fbgemm (x86) or qnnpack (ARM)')
+    parser.add_argument('--calibration_batches', type=int, default=10,
+                        help='Number of training batches used for calibration')
+    parser.add_argument('--batch_size', type=int, default=32,
+                        help='Batch size for calibration and evaluation')
+    
+    args = parser.parse_args()
+    
+    train_loader, val_loader = prepare_dataloaders(
+        args.normal_dir, args.reversal_dir, args.correct_dir, args.batch_size
+    )
+    
+    fp32_model = load_model(args.model_path, backend='eager').to('cpu')
+    int8_model = quantize_model(fp32_model, train_loader, args.calibration_batches, args.engine)
+    
+    output_path = artifact_path(args.model_path, 'quantized')
+    save_quantized_model(int8_model, output_path, args.engine)
+    int8_model = load_quantized_model(output_path)
+    
+    fp32_acc = evaluate_accuracy(fp32_model, val_loader)
+    int8_acc = evaluate_accuracy(int8_model, val_loader)
+    fp32_latency = measure_latency(fp32_model)
+    int8_latency = measure_latency(int8_model)
+    fp32_size = os.path.getsize(args.model_path) / 1e6
+    int8_size = os.path.getsize(output_path) / 1e6
+    
+    print(f"\n{'':>14} | {'fp32':>8} | {'int8':>8}")
+    print('-' * 38)
+    print(f"{'val accuracy':>14} | {fp32_acc:>8.4f} | {int8_acc:>8.4f}")
+    print(f"{'latency (ms)':>14} | {fp32_latency:>8.2f} | {int8_latency:>8.2f}")
+    print(f"{'size (MB)':>14} | {fp32_size:>8.1f} | {int8_size:>8.1f}")
+    print(f"\nAccuracy delta: {int8_acc - fp32_acc:+.4f}")
+    print(f"Speedup: {fp32_latency / int8_latency:.2f}x")
+    print("Serve it with MODEL_BACKEND=quantized")
+
+
+if __name__ == "__main__":
+    main()
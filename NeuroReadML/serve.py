@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+"""
+Script to serve the upload API (app/main.py) with pre-forked workers that
+share one copy of the model weights.
+"""
+
+import argparse
+from app.prefork import serve
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the dyslexia detection API with shared model weights')
+    
+    parser.add_argument('--host', default='0.0.0.0',
+                        help='Address to listen on (default: 0.0.0.0)')
+    parser.add_argument('--port', type=int, default=8000,
+                        help='Port to listen on (default: 8000)')
+    parser.add_argument('--workers', type=int, default=2,
+                        help='Number of forked API workers (default: 2)')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='Torch threads per worker (default: CPU cores divided by workers)')
+    parser.add_argument('--log_level', default='info',
+                        help='uvicorn log level (default: info)')
+    
+    args = parser.parse_args()
+    
+    serve(args.host, args.port, args.workers, args.threads, args.log_level)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+# Tests import the app package the same way the scripts in NeuroReadML do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def letter_image(text, seed=0):
+    """A small grayscale image of handwriting-like black text on white."""
+    img = np.full((64, 64), 255, dtype=np.uint8)
+    # Every seed below 192 puts the text at a different position
+    origin = (4 + seed % 12, 40 + seed // 12 % 16)
+    cv2.putText(img, text, origin, cv2.FONT_HERSHEY_SIMPLEX, 1.2, 0, 2 + seed % 3)
+    return img
+
+
+@pytest.fixture
+def image_dirs(tmp_path):
+    """normal/reversal/correct directories with a few distinct images each."""
+    dirs = []
+    for label, text in enumerate(('b', 'd', 'p')):
+        directory = tmp_path / ('normal', 'reversal', 'correct')[label]
+        directory.mkdir()
+        for i in range(8):
+            cv2.imwrite(str(directory / f"{i}.png"), letter_image(text, seed=10 * label + i))
+        dirs.append(str(directory))
+    return dirs
+
+
+@pytest.fixture
+def untrained_model(monkeypatch):
+    """Build models without downloading ImageNet weights."""
+    import app.model
+    import app.train
+
+    def create(num_classes=3, pretrained=True):
+        return app.model.create_dyslexia_model(num_classes=num_classes, pretrained=False)
+
+    monkeypatch.setattr(app.train, 'create_dyslexia_model', create)
+    monkeypatch.setattr(app.train, 'plot_training_history', lambda history: None)
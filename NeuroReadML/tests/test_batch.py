@@ -0,0 +1,112 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app.batch
+import app.engine
+from app.batch import _ends_mid_line, _run, completed_images, list_images
+from app.manifest import build_manifest
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """Score and explain images without a model or an LLM; 'bad' images fail."""
+    def score(image_path):
+        if 'bad' in image_path:
+            raise RuntimeError('No letters found in the image')
+        return {'letters': 3}
+
+    async def explain(image_path, final_results, language):
+        return {'image': image_path, 'language': language, **final_results}
+
+    monkeypatch.setattr(app.batch, '_score_image', score)
+    monkeypatch.setattr(app.engine, 'explain_results_async', explain)
+
+
+def run(image_paths, output_path, llm_concurrency=2, max_in_flight=4):
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        return asyncio.run(_run(image_paths, pool, str(output_path), 'english', llm_concurrency,
+                                max_in_flight))
+
+
+def test_list_images_from_a_directory_or_a_list(tmp_path, image_dirs):
+    normal = image_dirs[0]
+    (tmp_path / 'normal' / 'notes.txt').write_text('not an image')
+    paths = list_images(input_dir=normal)
+    assert paths == sorted(paths) and len(paths) == 8
+
+    listing = tmp_path / 'images.txt'
+    listing.write_text('\n'.join(paths[:3]) + '\n\n')
+    assert list_images(manifest=str(listing)) == paths[:3]
+
+    manifest_path = str(tmp_path / 'manifest.npz')
+    build_manifest(*image_dirs).save(manifest_path)
+    assert len(list_images(manifest=manifest_path)) == 24
+
+
+def test_completed_images_skips_errors_and_truncated_lines(tmp_path):
+    output = tmp_path / 'results.jsonl'
+    assert completed_images(str(output)) == set()
+    output.write_text(json.dumps({'image_path': 'a.png', 'status': 'ok'}) + '\n'
+                      + json.dumps({'image_path': 'b.png', 'status': 'error'}) + '\n'
+                      + '{"image_path": "c.png", "sta')
+    assert completed_images(str(output)) == {'a.png'}
+
+
+def test_ends_mid_line(tmp_path):
+    output = tmp_path / 'results.jsonl'
+    output.write_text('')
+    assert not _ends_mid_line(str(output))
+    output.write_text('{}\n')
+    assert not _ends_mid_line(str(output))
+    output.write_text('{}\n{"image')
+    assert _ends_mid_line(str(output))
+
+
+def test_run_appends_one_line_per_image_after_a_truncated_line(tmp_path, pipeline):
+    output = tmp_path / 'results.jsonl'
+    output.write_text(json.dumps({'image_path': 'a.png', 'status': 'ok'}) + '\n{"image_pa')
+
+    counts = run(['b.png', 'bad.png', 'c.png'], output)
+
+    assert counts == {'ok': 2, 'error': 1}
+    lines = output.read_text().splitlines()
+    assert lines[1] == '{"image_pa'
+    records = [json.loads(line) for line in lines[2:]]
+    assert sorted(record['image_path'] for record in records) == ['b.png', 'bad.png', 'c.png']
+    failed = next(record for record in records if record['image_path'] == 'bad.png')
+    assert failed == {'image_path': 'bad.png', 'status': 'error',
+                      'error': 'No letters found in the image'}
+    # A rerun only redoes the failed image
+    assert completed_images(str(output)) == {'a.png', 'b.png', 'c.png'}
+
+
+def test_at_most_max_in_flight_images_are_processed_at_once(tmp_path, monkeypatch):
+    lock = threading.Lock()
+    in_flight = []
+    peak = []
+
+    def score(image_path):
+        with lock:
+            in_flight.append(image_path)
+            peak.append(len(in_flight))
+        return {'letters': 3}
+
+    async def explain(image_path, final_results, language):
+        await asyncio.sleep(0.01)
+        with lock:
+            in_flight.remove(image_path)
+        return final_results
+
+    monkeypatch.setattr(app.batch, '_score_image', score)
+    monkeypatch.setattr(app.engine, 'explain_results_async', explain)
+    paths = [f"{index}.png" for index in range(12)]
+
+    counts = run(paths, tmp_path / 'results.jsonl', llm_concurrency=4, max_in_flight=2)
+
+    assert counts == {'ok': 12, 'error': 0}
+    assert len(peak) == 12
+    assert max(peak) == 2
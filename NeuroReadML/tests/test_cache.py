@@ -0,0 +1,96 @@
+import torch
+
+from app.backends import artifact_path
+from app.cache import ResultCache, file_sha256
+from app.engine import InferenceEngine
+from app.jobs import export_candidate
+from app.model import create_dyslexia_model, save_model
+
+
+def open_cache(tmp_path, version='v1', **kwargs):
+    cache = ResultCache(str(tmp_path / 'results.db'), **kwargs)
+    cache.set_model_version(version)
+    return cache
+
+
+def test_key_depends_on_image_version_and_language(tmp_path):
+    cache = open_cache(tmp_path)
+    key = cache.make_key(b'image', 'english')
+    assert key != cache.make_key(b'other image', 'english')
+    assert key != cache.make_key(b'image', 'spanish')
+
+    cache.set_model_version('v2')
+    assert key != cache.make_key(b'image', 'english')
+    cache.close()
+
+
+def test_hits_come_from_memory_then_disk(tmp_path):
+    cache = open_cache(tmp_path)
+    key = cache.make_key(b'image', 'english')
+    assert cache.get(key) is None
+    cache.set(key, {'score': 1})
+    assert cache.get(key) == {'score': 1}
+    cache.close()
+
+    # A new process with the same model version still finds the result on disk
+    cache = open_cache(tmp_path)
+    assert cache.get(key) == {'score': 1}
+    stats = cache.stats()
+    assert (stats['memory_hits'], stats['disk_hits']) == (0, 1)
+    cache.close()
+
+
+def test_new_model_version_purges_old_results(tmp_path):
+    cache = open_cache(tmp_path, 'v1')
+    old_key = cache.make_key(b'image', 'english')
+    cache.set(old_key, {'score': 1})
+
+    cache.set_model_version('v2')
+    assert cache.stats()['disk_entries'] == 0
+    assert cache.get(old_key) is None
+    new_key = cache.make_key(b'image', 'english')
+    cache.set(new_key, {'score': 2})
+    cache.close()
+
+    # Setting the same version again keeps its entries
+    cache = open_cache(tmp_path, 'v2')
+    assert cache.get(new_key) == {'score': 2}
+    cache.close()
+
+
+def test_disk_entries_are_bounded_and_expire(tmp_path):
+    cache = open_cache(tmp_path, max_memory_entries=1, max_disk_entries=2)
+    keys = [cache.make_key(bytes([i]), 'english') for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.set(key, i)
+    assert cache.stats()['disk_entries'] == 2
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[2]) == 2
+
+    cache.max_age_seconds = -1
+    assert cache.get(keys[2]) is None
+    cache.close()
+
+
+def test_engine_version_follows_the_served_file(tmp_path):
+    model_path = str(tmp_path / 'model.pth')
+    save_model(create_dyslexia_model(pretrained=False), model_path)
+
+    engine = InferenceEngine(model_path, backend='eager', device=torch.device('cpu')).load(warmup=False)
+    assert engine.model_version == f"eager-{file_sha256(model_path)}"
+
+    # Retrained weights at the same path are a different version
+    save_model(create_dyslexia_model(pretrained=False), model_path)
+    reloaded = InferenceEngine(model_path, backend='eager', device=torch.device('cpu')).load(warmup=False)
+    assert reloaded.model_version != engine.model_version
+
+
+def test_engine_version_uses_the_backend_artifact(tmp_path):
+    model_path = str(tmp_path / 'model.pth')
+    save_model(create_dyslexia_model(pretrained=False), model_path)
+    export_candidate(model_path, backend='torchscript')
+
+    engine = InferenceEngine(model_path, backend='torchscript',
+                             device=torch.device('cpu')).load(warmup=False)
+    exported = artifact_path(model_path, 'torchscript')
+    assert engine.model_version == f"torchscript-{file_sha256(exported)}"
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+import torch
+
+from app.checkpoint import CheckpointWriter, atomic_save, checkpoint_path_for
+from app.train import train_model
+
+
+def train(image_dirs, tmp_path, model_save_path, num_epochs, resume=False, checkpoint_path=None):
+    torch.manual_seed(0)
+    return train_model(*image_dirs, model_save_path=str(model_save_path), batch_size=8,
+                       num_epochs=num_epochs, device=torch.device('cpu'),
+                       metrics_path=str(tmp_path / 'metrics.json'), resume=resume,
+                       checkpoint_path=checkpoint_path)
+
+
+def test_atomic_save_replaces_the_file(tmp_path):
+    path = str(tmp_path / 'weights.pth')
+    atomic_save({'w': torch.zeros(3)}, path)
+    inode = os.stat(path).st_ino
+    # Readers that memory-mapped the old file keep their pages: the path
+    # points at a new file instead of being rewritten in place
+    old = torch.load(path, mmap=True)
+    atomic_save({'w': torch.ones(3)}, path)
+
+    assert os.stat(path).st_ino != inode
+    assert torch.equal(old['w'], torch.zeros(3))
+    assert torch.equal(torch.load(path)['w'], torch.ones(3))
+    assert os.listdir(tmp_path) == ['weights.pth']
+
+
+def test_writer_saves_a_snapshot(tmp_path):
+    path = str(tmp_path / 'state.pt')
+    weights = torch.zeros(1000)
+    writer = CheckpointWriter()
+    writer.save({'weights': weights, 'epoch': 1}, path)
+    # Training continues while the checkpoint is written
+    weights += 1
+    writer.close()
+
+    state = torch.load(path)
+    assert state['epoch'] == 1
+    assert torch.equal(state['weights'], torch.zeros(1000))
+
+
+def test_writer_reports_failed_writes(tmp_path):
+    (tmp_path / 'not_a_directory').write_text('')
+    writer = CheckpointWriter()
+    writer.save({'epoch': 1}, str(tmp_path / 'not_a_directory' / 'state.pt'))
+    with pytest.raises(OSError):
+        writer.close()
+
+
+def test_resumed_training_matches_an_uninterrupted_run(tmp_path, image_dirs, untrained_model):
+    straight = train(image_dirs, tmp_path, tmp_path / 'straight' / 'model.pth', num_epochs=2)
+
+    model_path = tmp_path / 'resumed' / 'model.pth'
+    train(image_dirs, tmp_path, model_path, num_epochs=1)
+    checkpoint = torch.load(checkpoint_path_for(str(model_path)), weights_only=False)
+    assert checkpoint['epoch'] == 1
+    resumed = train(image_dirs, tmp_path, model_path, num_epochs=2, resume=True)
+
+    assert len(resumed['train_loss']) == 2
+    for name in ('train_loss', 'val_loss', 'train_acc', 'val_acc'):
+        assert resumed[name] == pytest.approx(straight[name], rel=1e-4)
+    assert torch.load(checkpoint_path_for(str(model_path)), weights_only=False)['epoch'] == 2
+
+
+def test_resume_without_a_checkpoint_starts_from_scratch(tmp_path, image_dirs, untrained_model):
+    model_path = tmp_path / 'model.pth'
+    history = train(image_dirs, tmp_path, model_path, num_epochs=1, resume=True)
+    assert len(history['train_loss']) == 1
+    assert model_path.exists()
@@ -0,0 +1,42 @@
+import os
+
+import numpy as np
+
+import app.dataset_cache
+from app.dataset_cache import CachedHandwritingDataset, ensure_image_cache
+from app.preprocessing import HandwritingDataset
+
+
+def build(image_dirs, cache_dir):
+    source = HandwritingDataset(*image_dirs)
+    return ensure_image_cache(source.image_paths, source.labels, str(cache_dir), num_workers=2)
+
+
+def test_build_leaves_only_the_cache_files(tmp_path, image_dirs):
+    index = build(image_dirs, tmp_path / 'cache')
+    assert index['count'] == 24
+    assert sorted(os.listdir(tmp_path / 'cache')) == ['images.npy', 'index.json', 'labels.npy']
+
+    dataset = CachedHandwritingDataset(str(tmp_path / 'cache'))
+    assert len(dataset) == 24
+    assert dataset[0][0].shape == (3, 224, 224)
+    assert np.load(tmp_path / 'cache' / 'labels.npy').tolist() == [0] * 8 + [1] * 8 + [2] * 8
+
+
+def test_up_to_date_cache_is_reused(tmp_path, image_dirs, monkeypatch):
+    build(image_dirs, tmp_path / 'cache')
+    builds = []
+    monkeypatch.setattr(app.dataset_cache, 'build_image_cache',
+                        lambda *args: builds.append(args))
+    build(image_dirs, tmp_path / 'cache')
+    assert builds == []
+
+
+def test_unreadable_index_is_rebuilt(tmp_path, image_dirs):
+    index = build(image_dirs, tmp_path / 'cache')
+    index_path = tmp_path / 'cache' / 'index.json'
+    # As left by a writer that was interrupted halfway
+    index_path.write_text(index_path.read_text()[:40])
+
+    assert build(image_dirs, tmp_path / 'cache') == index
+    assert CachedHandwritingDataset(str(tmp_path / 'cache')).image_paths == index['paths']
@@ -0,0 +1,46 @@
+import json
+import os
+import socket
+
+import pytest
+import torch
+
+from app.model import load_model
+from app.train import train_model
+
+
+def imagenet_weights_cached():
+    from torchvision.models import ResNet18_Weights
+
+    name = os.path.basename(ResNet18_Weights.IMAGENET1K_V1.url)
+    return os.path.exists(os.path.join(torch.hub.get_dir(), 'checkpoints', name))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# Spawned workers do not see the untrained_model fixture and build the pretrained model
+@pytest.mark.skipif(not imagenet_weights_cached(), reason='ImageNet weights are not downloaded')
+def test_workers_share_one_manifest_and_image_cache(tmp_path, image_dirs, capfd, monkeypatch):
+    # Rank 0 saves its training plot under models/ in the working directory
+    monkeypatch.chdir(tmp_path)
+    cache_dir = tmp_path / 'cache'
+    manifest_path = tmp_path / 'manifest.npz'
+    model_path = tmp_path / 'model.pth'
+
+    train_model(*image_dirs, model_save_path=str(model_path), batch_size=4, num_epochs=1,
+                nprocs=2, master_port=free_port(), cache_dir=str(cache_dir),
+                manifest_path=str(manifest_path), metrics_path=str(tmp_path / 'metrics.json'))
+
+    output = capfd.readouterr().out
+    # Built once by the launching process, only read by the two workers
+    assert output.count('Manifest: 24 images') == 1
+    assert output.count('Cached 24 images') == 1
+    assert sorted(os.listdir(cache_dir)) == ['images.npy', 'index.json', 'labels.npy']
+    assert json.loads((cache_dir / 'index.json').read_text())['count'] == 24
+    assert manifest_path.exists()
+    assert json.loads((tmp_path / 'metrics.json').read_text())['config']['world_size'] == 2
+    load_model(str(model_path), backend='eager')
@@ -0,0 +1,48 @@
+import json
+
+import pytest
+import torch
+
+from app.model import create_dyslexia_model, load_model, save_model
+from app.train import train_model
+
+
+@pytest.fixture
+def base_model(tmp_path):
+    """A checkpoint for the head to reuse, so no ImageNet weights are downloaded."""
+    path = str(tmp_path / 'base.pth')
+    save_model(create_dyslexia_model(pretrained=False), path)
+    return path
+
+
+def train_head_only(image_dirs, tmp_path, base_model, **kwargs):
+    return train_model(*image_dirs, model_save_path=str(tmp_path / 'model.pth'), batch_size=8,
+                       num_epochs=2, device=torch.device('cpu'), head_only=True,
+                       base_model_path=base_model,
+                       embedding_cache_dir=str(tmp_path / 'embeddings'), **kwargs)
+
+
+@pytest.mark.parametrize('option', [{'resume': True}, {'checkpoint_path': 'state.ckpt.pt'},
+                                    {'nprocs': 2}, {'cache_dir': 'cache'}, {'bf16': True}])
+def test_unsupported_options_are_rejected(tmp_path, image_dirs, base_model, option):
+    with pytest.raises(ValueError, match=f"head_only training does not support {next(iter(option))}"):
+        train_head_only(image_dirs, tmp_path, base_model, **option)
+    assert not (tmp_path / 'model.pth').exists()
+
+
+def test_manifest_and_metrics_are_used(tmp_path, image_dirs, base_model):
+    manifest_path = tmp_path / 'manifest.npz'
+    metrics_path = tmp_path / 'metrics.json'
+    epochs = []
+
+    history = train_head_only(image_dirs, tmp_path, base_model, manifest_path=str(manifest_path),
+                              metrics_path=str(metrics_path), progress=epochs.append)
+
+    assert manifest_path.exists()
+    assert len(history['train_loss']) == 2
+    assert [epoch['epoch'] for epoch in epochs] == [1, 2]
+    metrics = json.loads(metrics_path.read_text())
+    assert metrics['config']['head_only'] is True
+    assert [epoch['epoch'] for epoch in metrics['epochs']] == [1, 2]
+    assert metrics['epochs'][-1]['val_acc'] == history['val_acc'][-1]
+    load_model(str(tmp_path / 'model.pth'), backend='eager')
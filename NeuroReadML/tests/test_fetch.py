@@ -0,0 +1,82 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.fetch import ImageFetcher, ImageTooLargeError
+
+
+class Body(httpx.AsyncByteStream):
+    """A response body sent in chunks; counts how many of them were read."""
+
+    def __init__(self, chunks, delay=0):
+        self.chunks = chunks
+        self.delay = delay
+        self.read = 0
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            await asyncio.sleep(self.delay)
+            self.read += 1
+            yield chunk
+
+
+def fetch(handler, url='http://images.test/page.png', **kwargs):
+    """Fetch url with ImageFetcher against a mock transport."""
+    async def main():
+        fetcher = ImageFetcher(**kwargs)
+        # The client start() would open, minus the network
+        fetcher._client = httpx.AsyncClient(transport=httpx.MockTransport(handler),
+                                            timeout=httpx.Timeout(fetcher.timeout))
+        try:
+            return await fetcher.fetch(url)
+        finally:
+            await fetcher.close()
+    return asyncio.run(main())
+
+
+def test_body_is_returned():
+    body = Body([b'abc', b'def'])
+    assert fetch(lambda request: httpx.Response(200, stream=body)) == b'abcdef'
+
+
+def test_error_status_raises():
+    with pytest.raises(httpx.HTTPStatusError):
+        fetch(lambda request: httpx.Response(404))
+
+
+def test_declared_size_over_the_limit_is_refused_without_reading():
+    body = Body([b'x' * 10] * 10)
+    with pytest.raises(ImageTooLargeError, match='100 bytes'):
+        fetch(lambda request: httpx.Response(200, headers={'content-length': '100'}, stream=body),
+              max_bytes=50)
+    assert body.read == 0
+
+
+def test_body_over_the_limit_stops_the_download():
+    # No Content-Length, e.g. a chunked response
+    body = Body([b'x' * 10] * 10)
+    with pytest.raises(ImageTooLargeError):
+        fetch(lambda request: httpx.Response(200, stream=body), max_bytes=25)
+    assert body.read == 3
+
+
+def test_connect_and_read_timeouts_raise_httpx_timeouts():
+    def refuse(request):
+        raise httpx.ConnectTimeout('connect timed out', request=request)
+
+    with pytest.raises(httpx.TimeoutException):
+        fetch(refuse)
+
+
+def test_slow_download_hits_the_overall_deadline():
+    # Every chunk arrives in time, but the whole body does not
+    body = Body([b'x'] * 20, delay=0.02)
+    with pytest.raises(asyncio.TimeoutError):
+        fetch(lambda request: httpx.Response(200, stream=body), timeout=0.1)
+    assert body.read < 20
+
+
+def test_fetch_needs_a_started_fetcher():
+    with pytest.raises(RuntimeError, match='not started'):
+        asyncio.run(ImageFetcher().fetch('http://images.test/page.png'))
@@ -0,0 +1,229 @@
+import asyncio
+import os
+import shutil
+import types
+
+import pytest
+import torch
+from fastapi.testclient import TestClient
+
+import app.jobs
+import app.main
+from app.backends import artifact_path
+from app.checkpoint import checkpoint_path_for
+from app.jobs import (acquire_training_lock, candidate_path, export_candidate, file_signature,
+                      json_safe, parse_cpu_list, promote_checkpoint, read_job, update_job)
+from app.model import create_dyslexia_model, load_model, save_model
+from app.train import train_model
+
+
+@pytest.fixture
+def jobs_dir(tmp_path, monkeypatch):
+    directory = tmp_path / 'jobs'
+    monkeypatch.setattr(app.jobs, 'JOBS_DIR', str(directory))
+    return directory
+
+
+@pytest.fixture
+def served(tmp_path, monkeypatch):
+    """Point the upload API at a model file in tmp_path and restore its globals afterwards."""
+    model_path = str(tmp_path / 'models' / 'dyslexia_model.pth')
+    monkeypatch.setattr(app.main, 'MODEL_PATH', model_path)
+    monkeypatch.setattr(app.main, 'DEVICE', torch.device('cpu'))
+    monkeypatch.setattr(app.main, 'model', None)
+    monkeypatch.setattr(app.main, 'model_version', 0)
+    monkeypatch.setattr(app.main, 'model_signature', None)
+    monkeypatch.setattr(app.main, 'scheduler', None)
+    return model_path
+
+
+def train(image_dirs, tmp_path, model_save_path, num_epochs, checkpoint_path, resume=False):
+    return train_model(*image_dirs, model_save_path=str(model_save_path), batch_size=8,
+                       num_epochs=num_epochs, device=torch.device('cpu'),
+                       metrics_path=str(tmp_path / 'metrics.json'), resume=resume,
+                       checkpoint_path=str(checkpoint_path))
+
+
+def trained_job(job_id, state_dict=None, exitcode=0):
+    """Write a candidate checkpoint as a finished training process would."""
+    update_job(job_id, status='trained' if exitcode == 0 else 'running')
+    save_model(create_dyslexia_model(pretrained=False), candidate_path(job_id))
+    if state_dict is not None:
+        torch.save(state_dict, candidate_path(job_id))
+    return types.SimpleNamespace(exitcode=exitcode, join=lambda: None, is_alive=lambda: False)
+
+
+def test_resume_into_a_new_candidate_starts_from_the_best_model(tmp_path, image_dirs,
+                                                                 untrained_model):
+    checkpoint = tmp_path / 'served.ckpt.pt'
+    first = tmp_path / 'jobs' / 'first.pth'
+    train(image_dirs, tmp_path, first, num_epochs=1, checkpoint_path=checkpoint)
+
+    # Resuming at num_epochs trains nothing, but the job still needs a model
+    second = tmp_path / 'jobs' / 'second.pth'
+    train(image_dirs, tmp_path, second, num_epochs=1, checkpoint_path=checkpoint, resume=True)
+    assert second.read_bytes() == first.read_bytes()
+    assert torch.load(checkpoint, weights_only=False)['best_model_path'] == str(first)
+
+
+def test_resume_after_the_best_model_was_promoted(tmp_path, image_dirs, untrained_model):
+    checkpoint = tmp_path / 'served.ckpt.pt'
+    first = tmp_path / 'jobs' / 'first.pth'
+    train(image_dirs, tmp_path, first, num_epochs=1, checkpoint_path=checkpoint)
+    # Promotion moves the candidate away, and no later epoch beats best_acc
+    shutil.move(str(first), str(tmp_path / 'served.pth'))
+    state = torch.load(checkpoint, weights_only=False)
+    state['best_acc'] = 2.0
+    torch.save(state, checkpoint)
+
+    second = tmp_path / 'jobs' / 'second.pth'
+    history = train(image_dirs, tmp_path, second, num_epochs=2, checkpoint_path=checkpoint,
+                    resume=True)
+    assert len(history['train_loss']) == 2
+    assert second.exists()
+    load_model(str(second), backend='eager')
+
+
+def test_training_lock_is_exclusive(jobs_dir):
+    lock = acquire_training_lock()
+    assert lock is not None
+    assert acquire_training_lock() is None
+    lock.close()
+
+    again = acquire_training_lock()
+    assert again is not None
+    again.close()
+
+
+def test_train_returns_409_while_another_worker_trains(jobs_dir, image_dirs, served):
+    lock = acquire_training_lock()
+    try:
+        # Without the lifespan, so no model is loaded and no scheduler started
+        client = TestClient(app.main.app)
+        response = client.post('/train', data={'normal_dir': image_dirs[0],
+                                               'reversal_dir': image_dirs[1],
+                                               'correct_dir': image_dirs[2]})
+    finally:
+        lock.close()
+    assert response.status_code == 409
+    assert os.listdir(jobs_dir) == ['training.lock']
+
+
+def test_train_rejects_head_only_with_full_training_options(jobs_dir, image_dirs, served):
+    client = TestClient(app.main.app)
+    response = client.post('/train', data={'normal_dir': image_dirs[0],
+                                           'reversal_dir': image_dirs[1],
+                                           'correct_dir': image_dirs[2],
+                                           'head_only': 'true', 'resume': 'true'})
+    assert response.status_code == 400
+    assert not os.path.exists(jobs_dir)
+
+
+def test_file_signature_changes_when_the_file_is_replaced(tmp_path):
+    path = str(tmp_path / 'model.pth')
+    assert file_signature(path) is None
+    save_model(create_dyslexia_model(pretrained=False), path)
+    before = file_signature(path)
+    save_model(create_dyslexia_model(pretrained=False), path)
+    assert file_signature(path) != before
+
+
+def test_export_and_promote_keep_the_backend(tmp_path, jobs_dir):
+    model = create_dyslexia_model(pretrained=False).eval()
+    candidate = candidate_path('job')
+    save_model(model, candidate)
+    exported = export_candidate(candidate, backend='torchscript')
+    assert exported == artifact_path(candidate, 'torchscript')
+
+    model_path = str(tmp_path / 'models' / 'dyslexia_model.pth')
+    promote_checkpoint(candidate, model_path, backend='torchscript')
+    assert not os.path.exists(candidate) and not os.path.exists(exported)
+
+    inputs = torch.randn(2, 3, 224, 224)
+    served = load_model(model_path, backend='torchscript')
+    with torch.no_grad():
+        torch.testing.assert_close(served(inputs), model(inputs), atol=1e-4, rtol=1e-4)
+
+
+def test_export_candidate_by_backend(tmp_path):
+    path = str(tmp_path / 'model.pth')
+    save_model(create_dyslexia_model(pretrained=False), path)
+    assert export_candidate(path, backend='eager') is None
+    with pytest.raises(ValueError, match='quantize'):
+        export_candidate(path, backend='quantized')
+
+
+def test_promoted_job_is_swapped_in_with_the_configured_backend(jobs_dir, served, monkeypatch):
+    monkeypatch.setenv('MODEL_BACKEND', 'torchscript')
+    process = trained_job('job')
+
+    asyncio.run(app.main.promote_training_job('job', process))
+
+    job = read_job('job')
+    assert job['status'] == 'completed', job.get('error')
+    assert job['model_version'] == app.main.model_version == 1
+    assert isinstance(app.main.model, torch.jit.ScriptModule)
+    assert app.main.model_signature == file_signature(served)
+    assert os.path.exists(artifact_path(served, 'torchscript'))
+
+
+def test_invalid_candidate_is_not_swapped_in(jobs_dir, served):
+    state = create_dyslexia_model(num_classes=2, pretrained=False).state_dict()
+    process = trained_job('job', state_dict=state)
+
+    asyncio.run(app.main.promote_training_job('job', process))
+
+    assert read_job('job')['status'] == 'failed'
+    assert app.main.model is None and app.main.model_version == 0
+    assert not os.path.exists(served)
+
+
+def test_other_workers_reload_a_promoted_checkpoint(jobs_dir, served, monkeypatch):
+    save_model(create_dyslexia_model(pretrained=False), served)
+    app.main.load_serving_model()
+    monkeypatch.setattr(app.main, 'MODEL_RELOAD_INTERVAL', 0.01)
+    old_model = app.main.model
+
+    async def scenario():
+        watcher = asyncio.ensure_future(app.main.watch_model_file())
+        try:
+            # Another worker promotes a new checkpoint
+            trained_job('job')
+            promote_checkpoint(candidate_path('job'), served, backend='eager')
+            for _ in range(500):
+                await asyncio.sleep(0.01)
+                if app.main.model_version == 2:
+                    break
+        finally:
+            watcher.cancel()
+
+    asyncio.run(scenario())
+    assert app.main.model_version == 2
+    assert app.main.model is not old_model
+    assert app.main.model_signature == file_signature(served)
+
+
+def test_crashed_training_process_fails_the_job(jobs_dir, served):
+    process = trained_job('job', exitcode=-9)
+
+    asyncio.run(app.main.promote_training_job('job', process))
+
+    job = read_job('job')
+    assert job['status'] == 'failed'
+    assert 'exited with code -9' in job['error']
+    assert app.main.model is None
+
+
+def test_training_status(jobs_dir):
+    client = TestClient(app.main.app)
+    assert client.get('/train/unknown').status_code == 404
+
+    update_job('job', status='running', progress={'epoch': 1, 'val_loss': float('inf')})
+    status = client.get('/train/job').json()
+    assert status['status'] == 'running'
+    assert status['progress'] == {'epoch': 1, 'val_loss': None}
+
+
+def test_json_safe_and_cpu_lists():
+    assert json_safe({'a': [1.0, float('nan')], 'b': float('-inf')}) == {'a': [1.0, None], 'b': None}
+    assert parse_cpu_list('0-2,5') == {0, 1, 2, 5}
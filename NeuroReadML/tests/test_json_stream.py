@@ -0,0 +1,132 @@
+import asyncio
+import json
+import types
+
+import pytest
+
+from app.json_stream import IncrementalJSONParser, first_json_object
+from app.llama_evaluate import extract_json_from_text, read_spelling_stream, read_spelling_stream_async
+
+ANALYSIS = {
+    'Motor_variability': 30,
+    'Orthographic_irregularity': 20.5,
+    'Mirror_writing': 10,
+    'detailed_text': 'Letters {b} and "d" are swapped; see [notes].',
+    'letters': [{'letter': 'b', 'reversed': True}, {'letter': 'd', 'reversed': False}]
+}
+REPLY = f"Here is the analysis {{as requested}}:\n```json\n{json.dumps(ANALYSIS)}\n```\n" \
+        "Let me know if you need anything else {or more detail}."
+
+
+def chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_first_object_is_found_in_prose():
+    assert first_json_object(REPLY) == ANALYSIS
+    assert extract_json_from_text(REPLY) == ANALYSIS
+
+
+@pytest.mark.parametrize('text', ['No JSON here.', '{"Motor_variability": 30, "detailed'])
+def test_incomplete_or_missing_object_gives_none(text):
+    parser = IncrementalJSONParser()
+    assert not parser.feed(text)
+    assert parser.result is None
+    assert first_json_object(text) is None
+
+
+def test_nested_objects_and_braces_in_strings():
+    text = '{"a": {"b": [1, {"c": "}"}]}, "d": "\\"{"}'
+    assert first_json_object('x ' + text + ' {"e": 1}') == {'a': {'b': [1, {'c': '}'}]}, 'd': '"{'}
+
+
+@pytest.mark.parametrize('size', [1, 3, 64, len(REPLY)])
+def test_fields_are_reported_as_soon_as_they_are_complete(size):
+    fed = 0
+    reported = {}
+
+    def on_field(name, value):
+        reported[name] = (value, fed)
+
+    parser = IncrementalJSONParser(on_field)
+    for piece in chunks(REPLY, size):
+        fed += len(piece)
+        if parser.feed(piece):
+            break
+
+    assert parser.done and parser.result == ANALYSIS
+    assert parser.fields == ANALYSIS
+    assert list(reported) == list(ANALYSIS)
+    assert all(reported[name][0] == value for name, value in ANALYSIS.items())
+    # A field is reported within one piece of the comma that ends it
+    first_comma = REPLY.index(', "Orthographic_irregularity"')
+    assert reported['Motor_variability'][1] <= first_comma + size
+    # Text after the object is not needed
+    assert fed <= REPLY.index('\n```\nLet me') + size
+    assert parser.feed('more text')
+
+
+def test_prose_braces_before_the_object_are_skipped():
+    seen = []
+    parser = IncrementalJSONParser(on_field=lambda name, value: seen.append(name))
+    for piece in chunks('Scores {roughly}: {"a": 1, "b": 2} done', 2):
+        if parser.feed(piece):
+            break
+    assert parser.result == {'a': 1, 'b': 2}
+    assert seen == ['a', 'b']
+
+
+def stream_chunks(text, size):
+    """Chat completion chunks as the OpenAI client yields them, ending with an empty one."""
+    def chunk(content):
+        delta = types.SimpleNamespace(content=content)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)])
+    return [chunk(piece) for piece in chunks(text, size)] + [types.SimpleNamespace(choices=[])]
+
+
+class FakeStream:
+    def __init__(self, text, size=5):
+        self.chunks = stream_chunks(text, size)
+        self.read = 0
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+class FakeAsyncStream(FakeStream):
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk
+
+    async def close(self):
+        self.closed = True
+
+
+def test_stream_is_closed_once_the_object_is_complete():
+    stream = FakeStream(REPLY)
+    fields = []
+    assert read_spelling_stream(stream, lambda name, value: fields.append(name)) == ANALYSIS
+    assert stream.closed
+    assert stream.read < len(stream.chunks)
+    assert fields == list(ANALYSIS)
+
+
+def test_async_stream_is_closed_once_the_object_is_complete():
+    stream = FakeAsyncStream(REPLY)
+    assert asyncio.run(read_spelling_stream_async(stream)) == ANALYSIS
+    assert stream.closed
+    assert stream.read < len(stream.chunks)
+
+
+def test_stream_without_an_object_is_read_to_the_end():
+    stream = FakeStream('I cannot analyze this image.')
+    assert read_spelling_stream(stream) is None
+    assert stream.closed
+    assert stream.read == len(stream.chunks)
@@ -0,0 +1,219 @@
+import asyncio
+import io
+import json
+from asyncio import sleep as real_sleep
+
+import httpx
+import openai
+import pytest
+from PIL import Image
+
+import app.llama_evaluate as llm
+from app.llama_evaluate import backoff_delay, is_retryable
+
+REQUEST = httpx.Request('POST', 'http://llm.test/v1/chat/completions')
+ANALYSIS = {'Motor_variability': 30, 'Orthographic_irregularity': 20, 'Mirror_writing': 10,
+            'detailed_text': 'Fine.'}
+
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 32), 'white').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def status_error(status, headers=None):
+    response = httpx.Response(status, headers=headers, request=REQUEST)
+    return openai.APIStatusError('error', response=response, body=None)
+
+
+def completion():
+    content = f"Here you go: {json.dumps(ANALYSIS)}"
+    return httpx.Response(200, json={
+        'id': 'test', 'object': 'chat.completion', 'created': 0, 'model': 'test',
+        'choices': [{'index': 0, 'finish_reason': 'stop',
+                     'message': {'role': 'assistant', 'content': content}}]
+    })
+
+
+class Server:
+    """Answers LLM requests with the given responses in turn, the last one repeated."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = 0
+
+    def __call__(self, request):
+        self.requests += 1
+        response = self.responses[min(self.requests, len(self.responses)) - 1]
+        return response() if callable(response) else response
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    """Record backoff sleeps instead of sleeping; the stand-in server does not stream."""
+    slept = []
+
+    async def async_sleep(seconds):
+        slept.append(seconds)
+        await real_sleep(0)
+
+    monkeypatch.setattr(llm.time, 'sleep', slept.append)
+    monkeypatch.setattr(llm.asyncio, 'sleep', async_sleep)
+    monkeypatch.setattr(llm, 'MODEL', 'test')
+    monkeypatch.setattr(llm, 'LLM_STREAM', False)
+    return slept
+
+
+def sync_client(monkeypatch, server):
+    client = openai.OpenAI(base_url='http://llm.test/v1', api_key='key', max_retries=0,
+                           http_client=httpx.Client(transport=httpx.MockTransport(server)))
+    monkeypatch.setattr(llm, '_client', client)
+
+
+def use_async_client(server, max_concurrency=8):
+    """Install an asyncio client for the running loop, as get_async_client would."""
+    client = openai.AsyncOpenAI(base_url='http://llm.test/v1', api_key='key', max_retries=0,
+                                http_client=httpx.AsyncClient(transport=httpx.MockTransport(server)))
+    llm._async_clients[asyncio.get_running_loop()] = (client, asyncio.Semaphore(max_concurrency))
+
+
+@pytest.mark.parametrize('error, retryable', [
+    (status_error(429), True),
+    (status_error(500), True),
+    (status_error(503), True),
+    (status_error(400), False),
+    (status_error(401), False),
+    (openai.APIConnectionError(request=REQUEST), True),
+    (openai.APITimeoutError(request=REQUEST), True),
+    (ValueError('bad image'), False),
+])
+def test_is_retryable(error, retryable):
+    assert is_retryable(error) is retryable
+
+
+def test_backoff_is_jittered_and_capped(monkeypatch):
+    monkeypatch.setattr(llm, 'LLM_BACKOFF_BASE', 0.5)
+    monkeypatch.setattr(llm, 'LLM_BACKOFF_MAX', 20)
+    for attempt in range(10):
+        delays = [backoff_delay(attempt) for _ in range(50)]
+        assert all(0 <= delay <= min(20, 0.5 * 2 ** attempt) for delay in delays)
+    assert len(set(backoff_delay(3) for _ in range(10))) > 1
+
+
+def test_backoff_respects_retry_after(monkeypatch):
+    monkeypatch.setattr(llm, 'LLM_BACKOFF_BASE', 0.5)
+    monkeypatch.setattr(llm, 'LLM_BACKOFF_MAX', 20)
+    assert backoff_delay(0, status_error(429, {'retry-after': '3'})) >= 3
+    # Capped, and HTTP dates are ignored
+    assert backoff_delay(0, status_error(429, {'retry-after': '3600'})) == 20
+    assert backoff_delay(0, status_error(429, {'retry-after': 'Wed, 21 Oct 2026 07:28:00 GMT'})) <= 0.5
+
+
+def test_rate_limits_and_server_errors_are_retried(monkeypatch, delays):
+    server = Server(httpx.Response(429, headers={'retry-after': '2'}), httpx.Response(503), completion)
+    sync_client(monkeypatch, server)
+
+    assert llm.analyze_image_for_spelling(png_bytes(), 10) == ANALYSIS
+    assert server.requests == 3
+    assert len(delays) == 2 and delays[0] >= 2
+
+
+def test_client_errors_are_not_retried(monkeypatch, delays):
+    server = Server(httpx.Response(400, json={'error': {'message': 'bad request'}}))
+    sync_client(monkeypatch, server)
+
+    assert llm.analyze_image_for_spelling(png_bytes(), 10).startswith('Error:')
+    assert server.requests == 1
+    assert delays == []
+
+
+def test_retries_are_limited(monkeypatch, delays):
+    monkeypatch.setattr(llm, 'LLM_MAX_RETRIES', 2)
+    server = Server(httpx.Response(502))
+    sync_client(monkeypatch, server)
+
+    assert llm.analyze_image_for_spelling(png_bytes(), 10).startswith('Error:')
+    assert server.requests == 3
+    assert len(delays) == 2
+
+
+def test_async_calls_retry_and_are_bounded(delays):
+    in_flight = []
+    peak = []
+
+    async def handler(request):
+        in_flight.append(request)
+        peak.append(len(in_flight))
+        # The first six requests are rate limited
+        limited = len(peak) <= 6
+        await real_sleep(0.01)
+        in_flight.remove(request)
+        return httpx.Response(429) if limited else completion()
+
+    async def scenario():
+        use_async_client(handler, max_concurrency=2)
+        try:
+            return await asyncio.gather(*(llm.analyze_image_for_spelling_async(png_bytes(), 10)
+                                          for _ in range(6)))
+        finally:
+            await llm.close_async_client()
+
+    results = asyncio.run(scenario())
+    assert results == [ANALYSIS] * 6
+    assert max(peak) == 2
+    assert len(delays) == 6
+
+
+def test_split_layout_prefix_is_identical_across_scores():
+    image = png_bytes()
+    first = llm.build_messages(image, 10, layout='split')
+    second = llm.build_messages(image, 75.5, layout='split')
+
+    assert first[0]['role'] == 'system'
+    assert first[0] == second[0]
+    image_part, text = first[1]['content']
+    assert image_part['type'] == 'image_url'
+    assert image_part['image_url']['url'].startswith('data:image/png;base64,')
+    assert text == {'type': 'text', 'text': llm.score_suffix(10)}
+    # Byte for byte, up to and including the image
+    prefix = json.dumps(first)[:json.dumps(first).index(image_part['image_url']['url'])]
+    assert json.dumps(second).startswith(prefix + image_part['image_url']['url'])
+    assert '75.5' not in json.dumps(second)[:len(prefix)]
+
+
+def test_inline_layout_puts_the_score_in_the_prompt():
+    messages = llm.build_messages(png_bytes(), 42, layout='inline')
+    assert [message['role'] for message in messages] == ['user']
+    text, image_part = messages[0]['content']
+    assert '42' in text['text']
+    assert image_part['type'] == 'image_url'
+
+
+def test_unknown_layout():
+    with pytest.raises(ValueError, match='Unknown prompt layout'):
+        llm.build_messages(png_bytes(), 10, layout='chat')
+
+
+def test_settings_fingerprint_follows_the_prompt_and_image_settings(tmp_path, monkeypatch):
+    import app.llm_image
+
+    fingerprint = llm.settings_fingerprint()
+    assert llm.settings_fingerprint() == fingerprint
+
+    changes = [(llm, 'PROMPT_LAYOUT', 'inline'), (llm, 'MODEL', 'other-model'),
+               (app.llm_image, 'LLM_IMAGE_MAX_SIDE', 768),
+               (app.llm_image, 'LLM_IMAGE_MODE', 'contrast'),
+               (app.llm_image, 'LLM_IMAGE_FORMAT', 'webp'),
+               (app.llm_image, 'LLM_IMAGE_QUALITY', 60)]
+    for module, name, value in changes:
+        with monkeypatch.context() as patch:
+            patch.setattr(module, name, value)
+            assert llm.settings_fingerprint() != fingerprint, name
+
+    for name in ('PROMPT_PATH', 'SYSTEM_PROMPT_PATH'):
+        edited = tmp_path / f"{name}.md"
+        edited.write_text(llm.read_prompt_template(getattr(llm, name)) + '\nBe brief.')
+        with monkeypatch.context() as patch:
+            patch.setattr(llm, name, str(edited))
+            assert llm.settings_fingerprint() != fingerprint, name
@@ -0,0 +1,123 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.llm_image import estimate_image_tokens, payload_stats, prepare_image
+
+
+def encode(img, pil_format, **kwargs):
+    buffer = io.BytesIO()
+    img.save(buffer, pil_format, **kwargs)
+    return buffer.getvalue()
+
+
+def worksheet(width=400, height=200):
+    """A noisy, hard to compress photo-like image."""
+    rng = np.random.default_rng(0)
+    return Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+
+
+def decode(prepared):
+    return Image.open(io.BytesIO(prepared['data']))
+
+
+def test_exif_orientation_is_applied():
+    exif = Image.Exif()
+    # Rotated 90 degrees clockwise
+    exif[0x0112] = 6
+    data = encode(worksheet(400, 200), 'JPEG', exif=exif)
+
+    prepared = prepare_image(data, max_side=0, mode='grayscale')
+    assert (prepared['width'], prepared['height']) == (200, 400)
+    assert decode(prepared).size == (200, 400)
+
+
+@pytest.mark.parametrize('img', [
+    Image.new('RGBA', (20, 20), (0, 0, 0, 0)),
+    Image.new('LA', (20, 20), (0, 0)),
+    Image.new('P', (20, 20), 0)
+], ids=['RGBA', 'LA', 'P'])
+def test_transparency_is_flattened_to_white(img):
+    kwargs = {'transparency': 0} if img.mode == 'P' else {}
+    prepared = prepare_image(encode(img, 'PNG', **kwargs), max_side=0, mode='grayscale',
+                             image_format='png')
+    assert np.asarray(decode(prepared)).min() == 255
+
+
+def test_small_original_is_kept_in_color_mode():
+    data = encode(Image.new('RGB', (64, 64), 'white'), 'PNG')
+    prepared = prepare_image(data, max_side=1536, mode='color', image_format='jpeg', quality=95)
+    # A plain PNG is smaller than any JPEG of it
+    assert prepared['data'] == data
+    assert prepared['mime_type'] == 'image/png'
+    assert prepared['bytes'] == prepared['original_bytes']
+
+
+def test_smaller_re_encoding_replaces_the_original():
+    data = encode(worksheet(), 'PNG')
+    prepared = prepare_image(data, max_side=1536, mode='color', image_format='jpeg', quality=50)
+    assert prepared['mime_type'] == 'image/jpeg'
+    assert prepared['bytes'] < len(data)
+    assert decode(prepared).format == 'JPEG'
+
+
+@pytest.mark.parametrize('image_format, mime_type, pil_format', [
+    ('jpeg', 'image/jpeg', 'JPEG'), ('webp', 'image/webp', 'WEBP'), ('png', 'image/png', 'PNG')])
+def test_formats_and_mime_types(image_format, mime_type, pil_format):
+    prepared = prepare_image(encode(worksheet(), 'PNG'), max_side=100, mode='color',
+                             image_format=image_format)
+    assert prepared['mime_type'] == mime_type
+    assert decode(prepared).format == pil_format
+
+
+def test_original_mode_sends_the_file_unchanged(tmp_path):
+    path = tmp_path / 'page.png'
+    worksheet().save(path)
+    prepared = prepare_image(str(path), max_side=100, mode='original', image_format='jpeg')
+    assert prepared['data'] == path.read_bytes()
+    assert prepared['mime_type'] == 'image/png'
+    assert (prepared['width'], prepared['height']) == (400, 200)
+
+
+def test_long_side_is_downsized():
+    prepared = prepare_image(encode(worksheet(400, 200), 'PNG'), max_side=100, mode='color')
+    assert (prepared['width'], prepared['height']) == (100, 50)
+    assert (prepared['original_width'], prepared['original_height']) == (400, 200)
+    assert decode(prepared).size == (100, 50)
+
+
+@pytest.mark.parametrize('mode', ['grayscale', 'contrast'])
+def test_grayscale_modes(mode):
+    prepared = prepare_image(encode(worksheet(), 'PNG'), max_side=0, mode=mode, image_format='png')
+    assert decode(prepared).mode == 'L'
+
+
+@pytest.mark.parametrize('kwargs', [{'mode': 'sepia'}, {'image_format': 'gif'}])
+def test_unknown_mode_or_format(kwargs):
+    with pytest.raises(ValueError, match='Unknown image'):
+        prepare_image(encode(worksheet(), 'PNG'), **kwargs)
+
+
+def test_unreadable_image():
+    with pytest.raises(ValueError, match='Could not read image'):
+        prepare_image(b'not an image')
+
+
+@pytest.mark.parametrize('size, tokens', [((512, 512), 255), ((1024, 1024), 765),
+                                          ((2048, 4096), 1105), ((100, 50), 255)])
+def test_estimate_image_tokens(size, tokens):
+    assert estimate_image_tokens(*size) == tokens
+
+
+def test_payload_stats_add_up_the_prepared_images():
+    before = payload_stats()
+    page = Image.new('RGB', (2048, 1024), 'white')
+    prepared = prepare_image(encode(page, 'PNG'), max_side=512, mode='color')
+    after = payload_stats()
+
+    assert after['images'] == before['images'] + 1
+    assert after['bytes'] - before['bytes'] == prepared['bytes']
+    assert after['bytes_saved'] - before['bytes_saved'] == prepared['original_bytes'] - prepared['bytes']
+    assert after['tokens_saved'] - before['tokens_saved'] == 1105 - 255
@@ -0,0 +1,92 @@
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import pytest
+
+import app.manifest
+from app.cache import file_sha256
+from app.manifest import Manifest, build_manifest, update_manifest
+
+from conftest import letter_image
+
+
+@pytest.fixture
+def hashed(monkeypatch):
+    """Record the paths the manifest builder hashes."""
+    paths = []
+
+    def counting_sha256(path):
+        paths.append(path)
+        return file_sha256(path)
+
+    monkeypatch.setattr(app.manifest, 'file_sha256', counting_sha256)
+    return paths
+
+
+def test_save_and_load_round_trip(tmp_path, image_dirs):
+    manifest = build_manifest(*image_dirs)
+    manifest.save(str(tmp_path / 'manifest.npz'))
+    loaded = Manifest.load(str(tmp_path / 'manifest.npz'))
+
+    assert len(loaded) == 24
+    assert loaded.paths() == manifest.paths()
+    assert loaded.labels.tolist() == [0] * 8 + [1] * 8 + [2] * 8
+    assert loaded.fingerprint() == manifest.fingerprint()
+    assert bytes(loaded.hashes[0]).hex() == file_sha256(loaded.path(0))
+
+
+def test_rebuild_hashes_only_new_and_modified_files(tmp_path, image_dirs, hashed):
+    manifest_path = str(tmp_path / 'manifest.npz')
+    first = update_manifest(manifest_path, *image_dirs)
+    assert len(hashed) == 24
+
+    normal, reversal, correct = image_dirs
+    modified = os.path.join(normal, '0.png')
+    added = os.path.join(reversal, 'new.png')
+    removed = os.path.join(correct, '0.png')
+    cv2.imwrite(modified, letter_image('q', seed=99))
+    os.utime(modified, ns=(1, 1))
+    cv2.imwrite(added, letter_image('d', seed=98))
+    os.remove(removed)
+
+    hashed.clear()
+    second = update_manifest(manifest_path, *image_dirs)
+    assert sorted(hashed) == sorted([modified, added])
+    assert len(second) == 24
+    assert removed not in second.paths()
+
+    row = second.paths().index(modified)
+    assert bytes(second.hashes[row]).hex() == file_sha256(modified)
+    assert second.fingerprint() != first.fingerprint()
+
+    # Nothing changed since: nothing is read again
+    hashed.clear()
+    third = update_manifest(manifest_path, *image_dirs)
+    assert hashed == []
+    assert third.fingerprint() == second.fingerprint()
+
+
+def test_unique_indices_keep_the_first_copy(image_dirs):
+    normal, reversal, _ = image_dirs
+    shutil.copy(os.path.join(normal, '1.png'), os.path.join(normal, 'copy.png'))
+    manifest = build_manifest(*image_dirs)
+
+    unique = manifest.unique_indices()
+    assert len(unique) == len(manifest) - 1
+    assert np.all(np.diff(unique) > 0)
+    kept = {manifest.path(i) for i in unique}
+    assert len({os.path.join(normal, '1.png'), os.path.join(normal, 'copy.png')} & kept) == 1
+
+
+
+def test_concurrent_saves_leave_one_complete_manifest(tmp_path, image_dirs):
+    manifest = build_manifest(*image_dirs)
+    path = str(tmp_path / 'manifests' / 'manifest.npz')
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda _: manifest.save(path), range(8)))
+
+    assert os.listdir(tmp_path / 'manifests') == ['manifest.npz']
+    assert Manifest.load(path).paths() == manifest.paths()
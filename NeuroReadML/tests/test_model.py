@@ -0,0 +1,58 @@
+import os
+
+import pytest
+import torch
+
+from app.model import create_dyslexia_model, load_model, load_weights, save_model, save_safetensors
+
+
+@pytest.mark.parametrize('save, name', [(save_model, 'model.pth'),
+                                        (save_safetensors, 'model.safetensors')])
+def test_saving_over_a_loaded_model_keeps_it_intact(tmp_path, save, name):
+    path = str(tmp_path / name)
+    first = create_dyslexia_model(pretrained=False)
+    save(first, path)
+    # Memory-mapped, as served
+    loaded = load_weights(path)
+
+    save(create_dyslexia_model(pretrained=False), path)
+
+    assert os.listdir(tmp_path) == [name]
+    for key, value in first.state_dict().items():
+        assert torch.equal(loaded[key], value)
+    assert not torch.equal(load_weights(path)['fc.weight'], first.state_dict()['fc.weight'])
+
+
+def test_newer_safetensors_copy_is_preferred(tmp_path):
+    path = str(tmp_path / 'model.pth')
+    save_model(create_dyslexia_model(pretrained=False), path)
+    copy = create_dyslexia_model(pretrained=False)
+    save_safetensors(copy, str(tmp_path / 'model.safetensors'))
+    os.utime(path, ns=(1, 1))
+
+    model = load_model(path, backend='eager')
+    assert torch.equal(model.state_dict()['fc.weight'], copy.state_dict()['fc.weight'])
+
+
+def test_retrained_checkpoint_wins_over_an_older_copy(tmp_path):
+    path = str(tmp_path / 'model.pth')
+    save_safetensors(create_dyslexia_model(pretrained=False), str(tmp_path / 'model.safetensors'))
+    os.utime(tmp_path / 'model.safetensors', ns=(1, 1))
+    retrained = create_dyslexia_model(pretrained=False)
+    save_model(retrained, path)
+
+    model = load_model(path, backend='eager')
+    assert torch.equal(model.state_dict()['fc.weight'], retrained.state_dict()['fc.weight'])
+
+
+def test_unreadable_checkpoint_fails_startup(tmp_path, monkeypatch):
+    import app.main
+
+    path = tmp_path / 'model.pth'
+    path.write_bytes(b'not a checkpoint')
+    monkeypatch.setattr(app.main, 'MODEL_PATH', str(path))
+    monkeypatch.setattr(app.main, 'model', None)
+    monkeypatch.setattr(app.main, 'model_version', 0)
+    with pytest.raises(RuntimeError, match='Could not load model weights'):
+        app.main.load_serving_model()
+    assert app.main.model is None
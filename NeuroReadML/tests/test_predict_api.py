@@ -0,0 +1,91 @@
+import asyncio
+import importlib
+import sys
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.engine import InferenceEngine
+from app.fetch import ImageFetcher
+from app.llama_evaluate import settings_fingerprint
+from app.model import create_dyslexia_model, save_model
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """The URL API (main.py) with its result cache in tmp_path."""
+    monkeypatch.setenv('RESULT_CACHE_PATH', str(tmp_path / 'results.sqlite'))
+    monkeypatch.delitem(sys.modules, 'main', raising=False)
+    main = importlib.import_module('main')
+    yield main
+    main.cache.close()
+    sys.modules.pop('main', None)
+
+
+def download_status(api, handler, **kwargs):
+    """Status code run_prediction answers with when downloading fails."""
+    async def scenario():
+        fetcher = ImageFetcher(**kwargs)
+        fetcher._client = httpx.AsyncClient(transport=httpx.MockTransport(handler),
+                                            timeout=httpx.Timeout(fetcher.timeout))
+        api.fetcher = fetcher
+        try:
+            await api.run_prediction('http://images.test/page.png', 'english')
+        finally:
+            await fetcher.close()
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(scenario())
+    return raised.value.status_code
+
+
+def test_connect_and_read_timeouts_answer_504(api):
+    def connect_timeout(request):
+        raise httpx.ConnectTimeout('timed out', request=request)
+
+    def read_timeout(request):
+        raise httpx.ReadTimeout('timed out', request=request)
+
+    assert download_status(api, connect_timeout) == 504
+    assert download_status(api, read_timeout) == 504
+
+
+def test_slow_download_answers_504(api):
+    async def slow(request):
+        await asyncio.sleep(1)
+        return httpx.Response(200, content=b'image')
+
+    assert download_status(api, slow, timeout=0.05) == 504
+
+
+def test_too_large_image_answers_413(api):
+    assert download_status(api, lambda request: httpx.Response(200, content=b'x' * 100),
+                           max_bytes=50) == 413
+
+
+def test_failed_download_answers_400(api):
+    assert download_status(api, lambda request: httpx.Response(404)) == 400
+
+
+def test_results_are_versioned_by_the_model_and_the_llm_settings(api, tmp_path, monkeypatch):
+    import app.llama_evaluate
+
+    model_path = str(tmp_path / 'model.pth')
+    save_model(create_dyslexia_model(pretrained=False), model_path)
+    api.engine = InferenceEngine(model_path, device='cpu')
+
+    def start():
+        asyncio.run(api.startup_event())
+        asyncio.run(api.fetcher.close())
+        return api.cache.model_version()
+
+    version = start()
+    assert version == f"{api.engine.model_version}-llm-{settings_fingerprint()}"
+    key = api.cache.make_key(b'image', 'english')
+    api.cache.set(key, {'score': 1})
+
+    # Restarting with another prompt layout drops the cached result
+    monkeypatch.setattr(app.llama_evaluate, 'PROMPT_LAYOUT', 'inline')
+    assert start() != version
+    assert api.cache.get(key) is None
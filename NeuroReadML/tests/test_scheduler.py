@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+import torch
+
+import app.scheduler
+from app.scheduler import BatchScheduler
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    """Replace the forward pass; records the images of every batch it runs."""
+    seen = []
+
+    def analyze(model, images, device, max_batch_size):
+        if model == 'broken':
+            raise RuntimeError('forward pass failed')
+        seen.append(images[:, 0, 0, 0].tolist())
+        return [{'value': value, 'model': model} for value in images[:, 0, 0, 0].tolist()]
+
+    monkeypatch.setattr(app.scheduler, 'analyze_handwriting_batch', analyze)
+    return seen
+
+
+def image(value):
+    return torch.full((1, 3, 2, 2), float(value))
+
+
+def run(scenario, model='model', **kwargs):
+    async def main():
+        scheduler = BatchScheduler(model, **kwargs)
+        scheduler.start()
+        try:
+            return await scenario(scheduler), scheduler.metrics()
+        finally:
+            await scheduler.stop()
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_share_a_batch(batches):
+    async def scenario(scheduler):
+        return await asyncio.gather(*(scheduler.submit(image(i)) for i in range(4)))
+
+    results, metrics = run(scenario, max_batch_size=8, max_wait_ms=50)
+    assert [result['value'] for result in results] == [0, 1, 2, 3]
+    assert batches == [[0, 1, 2, 3]]
+    assert metrics['batches_run'] == 1
+    assert metrics['items_processed'] == 4
+    assert metrics['average_batch_size'] == 4
+    assert metrics['batch_size_histogram'] == {'4': 1}
+    assert metrics['queue_depth'] == 0
+
+
+def test_batches_are_capped_at_max_batch_size(batches):
+    async def scenario(scheduler):
+        return await asyncio.gather(*(scheduler.submit(image(i)) for i in range(5)))
+
+    results, metrics = run(scenario, max_batch_size=2, max_wait_ms=50)
+    assert [result['value'] for result in results] == [0, 1, 2, 3, 4]
+    assert batches == [[0, 1], [2, 3], [4]]
+    assert metrics['batch_size_histogram'] == {'1': 1, '2': 2}
+    assert metrics['last_batch_size'] == 1
+
+
+def test_a_batch_does_not_wait_past_the_deadline(batches):
+    async def scenario(scheduler):
+        first = asyncio.ensure_future(scheduler.submit(image(0)))
+        await asyncio.sleep(0.1)
+        second = await scheduler.submit(image(1))
+        return await first, second
+
+    _, metrics = run(scenario, max_batch_size=8, max_wait_ms=10)
+    assert batches == [[0], [1]]
+    assert metrics['batches_run'] == 2
+
+
+def test_cancelled_requests_are_not_run(batches):
+    async def scenario(scheduler):
+        gone = asyncio.ensure_future(scheduler.submit(image(0)))
+        await asyncio.sleep(0)
+        gone.cancel()
+        return await scheduler.submit(image(1))
+
+    result, metrics = run(scenario, max_batch_size=8, max_wait_ms=50)
+    assert result['value'] == 1
+    assert batches == [[1]]
+    assert metrics['items_processed'] == 1
+
+
+def test_failed_batch_reaches_every_caller_and_the_loop_continues(batches):
+    async def scenario(scheduler):
+        results = await asyncio.gather(scheduler.submit(image(0)), scheduler.submit(image(1)),
+                                       return_exceptions=True)
+        # A reloaded model is used from the next batch on
+        scheduler.model = 'model'
+        return results, await scheduler.submit(image(2))
+
+    (failed, result), metrics = run(scenario, model='broken', max_batch_size=8, max_wait_ms=20)
+    assert all(isinstance(error, RuntimeError) for error in failed)
+    assert result == {'value': 2, 'model': 'model'}
+    assert metrics['batches_run'] == 1
+
+
+def test_submit_needs_a_running_scheduler():
+    with pytest.raises(RuntimeError, match='not running'):
+        asyncio.run(BatchScheduler('model').submit(image(0)))
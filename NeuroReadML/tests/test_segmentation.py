@@ -0,0 +1,131 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.segmentation import find_letter_boxes, find_letter_boxes_contours, iter_letter_boxes
+from app.utils import extract_letters, stream_letters
+
+TEST_IMAGES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'test_images.py')
+
+
+def text_page():
+    """Lines of printed letters with holes, a ring around a dot and a full-height stroke."""
+    page = np.full((900, 700), 255, dtype=np.uint8)
+    for row in range(8):
+        cv2.putText(page, 'abdo8pq Bx@%'[row:] + 'gOe', (10, 60 + row * 100),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.6, 0, 3)
+    cv2.circle(page, (600, 450), 120, 0, 4)
+    cv2.circle(page, (600, 450), 20, 0, -1)
+    cv2.line(page, (680, 20), (680, 880), 0, 5)
+    return page
+
+
+def random_page(seed):
+    """Random ellipses, letters and lines on a noisy background."""
+    rng = np.random.default_rng(seed)
+    page = np.full((600, 500), 255, dtype=np.uint8)
+    for _ in range(40):
+        center = (int(rng.integers(0, 500)), int(rng.integers(0, 600)))
+        kind = rng.integers(3)
+        if kind == 0:
+            axes = (int(rng.integers(3, 40)), int(rng.integers(3, 60)))
+            cv2.ellipse(page, center, axes, float(rng.integers(180)), 0, 360, 0,
+                        int(rng.integers(1, 4)))
+        elif kind == 1:
+            cv2.putText(page, chr(int(rng.integers(65, 123))), center, cv2.FONT_HERSHEY_SIMPLEX,
+                        float(rng.uniform(0.5, 3)), 0, int(rng.integers(1, 5)))
+        else:
+            end = (int(rng.integers(0, 500)), int(rng.integers(0, 600)))
+            cv2.line(page, center, end, 0, int(rng.integers(1, 5)))
+    return cv2.add(page, rng.integers(0, 40, page.shape).astype(np.uint8))
+
+
+def sample_pages():
+    pages = [('text', text_page())] + [(f"random-{seed}", random_page(seed)) for seed in range(5)]
+    for name in sorted(os.listdir(TEST_IMAGES)):
+        pages.append((name, cv2.imread(os.path.join(TEST_IMAGES, name), cv2.IMREAD_GRAYSCALE)))
+    return pages
+
+
+@pytest.mark.parametrize('name, page', sample_pages(), ids=[name for name, _ in sample_pages()])
+def test_connected_components_match_find_contours(name, page):
+    boxes, indices = find_letter_boxes(page)
+    reference_boxes, reference_indices = find_letter_boxes_contours(page)
+    assert len(boxes) > 0
+    np.testing.assert_array_equal(boxes, reference_boxes)
+    np.testing.assert_array_equal(indices, reference_indices)
+
+
+@pytest.mark.parametrize('min_width, min_height, min_area', [(1, 1, 1), (20, 30, 600)])
+def test_filters_match_find_contours(min_width, min_height, min_area):
+    page = random_page(7)
+    boxes, indices = find_letter_boxes(page, min_width, min_height, min_area)
+    reference_boxes, reference_indices = find_letter_boxes_contours(page, min_width, min_height,
+                                                                    min_area)
+    np.testing.assert_array_equal(boxes, reference_boxes)
+    np.testing.assert_array_equal(indices, reference_indices)
+
+
+def test_blank_page_has_no_letters():
+    boxes, indices = find_letter_boxes(np.full((100, 100), 255, dtype=np.uint8))
+    assert boxes.shape == (0, 4)
+    assert len(indices) == 0
+
+
+def test_extract_letters_crops_the_boxes():
+    page = text_page()
+    boxes, _ = find_letter_boxes(page)
+    letters = extract_letters(page)
+
+    assert [letter['bbox'] for letter in letters] == [tuple(box) for box in boxes.tolist()]
+    left, top, w, h = letters[0]['bbox']
+    assert np.shares_memory(letters[0]['image'], page)
+    np.testing.assert_array_equal(letters[0]['image'], page[top:top + h, left:left + w])
+
+
+def test_downscaled_boxes_follow_the_full_resolution_letters():
+    # At twice the size, max_side brings the page back to its original resolution
+    page = text_page()
+    boxes, _ = find_letter_boxes(page)
+    large = cv2.resize(page, None, fx=2, fy=2, interpolation=cv2.INTER_NEAREST)
+    scaled_boxes, _ = find_letter_boxes(large, max_side=max(page.shape))
+
+    assert scaled_boxes.shape == boxes.shape
+    # Only the padding, computed on the large page, differs
+    assert np.abs(scaled_boxes - 2 * boxes).max() <= 12
+
+
+@pytest.mark.parametrize('strip_height', [16, 50, 128, 4096])
+@pytest.mark.parametrize('seed', [None, 0, 1])
+def test_strips_find_the_same_letters_as_the_whole_page(strip_height, seed):
+    page = text_page() if seed is None else random_page(seed)
+    boxes, _ = find_letter_boxes(page)
+    streamed = list(iter_letter_boxes(page, strip_height=strip_height))
+
+    assert sorted(box for box, _ in streamed) == sorted(map(tuple, boxes.tolist()))
+    indices = [index for _, index in streamed]
+    assert indices == sorted(set(indices))
+
+
+def test_stream_letters_reads_memory_mapped_and_multi_page_scans(tmp_path):
+    page = text_page()
+    expected = sorted(map(tuple, find_letter_boxes(page)[0].tolist()))
+
+    npy_path = str(tmp_path / 'page.npy')
+    np.save(npy_path, page)
+    letters = list(stream_letters(npy_path, strip_height=64))
+    assert sorted(letter['bbox'] for letter in letters) == expected
+    left, top, w, h = letters[0]['bbox']
+    assert isinstance(letters[0]['image'], np.ndarray)
+    np.testing.assert_array_equal(letters[0]['image'], page[top:top + h, left:left + w])
+
+    tiff_path = str(tmp_path / 'scan.tiff')
+    first, second = Image.fromarray(page), Image.fromarray(random_page(0))
+    first.save(tiff_path, save_all=True, append_images=[second])
+    pages = [letter['page'] for letter in stream_letters(tiff_path, strip_height=64)]
+    assert pages.count(0) == len(expected)
+    assert pages.count(1) == len(find_letter_boxes(random_page(0))[0])
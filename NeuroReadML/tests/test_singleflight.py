@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from app.singleflight import SingleFlight
+
+
+class Work:
+    """A coroutine function that counts calls and waits until released."""
+
+    def __init__(self, result='result', error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self, *args):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result, args
+
+
+def test_concurrent_callers_share_one_call():
+    async def scenario():
+        flights = SingleFlight()
+        work = Work()
+        callers = [asyncio.ensure_future(flights.do('key', work, 1)) for _ in range(5)]
+        await asyncio.sleep(0)
+        work.release.set()
+        results = await asyncio.gather(*callers)
+        return flights, work, results
+
+    flights, work, results = asyncio.run(scenario())
+    assert work.calls == 1
+    assert results == [('result', (1,))] * 5
+    assert flights.metrics() == {'in_flight': 0, 'started': 1, 'coalesced': 4}
+
+
+def test_different_keys_run_separately():
+    async def scenario():
+        flights = SingleFlight()
+        work = Work()
+        callers = [asyncio.ensure_future(flights.do(key, work)) for key in ('a', 'b')]
+        await asyncio.sleep(0)
+        work.release.set()
+        await asyncio.gather(*callers)
+        return work
+
+    assert asyncio.run(scenario()).calls == 2
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_call():
+    async def scenario():
+        flights = SingleFlight()
+        work = Work()
+        first = asyncio.ensure_future(flights.do('key', work))
+        second = asyncio.ensure_future(flights.do('key', work))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        work.release.set()
+        return await second, work
+
+    result, work = asyncio.run(scenario())
+    assert result == ('result', ())
+    assert work.calls == 1
+
+
+def test_timed_out_caller_does_not_cancel_the_shared_call():
+    async def scenario():
+        flights = SingleFlight()
+        work = Work()
+        waiter = asyncio.ensure_future(flights.do('key', work))
+        with pytest.raises(asyncio.TimeoutError):
+            await flights.do('key', work, timeout=0.01)
+        work.release.set()
+        return await waiter, work
+
+    result, work = asyncio.run(scenario())
+    assert result == ('result', ())
+    assert work.calls == 1
+
+
+def test_exception_reaches_every_caller_and_key_is_released():
+    async def scenario():
+        flights = SingleFlight()
+        work = Work(error=ValueError('bad image'))
+        callers = [asyncio.ensure_future(flights.do('key', work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        work.release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        in_flight = flights.metrics()['in_flight']
+
+        # A later call with the same key starts fresh work
+        retry = Work()
+        retry.release.set()
+        return results, in_flight, await flights.do('key', retry)
+
+    results, in_flight, retried = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert in_flight == 0
+    assert retried == ('result', ())
+
+
+def test_shared_call_finishes_after_every_caller_gave_up():
+    async def scenario():
+        flights = SingleFlight()
+        work = Work()
+        with pytest.raises(asyncio.TimeoutError):
+            await flights.do('key', work, timeout=0.01)
+        assert flights.metrics()['in_flight'] == 1
+        work.release.set()
+        # Let the shared task complete and run its done callback
+        await asyncio.sleep(0.01)
+        return flights.metrics()['in_flight']
+
+    assert asyncio.run(scenario()) == 0
@@ -27,6 +27,40 @@ def main():
                         help='Number of training epochs')
     parser.add_argument('--lr', type=float, default=0.001,
                         help='Learning rate for optimizer')
+    parser.add_argument('--cache_dir', default=None,
+                        help='Decode images once into a memory-mapped cache in this directory')
+    parser.add_argument('--head_only', action='store_true',
+                        help='Train only the classifier head on cached backbone embeddings')
+    parser.add_argument('--unfreeze_last_block', action='store_true',
+                        help='With --head_only, also train the last residual block')
+    parser.add_argument('--embedding_cache_dir', default='models/embeddings',
+                        help='Directory of the backbone embedding cache')
+    parser.add_argument('--base_model', default=None,
+                        help='Checkpoint whose backbone --head_only reuses (default: ImageNet weights)')
+    parser.add_argument('--nprocs', type=int, default=1,
+                        help='Data-parallel training processes on this machine (batch size is per process)')
+    parser.add_argument('--nnodes', type=int, default=1,
+                        help='Number of machines taking part in training')
+    parser.add_argument('--node_rank', type=int, default=0,
+                        help='Index of this machine; node 0 hosts the master process')
+    parser.add_argument('--master_addr', default='127.0.0.1',
+                        help='Address of the node_rank 0 machine')
+    parser.add_argument('--master_port', type=int, default=29500,
+                        help='Free TCP port on the master machine')
+    parser.add_argument('--bf16', action='store_true',
+                        help='Run forward passes under bfloat16 autocast (fast on CPUs with AVX512-BF16/AMX)')
+    parser.add_argument('--channels_last', action='store_true',
+                        help='Use the channels_last memory format for the model and inputs')
+    parser.add_argument('--compile', action='store_true',
+                        help='Compile the model with torch.compile (slow first epoch)')
+    parser.add_argument('--metrics_path', default='models/training_metrics.json',
+                        help='JSON file for per-epoch samples/sec, data wait vs compute time and peak RSS')
+    parser.add_argument('--manifest', default=None,
+                        help='Dataset manifest (.npz) to train from; built from the directories if missing')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue an interrupted run from its latest full checkpoint')
+    parser.add_argument('--checkpoint_path', default=None,
+                        help='Full training checkpoint (default: models/dyslexia_model.ckpt.pt)')
     
     args = parser.parse_args()
     
@@ -45,7 +79,24 @@ def main():
         model_save_path=args.model_save_path,
         batch_size=args.batch_size,
         num_epochs=args.epochs,
-        learning_rate=args.lr
+        learning_rate=args.lr,
+        cache_dir=args.cache_dir,
+        head_only=args.head_only,
+        unfreeze_last_block=args.unfreeze_last_block,
+        embedding_cache_dir=args.embedding_cache_dir,
+        base_model_path=args.base_model,
+        nprocs=args.nprocs,
+        nnodes=args.nnodes,
+        node_rank=args.node_rank,
+        master_addr=args.master_addr,
+        master_port=args.master_port,
+        bf16=args.bf16,
+        channels_last=args.channels_last,
+        compile_model=args.compile,
+        metrics_path=args.metrics_path,
+        manifest_path=args.manifest,
+        resume=args.resume,
+        checkpoint_path=args.checkpoint_path
     )
     
     print("Training completed successfully!")